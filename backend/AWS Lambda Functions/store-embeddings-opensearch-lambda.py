@@ -1194,8 +1194,22 @@ import shutil
 # Configuration
 THUMBNAIL_BUCKET = os.environ.get('THUMBNAIL_BUCKET', 'condenast-processed-useast1-943143228843-dev')
 THUMBNAIL_PREFIX = 'thumbnails/'
+# Video-level poster (and optional hover sprite strip) shown by the library page; keys are
+# deterministic per video part, so the objects can be cached by browsers and CDNs for good
+POSTER_PREFIX = 'posters/'
+POSTER_WIDTH = 640
+POSTER_OFFSET_RATIO = 0.1  # look for a representative frame from 10% in, past intros and black frames
+SPRITE_ENABLED = os.environ.get('SPRITE_ENABLED', 'true').lower() == 'true'
+SPRITE_FRAMES = 10
+SPRITE_FRAME_WIDTH = 160
+POSTER_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 EMBEDDING_DIMENSIONS = 512
 INDEX_NAME = 'video_clips_3_lucene'
+VIDEO_CENTROID_INDEX_NAME = 'video_centroids_3_lucene'
+VIDEO_CATALOG_INDEX_NAME = 'video_catalog_3'
+CENTROID_POOLING = os.environ.get('CENTROID_POOLING', 'mean')  # 'mean' or 'max'
+KNN_WARMUP_AFTER_INGEST = os.environ.get('KNN_WARMUP_AFTER_INGEST', 'true').lower() == 'true'
+EMBEDDING_FIELDS = ['emb_visual', 'emb_audio', 'emb_transcription']
 
 def lambda_handler(event, context):
     """
@@ -1242,11 +1256,14 @@ def lambda_handler(event, context):
         
         print(f"✓ Successfully indexed {indexed_count} consolidated clips for part {part}")
         
+        knn_warmed_up = KNN_WARMUP_AFTER_INGEST and warm_up_knn_graphs(opensearch_client)
+        
         return {
             'statusCode': 200,
             'part': part,
             'videoId': video_id,
             'clipsIndexed': indexed_count,
+            'knnWarmedUp': knn_warmed_up,
             'message': 'Successfully stored consolidated embeddings in OpenSearch'
         }
         
@@ -1281,6 +1298,8 @@ def get_opensearch_client():
     
     # Ensure index exists (only on first call)
     create_index_if_not_exists(client)
+    create_centroid_index_if_not_exists(client)
+    create_catalog_index_if_not_exists(client)
     
     return client
 
@@ -1305,6 +1324,7 @@ def create_index_if_not_exists(client):
             },
             "mappings": {
                 "properties": {
+                    "video_id": {"type": "keyword"},
                     # Marengo embedding fields
                     "emb_visual": {
                         "type": "knn_vector",
@@ -1353,6 +1373,203 @@ def create_index_if_not_exists(client):
         print(f"✓ Created production-grade consolidated index: {index_name}")
 
 
+def create_centroid_index_if_not_exists(client):
+    """
+    Create the small video-level index holding one pooled embedding per modality
+    for every video part. Used by the search service for coarse-to-fine search.
+    """
+    index_name = VIDEO_CENTROID_INDEX_NAME
+    
+    if not client.indices.exists(index=index_name):
+        knn_field = {
+            "type": "knn_vector",
+            "dimension": EMBEDDING_DIMENSIONS,
+            "method": {
+                "name": "hnsw",
+                "space_type": "cosinesimil",
+                "engine": "faiss",
+                "parameters": {
+                    "ef_construction": 512,
+                    "m": 32
+                }
+            }
+        }
+        
+        index_body = {
+            "settings": {
+                "index": {
+                    "knn": True,
+                    "number_of_shards": 1,
+                    "number_of_replicas": 1
+                }
+            },
+            "mappings": {
+                "properties": {
+                    "video_id": {"type": "keyword"},
+                    "video_path": {"type": "keyword"},
+                    "video_name": {"type": "text"},
+                    "part": {"type": "integer"},
+                    "clip_count": {"type": "integer"},
+                    "pooling": {"type": "keyword"},
+                    "created_at": {"type": "date"},
+                    **{field: knn_field for field in EMBEDDING_FIELDS}
+                }
+            }
+        }
+        
+        client.indices.create(index=index_name, body=index_body)
+        print(f"✓ Created video centroid index: {index_name}")
+
+
+def create_catalog_index_if_not_exists(client):
+    """
+    Create the small video-level catalog index holding one document per video part.
+    The search service pages /list straight off this index instead of aggregating clips.
+    """
+    index_name = VIDEO_CATALOG_INDEX_NAME
+    
+    if not client.indices.exists(index=index_name):
+        index_body = {
+            "settings": {
+                "index": {
+                    "number_of_shards": 1,
+                    "number_of_replicas": 1
+                }
+            },
+            "mappings": {
+                "properties": {
+                    "catalog_id": {"type": "keyword"},
+                    "video_id": {"type": "keyword"},
+                    "video_path": {"type": "keyword"},
+                    "video_name": {
+                        "type": "text",
+                        "fields": {"raw": {"type": "keyword", "normalizer": "lowercase"}}
+                    },
+                    "part": {"type": "integer"},
+                    "part_count": {"type": "integer"},
+                    "clip_count": {"type": "integer"},
+                    "duration": {"type": "float"},
+                    "poster_path": {"type": "keyword", "index": False},
+                    "sprite_path": {"type": "keyword", "index": False},
+                    "sprite_frames": {"type": "integer"},
+                    "created_at": {"type": "date"}
+                }
+            }
+        }
+        
+        client.indices.create(index=index_name, body=index_body)
+        print(f"✓ Created video catalog index: {index_name}")
+
+
+def pool_embeddings(embeddings: List[List[float]], pooling: str = CENTROID_POOLING) -> List[float]:
+    """Mean- or max-pool a list of clip embeddings and L2-normalize the result"""
+    if pooling == 'max':
+        pooled = [max(values) for values in zip(*embeddings)]
+    else:
+        pooled = [sum(values) / len(embeddings) for values in zip(*embeddings)]
+    
+    norm = sum(v * v for v in pooled) ** 0.5
+    if norm == 0:
+        return pooled
+    return [v / norm for v in pooled]
+
+
+def index_video_centroids(opensearch_client, clips_by_id: dict, video_id: str,
+                          video_s3_uri: str, video_name: str, part: int) -> bool:
+    """
+    Pool the clip embeddings of one video part per modality and index them
+    as a single document into the video centroid index
+    """
+    doc = {
+        'video_id': video_id,
+        'video_path': video_s3_uri,
+        'video_name': video_name,
+        'part': part,
+        'clip_count': len(clips_by_id),
+        'pooling': CENTROID_POOLING,
+        'created_at': datetime.utcnow().isoformat()
+    }
+    
+    for field in EMBEDDING_FIELDS:
+        embeddings = [
+            clip_data['embeddings'][field]
+            for clip_data in clips_by_id.values()
+            if field in clip_data['embeddings']
+        ]
+        if embeddings:
+            doc[field] = pool_embeddings(embeddings)
+    
+    if not any(field in doc for field in EMBEDDING_FIELDS):
+        print(f"⚠️ No embeddings to pool for video {video_id} part {part}")
+        return False
+    
+    try:
+        opensearch_client.index(
+            index=VIDEO_CENTROID_INDEX_NAME,
+            id=f"{video_id}_part{part}",
+            body=doc
+        )
+        print(f"✓ Indexed {CENTROID_POOLING}-pooled centroids for video {video_id} part {part}")
+        return True
+    except Exception as e:
+        print(f"✗ Error indexing video centroids: {e}")
+        return False
+
+
+def index_video_catalog_entry(opensearch_client, video_id: str, video_s3_uri: str, video_name: str,
+                              part: int, duration: float, clip_count: int,
+                              poster_path: Optional[str], sprite_path: Optional[str] = None) -> bool:
+    """
+    Upsert the catalog document of one video part. The number of parts of a source video
+    is counted when /list reads the catalog, since parts are ingested in parallel.
+    """
+    catalog_id = f"{video_id}_part{part}"
+    doc = {
+        'catalog_id': catalog_id,
+        'video_id': video_id,
+        'video_path': video_s3_uri,
+        'video_name': video_name,
+        'part': part,
+        'clip_count': clip_count,
+        'duration': round(duration, 2),
+        'poster_path': poster_path,
+        'sprite_path': sprite_path,
+        'sprite_frames': SPRITE_FRAMES if sprite_path else None,
+        'created_at': datetime.utcnow().isoformat()
+    }
+    
+    try:
+        opensearch_client.update(
+            index=VIDEO_CATALOG_INDEX_NAME,
+            id=catalog_id,
+            body={'doc': doc, 'doc_as_upsert': True},
+            refresh='wait_for'
+        )
+        print(f"✓ Upserted catalog entry {catalog_id} ({clip_count} clips)")
+        return True
+    except Exception as e:
+        print(f"✗ Error upserting video catalog entry: {e}")
+        return False
+
+
+def warm_up_knn_graphs(opensearch_client) -> bool:
+    """
+    Load the faiss graphs of the freshly written segments into native memory, so the first
+    searches after an ingest batch do not pay for loading them
+    """
+    indexes = ','.join([INDEX_NAME, VIDEO_CENTROID_INDEX_NAME])
+    try:
+        # New documents only form (warmable) segments once the indexes are refreshed
+        opensearch_client.indices.refresh(index=indexes)
+        response = opensearch_client.transport.perform_request('GET', f'/_plugins/_knn/warmup/{indexes}')
+        shards = response.get('_shards', {})
+        print(f"✓ k-NN warmup loaded graphs on {shards.get('successful', 0)}/{shards.get('total', 0)} shards")
+        return not shards.get('failed')
+    except Exception as e:
+        print(f"⚠️ k-NN warmup failed: {e}")
+        return False
+
+
 def generate_clip_id(video_id: str, start_time: float, end_time: float) -> str:
     """Generate deterministic clip_id based on video_id and timestamps"""
     clip_string = f"{video_id}_{start_time:.2f}_{end_time:.2f}"
@@ -1484,6 +1701,83 @@ def upload_frame_to_s3(s3_client, frame_path: str) -> Optional[str]:
         return None
 
 
+def run_ffmpeg(cmd: List[str], output_path: str, timeout: int = 60) -> Optional[str]:
+    """Run an ffmpeg command and return output_path if it produced the file"""
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        if result.returncode == 0 and os.path.exists(output_path):
+            return output_path
+        print(f"⚠️ ffmpeg failed: {result.stderr[:200]}")
+        return None
+    except FileNotFoundError:
+        print(f"✗ ffmpeg not found in Lambda environment")
+        return None
+    except subprocess.TimeoutExpired:
+        print(f"✗ ffmpeg timeout (video may be corrupted)")
+        return None
+
+
+def upload_poster_to_s3(s3_client, image_path: str, key: str) -> Optional[str]:
+    """Upload a poster or sprite image under a fixed key with long-lived cache headers"""
+    try:
+        with open(image_path, 'rb') as f:
+            s3_client.put_object(
+                Bucket=THUMBNAIL_BUCKET,
+                Key=key,
+                Body=f.read(),
+                ContentType='image/jpeg',
+                CacheControl=POSTER_CACHE_CONTROL
+            )
+        return f"s3://{THUMBNAIL_BUCKET}/{key}"
+    except Exception as e:
+        print(f"✗ Error uploading {key}: {str(e)[:100]}")
+        return None
+
+
+def generate_video_poster(s3_client, video_path: str, video_id: str, part: int,
+                          duration: float) -> tuple:
+    """
+    Generate the library poster of one video part from the already-downloaded video, plus a
+    horizontal strip of SPRITE_FRAMES evenly spaced frames for hover scrubbing.
+    Returns (poster S3 URI, sprite S3 URI); either may be None.
+    """
+    temp_dir = tempfile.mkdtemp()
+    key_base = f"{POSTER_PREFIX}{video_id}_part{part}"
+    try:
+        # ffmpeg's thumbnail filter picks the most representative of the next 50 frames
+        poster_file = os.path.join(temp_dir, 'poster.jpg')
+        poster = run_ffmpeg([
+            'ffmpeg',
+            '-ss', str(round(duration * POSTER_OFFSET_RATIO, 2)),
+            '-i', video_path,
+            '-vf', f'thumbnail=50,scale={POSTER_WIDTH}:-2',
+            '-frames:v', '1',
+            '-q:v', '4',
+            '-y',
+            poster_file
+        ], poster_file)
+        poster_uri = upload_poster_to_s3(s3_client, poster, f"{key_base}.jpg") if poster else None
+        
+        sprite_uri = None
+        if SPRITE_ENABLED and duration > 0:
+            sprite_file = os.path.join(temp_dir, 'sprite.jpg')
+            sprite = run_ffmpeg([
+                'ffmpeg',
+                '-i', video_path,
+                '-vf', f'fps={SPRITE_FRAMES}/{duration:.2f},scale={SPRITE_FRAME_WIDTH}:-2,tile={SPRITE_FRAMES}x1',
+                '-frames:v', '1',
+                '-q:v', '5',
+                '-y',
+                sprite_file
+            ], sprite_file, timeout=120)
+            sprite_uri = upload_poster_to_s3(s3_client, sprite, f"{key_base}_sprite.jpg") if sprite else None
+        
+        print(f"✓ Generated poster {poster_uri} and sprite {sprite_uri}")
+        return poster_uri, sprite_uri
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
 def index_embeddings_to_opensearch_consolidated(opensearch_client, s3_client, embeddings_data: dict,
                                                 video_id: str, original_video: dict, part: int) -> int:
     """
@@ -1583,6 +1877,7 @@ def index_embeddings_to_opensearch_consolidated(opensearch_client, s3_client, em
         
         # Step 2: Index consolidated clips with thumbnails
         indexed_count = 0
+        poster = None  # (timestamp_start, thumbnail_path) of the earliest clip with a thumbnail
         
         for clip_id, clip_data in clips_by_id.items():
             try:
@@ -1622,6 +1917,9 @@ def index_embeddings_to_opensearch_consolidated(opensearch_client, s3_client, em
                 
                 indexed_count += 1
                 
+                if doc['thumbnail_path'] and (poster is None or doc['timestamp_start'] < poster[0]):
+                    poster = (doc['timestamp_start'], doc['thumbnail_path'])
+                
                 if indexed_count % 10 == 0:
                     print(f"Indexed {indexed_count}/{len(clips_by_id)} consolidated clips")
                 
@@ -1638,6 +1936,36 @@ def index_embeddings_to_opensearch_consolidated(opensearch_client, s3_client, em
         
         print(f"✓ Successfully indexed {indexed_count} consolidated clips with thumbnails")
         
+        # Step 3: Pool clip embeddings into the video-level centroid index
+        if indexed_count > 0:
+            index_video_centroids(
+                opensearch_client,
+                clips_by_id,
+                video_id,
+                video_s3_uri,
+                video_name,
+                part
+            )
+            
+            # Step 4: One compact catalog document per video part for /list, with a dedicated
+            # poster (falling back to the earliest clip thumbnail) and hover sprite
+            poster_path, sprite_path = None, None
+            if video_path and os.path.exists(video_path):
+                poster_path, sprite_path = generate_video_poster(
+                    s3_client, video_path, video_id, part, video_duration
+                )
+            index_video_catalog_entry(
+                opensearch_client,
+                video_id,
+                video_s3_uri,
+                video_name,
+                part,
+                video_duration,
+                indexed_count,
+                poster_path or (poster[1] if poster else None),
+                sprite_path
+            )
+        
         return indexed_count
         
     finally:
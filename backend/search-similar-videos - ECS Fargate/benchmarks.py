@@ -0,0 +1,579 @@
+"""
+Offline benchmarks for the search service.
+
+Runs against synthetic Marengo-sized vectors and the scoring helpers in main.py,
+so no OpenSearch or Bedrock access is required:
+
+    python benchmarks.py coarse_to_fine --sizes 1000 10000 50000
+    python benchmarks.py intent_report --log intent_decisions.jsonl
+    python benchmarks.py keyword_matcher --queries 20000
+    python benchmarks.py image_upload --sizes-kb 256 1024 4096
+    python benchmarks.py image_normalize --resolutions 1280x960 4032x3024
+    python benchmarks.py hedging --calls 400
+    python benchmarks.py embedding_store --records 10000 50000
+    python benchmarks.py suggest --entries 10000 100000
+    python benchmarks.py mmr --candidates 100 300 500
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+from fastapi import UploadFile
+from PIL import Image, ImageEnhance
+
+import main
+
+DIM = 512
+
+
+def _synthetic_corpus(n_clips: int, clips_per_video: int, rng: np.random.Generator):
+    """Clips are noisy copies of a per-video topic vector, one matrix per modality"""
+    n_videos = -(-n_clips // clips_per_video)
+    video_of_clip = np.repeat(np.arange(n_videos), clips_per_video)[:n_clips]
+
+    clip_vectors = {}
+    for field in main.VISUAL_AUDIO_FIELDS:
+        topics = rng.standard_normal((n_videos, DIM)).astype(np.float32)
+        noise = rng.standard_normal((n_clips, DIM)).astype(np.float32)
+        clip_vectors[field] = main._l2_normalize_rows(topics[video_of_clip] + 0.8 * noise)
+
+    return video_of_clip, clip_vectors
+
+
+def _centroids(video_of_clip: np.ndarray, clip_vectors: dict) -> dict:
+    """Mean-pool clip vectors per video, the same way the ingest lambda does"""
+    n_videos = int(video_of_clip.max()) + 1
+    counts = np.bincount(video_of_clip, minlength=n_videos)[:, None]
+    centroids = {}
+    for field, matrix in clip_vectors.items():
+        sums = np.zeros((n_videos, matrix.shape[1]), dtype=np.float32)
+        np.add.at(sums, video_of_clip, matrix)
+        centroids[field] = main._l2_normalize_rows(sums / counts)
+    return centroids
+
+
+def _timed(fn, repeats: int):
+    """Return (result of the last run, median latency in ms)"""
+    latencies = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return result, float(np.median(latencies))
+
+
+def bench_coarse_to_fine(args):
+    """Exact scoring over every clip vs. centroid top-N followed by exact scoring of those videos"""
+    rng = np.random.default_rng(args.seed)
+    _, weights = main.VISUAL_AUDIO_PREFERENCES["BALANCED"]
+    fields = main.VISUAL_AUDIO_FIELDS
+
+    print(f"{'clips':>8} {'videos':>7} {'full ms':>9} {'c2f ms':>8} {'speedup':>8} {'recall@k':>9}")
+    for n_clips in args.sizes:
+        video_of_clip, clip_vectors = _synthetic_corpus(n_clips, args.clips_per_video, rng)
+        centroids = _centroids(video_of_clip, clip_vectors)
+        n_videos = centroids[fields[0]].shape[0]
+
+        # Queries are perturbed clips so that they have true neighbours in the corpus
+        query_rows = rng.integers(0, n_clips, size=args.queries)
+
+        full_ms, c2f_ms, recalls = [], [], []
+        for row in query_rows:
+            query = clip_vectors[fields[0]][row] + 0.3 * rng.standard_normal(DIM).astype(np.float32)
+
+            def full():
+                scores = main.exact_score_clips(query, clip_vectors, fields, weights)
+                return np.argsort(-scores)[: args.top_k]
+
+            def coarse_to_fine():
+                video_scores = main.exact_score_clips(query, centroids, fields, weights)
+                top_videos = np.argsort(-video_scores)[: args.top_videos]
+                candidates = np.flatnonzero(np.isin(video_of_clip, top_videos))
+                subset = {field: matrix[candidates] for field, matrix in clip_vectors.items()}
+                scores = main.exact_score_clips(query, subset, fields, weights)
+                return candidates[np.argsort(-scores)[: args.top_k]]
+
+            full_top, ms = _timed(full, args.repeats)
+            full_ms.append(ms)
+            c2f_top, ms = _timed(coarse_to_fine, args.repeats)
+            c2f_ms.append(ms)
+            recalls.append(len(np.intersect1d(full_top, c2f_top)) / len(full_top))
+
+        full_median = float(np.median(full_ms))
+        c2f_median = float(np.median(c2f_ms))
+        print(
+            f"{n_clips:>8} {n_videos:>7} {full_median:>9.2f} {c2f_median:>8.2f} "
+            f"{full_median / c2f_median:>7.1f}x {float(np.mean(recalls)):>9.3f}"
+        )
+
+
+def _synthetic_intent_inputs(n_queries: int, sample_rate: float, rng: np.random.Generator):
+    """
+    Prototypes plus a decision log shaped like production's: queries are noisy copies of their class
+    prototype, the "LLM" label disagrees 10% of the time, a random sample_rate of queries is logged as
+    "sample" and the remaining low-confidence ones as "fallback"
+    """
+    labels = list(main.INTENT_PROTOTYPE_PHRASES)
+    vectors = main._l2_normalize_rows(rng.standard_normal((len(labels), DIM)).astype(np.float32))
+    prototypes = {label: vector.tolist() for label, vector in zip(labels, vectors)}
+    classifier = main.IntentPrototypeClassifier(main.INTENT_PROTOTYPE_TEMPERATURE)
+    classifier.set_prototypes(prototypes)
+
+    records = []
+    for _ in range(n_queries):
+        label = int(rng.integers(len(labels)))
+        noise = rng.standard_normal(DIM).astype(np.float32) / np.sqrt(DIM)
+        embedding = rng.uniform(0.0, 0.15) * vectors[label] + noise
+        llm_label = label if rng.random() >= 0.1 else int(rng.integers(len(labels)))
+        prototype_focus, probabilities, _ = classifier.classify(embedding)
+        if rng.random() < sample_rate:
+            source = "sample"
+        elif probabilities[prototype_focus] < main.INTENT_PROTOTYPE_MIN_CONFIDENCE:
+            source = "fallback"
+        else:
+            continue
+        records.append({
+            "llm_focus": labels[llm_label],
+            "prototype_focus": prototype_focus,
+            "source": source,
+            "embedding": embedding.tolist(),
+        })
+    return prototypes, records
+
+
+def bench_intent_report(args):
+    """Agreement and latency of the prototype intent classifier against logged LLM decisions"""
+    classifier = main.IntentPrototypeClassifier(args.temperature)
+    try:
+        with open(args.prototypes) as f:
+            classifier.set_prototypes(json.load(f))
+        records = main.load_intent_decisions(args.log)
+    except FileNotFoundError:
+        records = []
+    if not records:
+        print(f"No prototypes or logged decisions at {args.prototypes} / {args.log}, using synthetic ones")
+        prototypes, records = _synthetic_intent_inputs(
+            args.synthetic_queries, args.sample_rate, np.random.default_rng(args.seed)
+        )
+        classifier.set_prototypes(prototypes)
+
+    # Calibrate on one half of the randomly sampled decisions and score the other (held-out) half;
+    # fitting on the low-confidence fallbacks is shown for comparison only
+    sampled = main.sampled_intent_decisions(records)
+    order = np.random.default_rng(args.seed).permutation(len(sampled))
+    fit_set = [sampled[i] for i in order[: len(sampled) // 2]]
+    held_out = [sampled[i] for i in order[len(sampled) // 2:]]
+    fallbacks = [r for r in records if r.get("source") == "fallback"]
+    print(f"Decisions: {len(records)} ({len(sampled)} sampled, {len(fallbacks)} fallback)")
+
+    fitted = classifier.fit_temperature(fit_set)
+    if fitted:
+        held_out_nll = classifier.fit_temperature(held_out, np.asarray([fitted[0]]))
+        print(
+            f"Calibrated temperature: {fitted[0]:.4f} (NLL {fitted[1]:.3f}, "
+            f"held-out NLL {held_out_nll[1] if held_out_nll else float('nan'):.3f})"
+        )
+        if args.calibrate:
+            classifier.temperature = args.temperature = fitted[0]
+    biased = classifier.fit_temperature(fallbacks)
+    if biased:
+        print(f"Temperature fitted on fallbacks only (biased): {biased[0]:.4f}")
+
+    # Agreement on the unbiased sample when there is one, otherwise on everything logged
+    records = held_out or sampled or records
+
+    predictions, latencies_us = [], []
+    for record in records:
+        start = time.perf_counter()
+        label, probabilities, _ = classifier.classify(record["embedding"])
+        latencies_us.append((time.perf_counter() - start) * 1e6)
+        predictions.append((label, probabilities[label], record["llm_focus"]))
+
+    agreement = sum(label == llm for label, _, llm in predictions) / len(predictions)
+    print(f"Evaluated decisions: {len(records)}  temperature: {args.temperature}")
+    print(f"Overall agreement with LLM: {agreement:.3f}")
+    print(
+        f"Classifier latency: median {np.median(latencies_us):.1f} us, "
+        f"p99 {np.percentile(latencies_us, 99):.1f} us"
+    )
+
+    print(f"\n{'min conf':>9} {'local %':>8} {'agreement (local)':>18}")
+    for threshold in args.thresholds:
+        local = [(label, llm) for label, conf, llm in predictions if conf >= threshold]
+        local_agreement = sum(label == llm for label, llm in local) / len(local) if local else float("nan")
+        print(f"{threshold:>9.2f} {100 * len(local) / len(predictions):>7.1f}% {local_agreement:>18.3f}")
+
+    print("\nConfusion (LLM -> prototype):")
+    for (llm, label), count in sorted(Counter((llm, label) for label, _, llm in predictions).items()):
+        print(f"  {llm:>12} -> {label:<12} {count}")
+
+
+def _legacy_keyword_counts(query_text: str):
+    """Substring scan used by detect_modality_preference before the compiled matcher"""
+    query_lower = query_text.lower()
+    visual_count = sum(1 for keyword in main.VISUAL_KEYWORDS if keyword in query_lower)
+    audio_count = sum(1 for keyword in main.AUDIO_KEYWORDS if keyword in query_lower)
+    text_count = sum(1 for keyword in main.TEXT_KEYWORDS if keyword in query_lower)
+    return visual_count, audio_count, text_count
+
+
+def bench_keyword_matcher(args):
+    """Legacy substring keyword scan vs. the compiled regex matcher (single and batch)"""
+    rng = np.random.default_rng(args.seed)
+    vocabulary = (
+        main.VISUAL_KEYWORDS + main.AUDIO_KEYWORDS + main.TEXT_KEYWORDS
+        + "a the of dog car city night people essay person music street red blue beach".split()
+    )
+    queries = [
+        " ".join(rng.choice(vocabulary, size=rng.integers(2, 12)))
+        for _ in range(args.queries)
+    ]
+
+    runs = {
+        "legacy substring": lambda: [_legacy_keyword_counts(q) for q in queries],
+        "compiled regex": lambda: [main.count_modality_keywords(q) for q in queries],
+        "compiled batch": lambda: main.count_modality_keywords_batch(queries),
+    }
+
+    print(f"{len(queries)} queries")
+    print(f"{'matcher':>18} {'total ms':>9} {'us/query':>9} {'queries/s':>11}")
+    for name, fn in runs.items():
+        _, ms = _timed(fn, args.repeats)
+        print(f"{name:>18} {ms:>9.1f} {1000 * ms / len(queries):>9.2f} {len(queries) / ms * 1000:>11.0f}")
+
+
+async def _peak_kb(fn) -> float:
+    """Peak traced allocation of await fn() in KB, measured inside the running event loop"""
+    await fn()  # warm up the thread pool and lazily allocated state
+    tracemalloc.start()
+    try:
+        await fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_image_upload(args):
+    """Peak memory of JSON base64 image search vs. the binary multipart path, up to the Bedrock request body"""
+    main.IMAGE_NORMALIZE_ENABLED = False  # transport only, see image_normalize
+    print(f"{'image KB':>9} {'json wire KB':>13} {'binary wire KB':>15} {'json peak KB':>13} {'binary peak KB':>15}")
+    for size_kb in args.sizes_kb:
+        rng = np.random.default_rng(args.seed)
+        image = b"\xff\xd8\xff" + rng.integers(0, 256, size_kb * 1024 - 3, dtype=np.uint8).tobytes()
+        json_wire = json.dumps({"image_base64": base64.b64encode(image).decode("ascii")}).encode()
+
+        def receive(payload: bytes):
+            """The server receives the request body in chunks"""
+            step = main.IMAGE_UPLOAD_CHUNK_SIZE
+            return (payload[i : i + step] for i in range(0, len(payload), step))
+
+        async def json_path():
+            # Buffered JSON body, request parsing, the previous full-decode validation, then the Bedrock body
+            body = b"".join(receive(json_wire))
+            image_base64 = json.loads(body)["image_base64"]
+            base64.b64decode(image_base64)
+            main.validate_image(image_base64)
+            json.dumps({"inputType": "image", "image": {"mediaSource": {"base64String": image_base64}}})
+
+        async def binary_path():
+            # Multipart file parts are spooled (to disk above 1 MB), the same as starlette's UploadFile
+            with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spool:
+                for chunk in receive(image):
+                    spool.write(chunk)
+                spool.seek(0)
+                image_bytes, image_sha256 = await main.read_image_upload(UploadFile(spool, size=len(image)))
+            _, image_bytes, phash = main.prepare_query_image(image_bytes, image_sha256)
+            main.get_image_embedding_marengo3(_NullBedrock(), image_bytes, image_sha256, phash=phash)
+            main.image_embedding_cache = main.ImageEmbeddingCache(
+                main.IMAGE_EMBEDDING_CACHE_SIZE, main.IMAGE_PHASH_MAX_DISTANCE
+            )
+
+        json_peak = asyncio.run(_peak_kb(json_path))
+        binary_peak = asyncio.run(_peak_kb(binary_path))
+        print(
+            f"{size_kb:>9} {len(json_wire) / 1024:>13.0f} {len(image) / 1024:>15.0f} "
+            f"{json_peak:>13.0f} {binary_peak:>15.0f}"
+        )
+
+
+class _NullBedrock:
+    """Accepts the request body without sending it"""
+
+    def invoke_model(self, body, **kwargs):
+        return {"body": io.BytesIO(b'{"data": [{"embedding": [0.0]}]}')}
+
+
+def _synthetic_photo(width: int, height: int, rng: np.random.Generator) -> Image.Image:
+    """Smooth colour gradients plus sensor-like noise, compresses roughly like a phone photo"""
+    y, x = np.mgrid[0:height, 0:width] / (width / 4)
+    base = np.stack(
+        [
+            np.sin(x * rng.uniform(1, 3) + rng.uniform(0, 6)) * np.cos(y * rng.uniform(1, 3)),
+            np.sin(y * rng.uniform(1, 4)),
+            np.cos((x + y) * rng.uniform(1, 2)),
+        ],
+        axis=-1,
+    )
+    pixels = (base + 1) * 110 + rng.normal(0, 8, (height, width, 3))
+    return Image.fromarray(pixels.clip(0, 255).astype(np.uint8))
+
+
+def _jpeg(image: Image.Image, quality: int = 95) -> bytes:
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+def bench_image_normalize(args):
+    """Payload reduction and latency of normalize_image, and perceptual-hash distances of near duplicates"""
+    rng = np.random.default_rng(args.seed)
+    print(f"{'resolution':>11} {'original KB':>12} {'normalized KB':>14} {'ms':>7}")
+    for resolution in args.resolutions:
+        width, height = map(int, resolution.split("x"))
+        original = _jpeg(_synthetic_photo(width, height, rng))
+        (normalized, _), ms = _timed(lambda: main.normalize_image(original), args.repeats)
+        print(f"{resolution:>11} {len(original) / 1024:>12.0f} {len(normalized) / 1024:>14.0f} {ms:>7.1f}")
+
+    near, distinct = [], []
+    photos = [_synthetic_photo(1600, 1200, rng) for _ in range(args.photos)]
+    hashes = [main.normalize_image(_jpeg(photo))[1] for photo in photos]
+    for photo, phash in zip(photos, hashes):
+        variants = [
+            _jpeg(photo.resize((800, 600)), quality=60),
+            _jpeg(ImageEnhance.Brightness(photo).enhance(1.1)),
+        ]
+        near += [(phash ^ main.normalize_image(variant)[1]).bit_count() for variant in variants]
+    for i, phash in enumerate(hashes):
+        distinct += [(phash ^ other).bit_count() for other in hashes[i + 1 :]]
+
+    print(f"\nphash distance (threshold {main.IMAGE_PHASH_MAX_DISTANCE}):")
+    matched = sum(distance <= main.IMAGE_PHASH_MAX_DISTANCE for distance in near) / len(near)
+    print(f"  near duplicates: max {max(near)}, median {np.median(near):.0f}, matched {100 * matched:.0f}%")
+    print(f"  distinct photos: min {min(distinct)}, median {np.median(distinct):.0f}")
+
+
+def bench_hedging(args):
+    """Latency percentiles of a simulated long-tail Bedrock call with and without BedrockHedger"""
+    rng = np.random.default_rng(args.seed)
+    # Mostly ~median_ms, with a slow tail_fraction that takes tail_factor times longer
+    delays = rng.lognormal(np.log(args.median_ms / 1000), 0.25, size=4 * args.calls)
+    delays[rng.random(delays.size) < args.tail_fraction] *= args.tail_factor
+    delay_iter = iter(delays.tolist())
+    delay_lock = main.threading.Lock()
+
+    def bedrock_call():
+        with delay_lock:
+            delay = next(delay_iter)
+        time.sleep(delay)
+        return delay
+
+    print(f"{'mode':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'hedge rate':>11} {'win rate':>9}")
+    for enabled in (False, True):
+        hedger = main.BedrockHedger(
+            enabled, args.percentile, main.BEDROCK_HEDGE_MIN_DELAY_MS, args.budget_ratio
+        )
+        latencies = []
+        for i in range(args.calls):
+            start = time.perf_counter()
+            hedger.call("bench", bedrock_call)
+            latencies.append((time.perf_counter() - start) * 1000)
+        measured = latencies[main.BEDROCK_HEDGE_MIN_SAMPLES :]
+        operation = hedger.stats()["operations"].get("bench", {})
+        print(
+            f"{'hedged' if enabled else 'plain':>8} {np.percentile(measured, 50):>8.1f} "
+            f"{np.percentile(measured, 95):>8.1f} {np.percentile(measured, 99):>8.1f} "
+            f"{operation.get('hedge_rate', 0.0):>11.3f} {operation.get('hedge_win_rate', 0.0):>9.3f}"
+        )
+
+
+def bench_embedding_store(args):
+    """Open (index rebuild), hit/miss lookup, insert and compaction latency of PersistentEmbeddingStore"""
+    rng = np.random.default_rng(args.seed)
+    print(f"{'records':>8} {'open ms':>8} {'hit us':>7} {'miss us':>8} {'put us':>7} {'compact ms':>11} {'disk MB':>8}")
+    for n_records in args.records:
+        with tempfile.TemporaryDirectory() as directory:
+            store = main.PersistentEmbeddingStore(directory, DIM, n_records)
+            vectors = rng.standard_normal((args.lookups, DIM)).astype(np.float32).tolist()
+
+            start = time.perf_counter()
+            for i in range(n_records):
+                store.put(main.MARENGO3_MODEL_ID, f"query {i}", vectors[i % args.lookups])
+            put_us = (time.perf_counter() - start) / n_records * 1e6
+
+            start = time.perf_counter()
+            store = main.PersistentEmbeddingStore(directory, DIM, n_records)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            keys = rng.integers(0, n_records, size=args.lookups)
+            start = time.perf_counter()
+            for key in keys:
+                store.get(main.MARENGO3_MODEL_ID, f"query {key}")
+            hit_us = (time.perf_counter() - start) / args.lookups * 1e6
+
+            start = time.perf_counter()
+            for key in keys:
+                store.get(main.MARENGO3_MODEL_ID, f"missing {key}")
+            miss_us = (time.perf_counter() - start) / args.lookups * 1e6
+
+            store.max_records = n_records // 2
+            start = time.perf_counter()
+            store.compact()
+            compact_ms = (time.perf_counter() - start) * 1000
+            print(
+                f"{n_records:>8} {open_ms:>8.1f} {hit_us:>7.1f} {miss_us:>8.1f} {put_us:>7.1f} "
+                f"{compact_ms:>11.1f} {store.stats()['disk_mb']:>8.1f}"
+            )
+
+
+def bench_suggest(args):
+    """Rebuild time, prefix lookup percentiles (1-6 typed characters) and insert latency of SuggestionIndex"""
+    rng = np.random.default_rng(args.seed)
+    vocabulary = ["".join(rng.choice(list("abcdefghijklmnopqrstuvwxyz"), size=rng.integers(3, 10))) for _ in range(5000)]
+    print(f"{'entries':>8} {'rebuild ms':>11} {'p50 us':>7} {'p99 us':>7} {'max us':>8} {'memo hit':>9} {'add us':>7}")
+    for n_entries in args.entries:
+        entries = [
+            (" ".join(rng.choice(vocabulary, size=rng.integers(1, 5))), float(rng.pareto(1.2)), "query")
+            for _ in range(n_entries)
+        ]
+        index = main.SuggestionIndex(main.SUGGEST_MEMO_SIZE)
+        start = time.perf_counter()
+        index.rebuild(entries)
+        rebuild_ms = (time.perf_counter() - start) * 1000
+
+        typed = [word[: rng.integers(1, 7)] for word in rng.choice(vocabulary, size=args.lookups)]
+        latencies = []
+        for prefix in typed:
+            start = time.perf_counter()
+            index.lookup(prefix, main.SUGGEST_DEFAULT_LIMIT)
+            latencies.append((time.perf_counter() - start) * 1e6)
+
+        start = time.perf_counter()
+        for i in range(1000):
+            index.add(f"new query {i}", weight=main.SUGGEST_MIN_QUERY_COUNT)
+        add_us = (time.perf_counter() - start) / 1000 * 1e6
+        print(
+            f"{n_entries:>8} {rebuild_ms:>11.1f} {np.percentile(latencies, 50):>7.1f} "
+            f"{np.percentile(latencies, 99):>7.1f} {max(latencies):>8.1f} "
+            f"{index.stats()['memo']['hit_rate']:>9.3f} {add_us:>7.1f}"
+        )
+
+
+def bench_mmr(args):
+    """MMR rerank latency (similarity matrix plus greedy top-k selection) and near-duplicates in the top 10"""
+    rng = np.random.default_rng(args.seed)
+    print(f"{'cands':>6} {'p50 ms':>7} {'p99 ms':>7} {'dup@10 before':>14} {'dup@10 after':>13}")
+    for n in args.candidates:
+        # Runs of near-identical adjacent clips, as produced by a shot spanning several segments
+        topics = rng.standard_normal((-(-n // args.run_length), 2 * DIM)).astype(np.float32)
+        vectors = np.repeat(topics, args.run_length, axis=0)[:n]
+        vectors += 0.1 * rng.standard_normal(vectors.shape).astype(np.float32)
+        vectors = np.hstack([main._l2_normalize_rows(vectors[:, :DIM]), main._l2_normalize_rows(vectors[:, DIM:])])
+        vectors /= np.sqrt(2)
+        relevance = np.sort(rng.random(n).astype(np.float32))[::-1]
+
+        latencies = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            order = main.mmr_rerank(relevance, vectors, args.diversity, k=args.top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        def duplicates(indices):
+            top = vectors[indices[:10]]
+            similarity = top @ top.T
+            return int((np.triu(similarity, 1) > 0.9).sum())
+
+        print(
+            f"{n:>6} {np.percentile(latencies, 50):>7.2f} {np.percentile(latencies, 99):>7.2f} "
+            f"{duplicates(np.arange(n)):>14} {duplicates(order):>13}"
+        )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    c2f = subparsers.add_parser("coarse_to_fine", help=bench_coarse_to_fine.__doc__)
+    c2f.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    c2f.add_argument("--clips-per-video", type=int, default=60)
+    c2f.add_argument("--top-videos", type=int, default=main.COARSE_TOP_VIDEOS)
+    c2f.add_argument("--top-k", type=int, default=main.TOP_K)
+    c2f.add_argument("--queries", type=int, default=20)
+    c2f.add_argument("--repeats", type=int, default=3)
+    c2f.add_argument("--seed", type=int, default=0)
+    c2f.set_defaults(func=bench_coarse_to_fine)
+
+    intent = subparsers.add_parser("intent_report", help=bench_intent_report.__doc__)
+    intent.add_argument("--log", default=main.INTENT_DECISION_LOG_PATH or "intent_decisions.jsonl")
+    intent.add_argument("--prototypes", default=main.INTENT_PROTOTYPES_PATH)
+    intent.add_argument("--temperature", type=float, default=main.INTENT_PROTOTYPE_TEMPERATURE)
+    intent.add_argument("--calibrate", action="store_true", help="report with the calibrated temperature")
+    intent.add_argument("--thresholds", type=float, nargs="+", default=[0.0, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9])
+    intent.add_argument("--synthetic-queries", type=int, default=5000, help="used when no log or prototypes exist")
+    intent.add_argument("--sample-rate", type=float, default=0.2)
+    intent.add_argument("--seed", type=int, default=0)
+    intent.set_defaults(func=bench_intent_report)
+
+    keywords = subparsers.add_parser("keyword_matcher", help=bench_keyword_matcher.__doc__)
+    keywords.add_argument("--queries", type=int, default=20000)
+    keywords.add_argument("--repeats", type=int, default=3)
+    keywords.add_argument("--seed", type=int, default=0)
+    keywords.set_defaults(func=bench_keyword_matcher)
+
+    image = subparsers.add_parser("image_upload", help=bench_image_upload.__doc__)
+    image.add_argument("--sizes-kb", type=int, nargs="+", default=[256, 1024, 4096])
+    image.add_argument("--seed", type=int, default=0)
+    image.set_defaults(func=bench_image_upload)
+
+    normalize = subparsers.add_parser("image_normalize", help=bench_image_normalize.__doc__)
+    normalize.add_argument("--resolutions", nargs="+", default=["1280x960", "4032x3024"])
+    normalize.add_argument("--photos", type=int, default=8)
+    normalize.add_argument("--repeats", type=int, default=3)
+    normalize.add_argument("--seed", type=int, default=0)
+    normalize.set_defaults(func=bench_image_normalize)
+
+    hedging = subparsers.add_parser("hedging", help=bench_hedging.__doc__)
+    hedging.add_argument("--calls", type=int, default=400)
+    hedging.add_argument("--median-ms", type=float, default=20.0)
+    hedging.add_argument("--tail-fraction", type=float, default=0.03)
+    hedging.add_argument("--tail-factor", type=float, default=10.0)
+    hedging.add_argument("--percentile", type=float, default=main.BEDROCK_HEDGE_PERCENTILE)
+    hedging.add_argument("--budget-ratio", type=float, default=main.BEDROCK_HEDGE_BUDGET_RATIO)
+    hedging.add_argument("--seed", type=int, default=0)
+    hedging.set_defaults(func=bench_hedging)
+
+    store = subparsers.add_parser("embedding_store", help=bench_embedding_store.__doc__)
+    store.add_argument("--records", type=int, nargs="+", default=[10000, 50000])
+    store.add_argument("--lookups", type=int, default=5000)
+    store.add_argument("--seed", type=int, default=0)
+    store.set_defaults(func=bench_embedding_store)
+
+    suggest = subparsers.add_parser("suggest", help=bench_suggest.__doc__)
+    suggest.add_argument("--entries", type=int, nargs="+", default=[10000, 100000])
+    suggest.add_argument("--lookups", type=int, default=20000)
+    suggest.add_argument("--seed", type=int, default=0)
+    suggest.set_defaults(func=bench_suggest)
+
+    mmr = subparsers.add_parser("mmr", help=bench_mmr.__doc__)
+    mmr.add_argument("--candidates", type=int, nargs="+", default=[100, 300, 500])
+    mmr.add_argument("--diversity", type=float, default=0.3)
+    mmr.add_argument("--top-k", type=int, default=main.TOP_K)
+    mmr.add_argument("--run-length", type=int, default=4)
+    mmr.add_argument("--repeats", type=int, default=50)
+    mmr.add_argument("--seed", type=int, default=0)
+    mmr.set_defaults(func=bench_mmr)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,18 +1,47 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, File, Form, Header, Response, UploadFile
 import json
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectTimeoutError, ReadTimeoutError
 import os
 import logging
 import base64
+import binascii
+import bisect
+import contextlib
+import copy
+import fcntl
+import hashlib
+import heapq
+import hmac
+import io
+import time
 import uuid
 import datetime
 import asyncio
+import functools
 import math
-from opensearchpy import OpenSearch, RequestsHttpConnection, AWSV4SignerAuth
+import mmap
+import random
+import re
+import struct
+import tempfile
+import threading
+import unicodedata
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import repeat
+import numpy as np
+from PIL import Image, ImageOps
+import socket
+from opensearchpy import OpenSearch, Urllib3HttpConnection, Urllib3AWSV4SignerAuth, helpers
+from opensearchpy.exceptions import TransportError
 from typing import List, Dict, Optional, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import uvicorn
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 
 # Configure logging
@@ -39,6 +68,260 @@ INNER_MIN_SCORE_VISUAL = INNER_MIN_SCORE_AUDIO = INNER_MIN_SCORE_TRANSCRIPTION =
 INNER_TOP_K = 100
 TOP_K = 50
 
+# Video-level centroid index (one document per video part, written at ingest time)
+# Recall@50 of coarse-to-fine against exact scoring drops as the corpus grows (benchmarks.py coarse_to_fine,
+# 20 videos: 1.00 at 1k clips, 0.95 at 10k, 0.85 at 50k; 50k clips needs 40 videos for 0.94, 80 for 0.97),
+# so raise COARSE_TOP_VIDEOS with the corpus. The centroid query over-fetches parts so that multi-part
+# videos still yield enough distinct videos.
+VIDEO_CENTROID_INDEX_NAME = "video_centroids_3_lucene"
+COARSE_TOP_VIDEOS = int(os.environ.get("COARSE_TOP_VIDEOS", 20))
+COARSE_MAX_TOP_VIDEOS = 200
+COARSE_PART_OVERFETCH = 3
+FINE_MAX_CLIPS = 10000
+FINE_PAGE_SIZE = 1000
+
+# Video-scoped search: videos with at most this many clips are scored exactly with NumPy
+VIDEO_SCOPE_EXACT_MAX_CLIPS = int(os.environ.get("VIDEO_SCOPE_EXACT_MAX_CLIPS", 500))
+
+# "More like this clip": cached source-clip vectors and default adjacent-clip exclusion window
+CLIP_VECTOR_CACHE_SIZE = int(os.environ.get("CLIP_VECTOR_CACHE_SIZE", 2048))
+SIMILAR_ADJACENT_WINDOW_SEC = 30.0
+
+# Grouped results (group_by_video): top_k then counts videos, each with up to clips_per_video best clips
+GROUP_CLIPS_PER_VIDEO = 3
+GROUP_MAX_CLIPS_PER_VIDEO = 10
+
+# MMR diversification (diversity > 0): rerank at most MMR_MAX_CANDIDATES fused clips using their stored vectors
+MMR_MAX_CANDIDATES = 500
+
+# Segment merging (merge_segments): hits of one video closer than merge_gap_sec become one segment
+MERGE_GAP_SEC = 1.0
+MERGE_MAX_GAP_SEC = 30.0
+
+# Federated search (federated=true): Marengo 3 and the legacy Marengo 2.7 library queried in one _msearch
+# (FEDERATED_CANDIDATES per k-NN list) and fused client-side with weighted RRF; the legacy lists'
+# weights are scaled by FEDERATED_LEGACY_WEIGHT. The libraries segment videos independently, so a clip
+# of one model is the same result as a clip of the other when their time ranges overlap by at least
+# FEDERATED_MIN_OVERLAP of the shorter clip
+LEGACY_INDEX_NAME = "video_clips_consolidated"
+LEGACY_KNN_FIELDS = ["emb_vis_text", "emb_audio"]
+FEDERATED_CANDIDATES = 100
+FEDERATED_LEGACY_WEIGHT = float(os.environ.get("FEDERATED_LEGACY_WEIGHT", 0.8))
+FEDERATED_MIN_OVERLAP = 0.5
+
+# Precomputed clip nearest-neighbor graph (side index, one compact document per clip)
+NEIGHBOR_INDEX_NAME = "video_clips_3_neighbors"
+NEIGHBOR_GRAPH_K = int(os.environ.get("NEIGHBOR_GRAPH_K", 20))
+NEIGHBOR_GRAPH_BATCH_SIZE = 1024
+NEIGHBOR_GRAPH_REFRESH_SECONDS = int(os.environ.get("NEIGHBOR_GRAPH_REFRESH_SECONDS", 0))
+NEIGHBOR_GRAPH_STATE_ID = "graph_state"
+# The ingest lambda stamps created_at before it renders thumbnails and indexes the clip, so a clip can
+# appear after newer ones; incremental watermarks stay this far behind the build's start (longer than
+# one lambda run) and the clips inside the margin are simply recomputed by the next run
+NEIGHBOR_GRAPH_WATERMARK_LAG_SECONDS = int(os.environ.get("NEIGHBOR_GRAPH_WATERMARK_LAG_SECONDS", 1200))
+# Held for the duration of a build, across threads and worker processes
+NEIGHBOR_GRAPH_LOCK_PATH = os.path.join(tempfile.gettempdir(), "search-videos-neighbor-graph.lock")
+
+# Admin operations (full neighbor graph rebuilds) need an X-Admin-Key header matching ADMIN_API_KEY;
+# they are refused when ADMIN_API_KEY is not set
+ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY")
+
+# Image uploads: size limits, streaming chunk size and embedding cache keyed on sha256 of the bytes
+IMAGE_MIN_BYTES = 100
+IMAGE_MAX_BYTES = 5 * 1024 * 1024
+IMAGE_UPLOAD_CHUNK_SIZE = 64 * 1024
+# Request bodies are cut off at this size before they are parsed or spooled: a 5 MB image sent
+# as base64 JSON, plus room for the other fields and multipart framing
+REQUEST_BODY_MAX_BYTES = IMAGE_MAX_BYTES * 4 // 3 + 64 * 1024
+IMAGE_EMBEDDING_CACHE_SIZE = int(os.environ.get("IMAGE_EMBEDDING_CACHE_SIZE", 256))
+# Query images are downscaled to the resolution Marengo embeds at and re-encoded as JPEG
+IMAGE_NORMALIZE_ENABLED = os.environ.get("IMAGE_NORMALIZE_ENABLED", "true").lower() == "true"
+IMAGE_NORMALIZE_MAX_SIDE = int(os.environ.get("IMAGE_NORMALIZE_MAX_SIDE", 512))
+IMAGE_NORMALIZE_JPEG_QUALITY = int(os.environ.get("IMAGE_NORMALIZE_JPEG_QUALITY", 90))
+# Uploads whose 64-bit perceptual hashes differ in at most this many bits share a cached embedding
+# (benchmarks.py image_normalize: re-encodes differ by 1-4 bits, distinct photos by as few as 6)
+IMAGE_PHASH_MAX_DISTANCE = int(os.environ.get("IMAGE_PHASH_MAX_DISTANCE", 2))
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "jpeg",
+    b"\x89\x50\x4e\x47": "png",
+    b"\x47\x49\x46": "gif",
+    b"\x52\x49\x46\x46": "webp",
+}
+
+# Hedged Bedrock calls: a backup request is sent when the first one is slower than the
+# BEDROCK_HEDGE_PERCENTILE of recent latencies; hedges are capped at BEDROCK_HEDGE_BUDGET_RATIO of calls
+BEDROCK_HEDGING_ENABLED = os.environ.get("BEDROCK_HEDGING_ENABLED", "false").lower() == "true"
+BEDROCK_HEDGE_PERCENTILE = float(os.environ.get("BEDROCK_HEDGE_PERCENTILE", 95))
+BEDROCK_HEDGE_MIN_DELAY_MS = float(os.environ.get("BEDROCK_HEDGE_MIN_DELAY_MS", 50))
+BEDROCK_HEDGE_BUDGET_RATIO = float(os.environ.get("BEDROCK_HEDGE_BUDGET_RATIO", 0.05))
+BEDROCK_HEDGE_MAX_BURST = 10
+BEDROCK_HEDGE_LATENCY_WINDOW = 200
+BEDROCK_HEDGE_MIN_SAMPLES = 20
+
+# Bedrock circuit breaker: after BEDROCK_BREAKER_FAILURE_THRESHOLD consecutive failures calls fail fast
+# for BEDROCK_BREAKER_RESET_SECONDS, then a single probe call decides whether the circuit closes again
+BEDROCK_BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BEDROCK_BREAKER_FAILURE_THRESHOLD", 5))
+BEDROCK_BREAKER_RESET_SECONDS = float(os.environ.get("BEDROCK_BREAKER_RESET_SECONDS", 30))
+BEDROCK_CONNECT_TIMEOUT_SECONDS = 3
+BEDROCK_READ_TIMEOUT_SECONDS = int(os.environ.get("BEDROCK_READ_TIMEOUT_SECONDS", 10))
+
+# Admission control: per-dependency AIMD concurrency limits and bounded executors (bulkheads).
+# Each entry is (initial limit, max limit, latency target ms). Requests wait in a FIFO queue of at
+# most ADMISSION_MAX_QUEUE for ADMISSION_MAX_WAIT_MS before being shed with a 429.
+ADMISSION_LIMITS = {
+    "bedrock-embed": (8, int(os.environ.get("BEDROCK_EMBED_MAX_CONCURRENCY", 32)), 2000),
+    "bedrock-llm": (8, int(os.environ.get("BEDROCK_LLM_MAX_CONCURRENCY", 32)), 1500),
+    "opensearch": (16, int(os.environ.get("OPENSEARCH_MAX_CONCURRENCY", 64)), 500),
+    "s3": (8, int(os.environ.get("S3_MAX_CONCURRENCY", 16)), 200),
+}
+ADMISSION_MIN_LIMIT = 2
+ADMISSION_BACKOFF = 0.7
+ADMISSION_DECREASE_INTERVAL_SECONDS = 1.0
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 64))
+ADMISSION_MAX_WAIT_MS = int(os.environ.get("ADMISSION_MAX_WAIT_MS", 2000))
+# Event loop lag is sampled every EVENT_LOOP_LAG_INTERVAL_MS and reported in the stats; it is local
+# CPU pressure, not a signal about any one dependency, so it does not move the admission limits
+EVENT_LOOP_LAG_INTERVAL_MS = 100
+
+# Connection pools: sized from the admission limits so every admitted call gets a warm keep-alive
+# connection instead of queueing on the pool or paying a fresh TLS handshake. POOL_HEADROOM covers
+# calls made outside the limiters (startup pipeline setup, hedged duplicates of admitted calls).
+POOL_HEADROOM = int(os.environ.get("POOL_HEADROOM", 8))
+OPENSEARCH_POOL_MAXSIZE = ADMISSION_LIMITS["opensearch"][1] + POOL_HEADROOM
+BEDROCK_POOL_MAXSIZE = ADMISSION_LIMITS["bedrock-embed"][1] + ADMISSION_LIMITS["bedrock-llm"][1] + BEDROCK_HEDGE_MAX_BURST
+S3_POOL_MAXSIZE = ADMISSION_LIMITS["s3"][1] + POOL_HEADROOM
+OPENSEARCH_TIMEOUT_SECONDS = float(os.environ.get("OPENSEARCH_TIMEOUT_SECONDS", 10))
+OPENSEARCH_MAX_RETRIES = int(os.environ.get("OPENSEARCH_MAX_RETRIES", 2))
+OPENSEARCH_RETRY_ON_STATUS = (502, 503, 504)
+S3_CONNECT_TIMEOUT_SECONDS = 2
+S3_READ_TIMEOUT_SECONDS = 5
+# Idle pooled sockets are probed so connections dropped by NAT/load balancers are noticed early
+TCP_KEEPALIVE_SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+# Exact text -> Marengo 3 embedding, also keeps repeat queries working while Bedrock is unavailable
+TEXT_EMBEDDING_CACHE_SIZE = int(os.environ.get("TEXT_EMBEDDING_CACHE_SIZE", 1024))
+
+# Semantic result cache: reuse results of an earlier query whose embedding is nearly identical
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", 512))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.97))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", 300))
+
+# Multi-worker serving: uvicorn runs SERVER_WORKERS processes (WEB_CONCURRENCY, as read by the
+# uvicorn CLI). With more than one worker the embedding and semantic result caches move into
+# shared memory files under SHARED_CACHE_DIR so a hit in any worker benefits all of them.
+SERVER_WORKERS = int(os.environ.get("WEB_CONCURRENCY", 1))
+SHARED_CACHE_ENABLED = os.environ.get("SHARED_CACHE_ENABLED", str(SERVER_WORKERS > 1)).lower() == "true"
+SHARED_CACHE_DIR = os.environ.get(
+    "SHARED_CACHE_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+SHARED_CACHE_PREFIX = os.environ.get("SHARED_CACHE_PREFIX", "search-videos")
+# Startup and background jobs that act on shared state (k-NN warm-up, cache warm-up replay into the
+# shared caches, catalog backfill, neighbor graph, S3 snapshots) run in one elected worker. It
+# publishes its startup stages to LEADER_STATE_PATH, which the other workers mirror for /health.
+LEADER_STATE_PATH = os.path.join(SHARED_CACHE_DIR, f"{SHARED_CACHE_PREFIX}-leader-state.json")
+LEADER_STATE_POLL_SECONDS = 2
+# Compressed JSON budget per cached /search-3 result; larger results are not shared
+SHARED_RESULT_VALUE_BYTES = int(os.environ.get("SHARED_RESULT_VALUE_BYTES", 32 * 1024))
+MARENGO3_EMBEDDING_DIM = 512
+MARENGO3_MODEL_ID = "us.twelvelabs.marengo-embed-3-0-v1:0"
+
+# Persistent query-embedding store on the task's disk, keyed by model ID + normalized input.
+# With EMBEDDING_STORE_SNAPSHOT_S3_URI set, an empty store is bootstrapped from that snapshot at
+# startup and a compacted copy is uploaded every SNAPSHOT_INTERVAL_SECONDS.
+EMBEDDING_STORE_ENABLED = os.environ.get("EMBEDDING_STORE_ENABLED", "true").lower() == "true"
+EMBEDDING_STORE_DIR = os.environ.get(
+    "EMBEDDING_STORE_DIR", os.path.join(tempfile.gettempdir(), "search-videos-embeddings")
+)
+EMBEDDING_STORE_MAX_RECORDS = int(os.environ.get("EMBEDDING_STORE_MAX_RECORDS", 50000))
+EMBEDDING_STORE_SNAPSHOT_S3_URI = os.environ.get("EMBEDDING_STORE_SNAPSHOT_S3_URI", "")
+SNAPSHOT_INTERVAL_SECONDS = int(os.environ.get("SNAPSHOT_INTERVAL_SECONDS", 900))
+
+# Popular-query log: text-only /search-3 requests without filters are counted (normalized, decayed
+# with QUERY_LOG_HALF_LIFE_HOURS) and flushed to QUERY_LOG_PATH, shared by the worker processes.
+# QUERY_LOG_S3_URI carries the log across tasks the same way as the embedding store snapshot.
+QUERY_LOG_ENABLED = os.environ.get("QUERY_LOG_ENABLED", "true").lower() == "true"
+QUERY_LOG_PATH = os.environ.get(
+    "QUERY_LOG_PATH", os.path.join(tempfile.gettempdir(), "search-videos-popular-queries.json")
+)
+QUERY_LOG_MAX_ENTRIES = int(os.environ.get("QUERY_LOG_MAX_ENTRIES", 1000))
+QUERY_LOG_HALF_LIFE_HOURS = float(os.environ.get("QUERY_LOG_HALF_LIFE_HOURS", 24))
+QUERY_LOG_FLUSH_SECONDS = int(os.environ.get("QUERY_LOG_FLUSH_SECONDS", 60))
+QUERY_LOG_S3_URI = os.environ.get("QUERY_LOG_S3_URI", "")
+
+# Startup warm-up: replay the WARMUP_TOP_QUERIES most popular requests (embedding, intent and fused
+# results land in the caches) before /health reports healthy, for at most WARMUP_TIME_BUDGET_SECONDS
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_TOP_QUERIES = int(os.environ.get("WARMUP_TOP_QUERIES", 50))
+WARMUP_TIME_BUDGET_SECONDS = float(os.environ.get("WARMUP_TIME_BUDGET_SECONDS", 30))
+WARMUP_CONCURRENCY = 4
+
+# /list catalog cache: the change signal is checked every CATALOG_REFRESH_SECONDS in the background
+# and video URLs are presigned for CATALOG_PRESIGN_SECONDS
+CATALOG_REFRESH_SECONDS = int(os.environ.get("CATALOG_REFRESH_SECONDS", 30))
+CATALOG_PRESIGN_SECONDS = 3600
+
+# Video-level catalog index (one document per video part, upserted by the ingest lambda). /list pages
+# it with search_after cursors; the clip aggregation above is only the fallback until it is populated
+VIDEO_CATALOG_INDEX_NAME = "video_catalog_3"
+CATALOG_PAGE_SIZE = 50
+CATALOG_MAX_PAGE_SIZE = 200
+CATALOG_BACKFILL_BATCH_SIZE = 500
+# Posters and sprites have immutable keys: with THUMBNAIL_CDN_BASE_URL (e.g. a CloudFront origin on the
+# thumbnail bucket) they are served as stable CDN URLs instead of presigned S3 URLs
+THUMBNAIL_CDN_BASE_URL = os.environ.get("THUMBNAIL_CDN_BASE_URL", "").rstrip("/")
+CATALOG_SORT_FIELDS = {
+    "created_at": "created_at",
+    "name": "video_name.raw",
+    "duration": "duration",
+    "clips": "clip_count",
+    "relevance": "_score",
+}
+
+# /suggest typeahead: video names and popular queries in an in-memory prefix index, rebuilt every
+# SUGGEST_REFRESH_SECONDS and extended in place as searches come in
+SUGGEST_ENABLED = os.environ.get("SUGGEST_ENABLED", "true").lower() == "true"
+SUGGEST_REFRESH_SECONDS = int(os.environ.get("SUGGEST_REFRESH_SECONDS", 60))
+SUGGEST_DEFAULT_LIMIT = 8
+SUGGEST_MAX_LIMIT = 20
+SUGGEST_MAX_TEXT_LENGTH = 100
+SUGGEST_VIDEO_NAME_WEIGHT = 1.0  # a video name ranks like one search of it
+# A search query is only suggested to everyone once it is popular: logged at least this often
+# (decayed count in the popular-query log), or seen this often in this worker since the last rebuild
+SUGGEST_MIN_QUERY_COUNT = float(os.environ.get("SUGGEST_MIN_QUERY_COUNT", 3))
+SUGGEST_MEMO_SIZE = 4096
+
+# k-NN graph warm-up: load the faiss graphs of the vector indexes into native memory at startup
+# (gating /health for at most KNN_WARMUP_TIMEOUT_SECONDS) and on POST /knn/warmup after ingest
+KNN_WARMUP_ENABLED = os.environ.get("KNN_WARMUP_ENABLED", "true").lower() == "true"
+KNN_WARMUP_TIMEOUT_SECONDS = float(os.environ.get("KNN_WARMUP_TIMEOUT_SECONDS", 45))
+KNN_WARMUP_RETRY_SECONDS = 5
+# Held while a warm-up runs, so the startup and on-demand warm-ups of all workers never overlap
+KNN_WARMUP_LOCK_PATH = os.path.join(tempfile.gettempdir(), "search-videos-knn-warmup.lock")
+
+# Local visual/audio focus classifier: query embedding vs. per-class prototype vectors.
+# Prototypes are built once from INTENT_PROTOTYPE_PHRASES and kept in the video bucket under
+# INTENT_PROTOTYPES_S3_PREFIX (keyed on the model and phrases), so new tasks download them instead
+# of re-embedding every phrase
+INTENT_PROTOTYPES_PATH = os.environ.get("INTENT_PROTOTYPES_PATH", "intent_prototypes.json")
+INTENT_PROTOTYPES_S3_PREFIX = "search-service/intent-prototypes/"
+# Softmax temperature until it is calibrated: with at least INTENT_CALIBRATION_MIN_DECISIONS sampled LLM
+# decisions in INTENT_DECISION_LOG_PATH, startup refits it to their lowest negative log-likelihood
+# over INTENT_CALIBRATION_TEMPERATURES (see also benchmarks.py intent_report). Only "sample" records
+# count: low-confidence fallbacks are a biased subset and would skew the temperature.
+INTENT_PROTOTYPE_TEMPERATURE = float(os.environ.get("INTENT_PROTOTYPE_TEMPERATURE", 0.02))
+INTENT_CALIBRATION_MIN_DECISIONS = int(os.environ.get("INTENT_CALIBRATION_MIN_DECISIONS", 200))
+INTENT_CALIBRATION_TEMPERATURES = np.geomspace(0.002, 0.5, 60)
+INTENT_PROTOTYPE_MIN_CONFIDENCE = float(os.environ.get("INTENT_PROTOTYPE_MIN_CONFIDENCE", 0.6))
+# Fraction of prototype decisions, picked at random whatever their confidence, whose LLM decision is
+# logged as a "sample" record; confident ones ask the LLM in the background
+INTENT_SHADOW_SAMPLE_RATE = float(os.environ.get("INTENT_SHADOW_SAMPLE_RATE", 0.0))
+INTENT_DECISION_LOG_PATH = os.environ.get("INTENT_DECISION_LOG_PATH")
+RRF_RANK_CONSTANT = 60
+
 # Intent-based search pipelines for Marengo 3
 VECTOR_PIPELINE_3_VISUAL = "vector-norm-pipeline-video-clips-3-visual-intent"
 VECTOR_PIPELINE_3_AUDIO = "vector-norm-pipeline-video-clips-3-audio-intent"
@@ -92,6 +375,29 @@ COMBINATION_WEIGHTS = {
     # "AUDIO_TRANSCRIPTION_BALANCED": [0.5, 0.5],
 }
 
+# Visual_Audio preference -> (pipeline, [visual, audio] weights)
+VISUAL_AUDIO_PREFERENCES = {
+    "VISUAL_FOCUS": (VECTOR_PIPELINE_3_VISUAL_AUDIO_VISUAL_FOCUS, COMBINATION_WEIGHTS["VISUAL_AUDIO_VISUAL_FOCUS"]),
+    "AUDIO_FOCUS": (VECTOR_PIPELINE_3_VISUAL_AUDIO_AUDIO_FOCUS, COMBINATION_WEIGHTS["VISUAL_AUDIO_AUDIO_FOCUS"]),
+    "BALANCED": (VECTOR_PIPELINE_3_VISUAL_AUDIO_BALANCED, COMBINATION_WEIGHTS["VISUAL_AUDIO_BALANCED"]),
+}
+
+# Embedding fields queried by the visual_audio searches, in weight order
+VISUAL_AUDIO_FIELDS = ["emb_visual", "emb_audio"]
+
+CLIP_SOURCE_FIELDS = [
+    "video_id",
+    "video_path",
+    "clip_id",
+    "timestamp_start",
+    "timestamp_end",
+    "clip_text",
+    "thumbnail_path",
+    "video_name",
+    "clip_duration",
+    "video_duration_sec",
+]
+
 # Modality preference keywords for combination searches (including all verb tenses)
 VISUAL_KEYWORDS = [
     # Base forms
@@ -137,6 +443,2258 @@ TEXT_KEYWORDS = [
     "spoken", "mentioned", "discussed", "explained", "described", "told", "narrated"
 ]
 
+# Keyword -> (visual, audio, text) membership. All keywords are single words, so whole-word
+# matching is one precompiled tokenizer pass plus hash lookups (no "say" inside "essay").
+_MODALITY_KEYWORD_FLAGS = {
+    keyword: (int(keyword in VISUAL_KEYWORDS), int(keyword in AUDIO_KEYWORDS), int(keyword in TEXT_KEYWORDS))
+    for keyword in sorted(set(VISUAL_KEYWORDS) | set(AUDIO_KEYWORDS) | set(TEXT_KEYWORDS))
+}
+_WORD_PATTERN = re.compile(r"\w+")
+# Batch matching: query separators are token id 0, keywords 1..n, other words -1
+_BATCH_TOKEN_PATTERN = re.compile(r"\n|\w+")
+_BATCH_TOKEN_IDS = {"\n": 0, **{keyword: i for i, keyword in enumerate(_MODALITY_KEYWORD_FLAGS, start=1)}}
+_BATCH_TOKEN_FLAGS = np.array([(0, 0, 0)] + list(_MODALITY_KEYWORD_FLAGS.values()), dtype=np.int32)
+
+# Seed queries whose Marengo 3 embeddings are averaged into one prototype per focus class
+INTENT_PROTOTYPE_PHRASES = {
+    "VISUAL_FOCUS": [
+        "a red car parked on the street",
+        "aerial shot of a city skyline at sunset",
+        "close-up of a woman smiling",
+        "people walking on a beach",
+        "a dog running through a field",
+        "bright colorful fireworks in the night sky",
+        "a chef plating food in a kitchen",
+        "snow covered mountains",
+        "someone wearing a black leather jacket",
+        "slow motion shot of a waterfall",
+    ],
+    "AUDIO_FOCUS": [
+        "sound of a dog barking",
+        "loud applause and cheering",
+        "soft piano music playing",
+        "a baby crying",
+        "thunder and heavy rain sounds",
+        "someone screaming",
+        "upbeat electronic dance music",
+        "glass shattering noise",
+        "birds chirping in the morning",
+        "a crowd singing along to a song",
+    ],
+    "BALANCED": [
+        "a band performing live on stage",
+        "a person giving a speech at a podium",
+        "an exciting moment in a football game",
+        "a wedding celebration",
+        "a tense argument between two people",
+        "kids laughing while playing in a park",
+        "a cooking tutorial",
+        "an interview about fashion",
+        "a car engine revving on a race track",
+        "a festive holiday party",
+    ],
+}
+
+
+class LRUCache:
+    """Small thread-safe LRU cache with hit/miss counters"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SemanticResultCache:
+    """
+    Result cache keyed on query-embedding similarity instead of exact text.
+    Recent query embeddings are kept L2-normalized in one (max_size, dim) matrix, so a
+    lookup is a single matmul; a cached entry is reused when its cosine similarity to the
+    new query is >= threshold and it was stored for the same search context (search type,
+    filters, ...), kept as a 128-bit hash per slot. Full slots are recycled least-recently-used first.
+    """
+
+    def __init__(self, max_size: int, threshold: float, ttl_seconds: int):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._matrix = None
+        self._contexts = np.zeros((max_size, 2), dtype=np.uint64)
+        self._values: List[Any] = [None] * max_size
+        self._stored_at = np.zeros(max_size, dtype=np.float64)
+        self._last_used = np.zeros(max_size, dtype=np.int64)
+        self._valid = np.zeros(max_size, dtype=bool)
+        self._tick = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    @staticmethod
+    def _context_tag(context: str) -> np.ndarray:
+        return np.frombuffer(hashlib.blake2b(context.encode(), digest_size=16).digest(), dtype=np.uint64)
+
+    def lookup(self, embedding: List[float], context: str):
+        """Return (value, similarity) of the best cached match above threshold, or None"""
+        query = self._normalize(embedding)
+        tag = self._context_tag(context)
+
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            expired = self._valid & (time.time() - self._stored_at > self.ttl_seconds)
+            self._valid[expired] = False
+
+            candidates = self._valid & (self._contexts[:, 0] == tag[0]) & (self._contexts[:, 1] == tag[1])
+            if not candidates.any():
+                self.misses += 1
+                return None
+
+            similarities = np.where(candidates, self._matrix @ query, -np.inf)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._tick += 1
+            self._last_used[best] = self._tick
+            self.hits += 1
+            return copy.deepcopy(self._values[best]), float(similarities[best])
+
+    def put(self, embedding: List[float], context: str, value):
+        query = self._normalize(embedding)
+        tag = self._context_tag(context)
+
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != query.shape[0]:
+                self._matrix = np.zeros((self.max_size, query.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+
+            free_slots = np.flatnonzero(~self._valid)
+            slot = int(free_slots[0]) if free_slots.size else int(np.argmin(self._last_used))
+
+            self._tick += 1
+            self._matrix[slot] = query
+            self._contexts[slot] = tag
+            self._values[slot] = copy.deepcopy(value)
+            self._stored_at[slot] = time.time()
+            self._last_used[slot] = self._tick
+            self._valid[slot] = True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": int(self._valid.sum()),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SharedMemoryRegion:
+    """
+    Fixed-layout file in shared memory (/dev/shm), mmapped by every worker process.
+    The first process to open it lays it out; later ones attach when the layout digest in the
+    header matches. Fields are exposed as numpy views straight over the mapping, and lock()
+    serializes access across threads (threading.Lock) and processes (flock on the file).
+    """
+
+    HEADER_SIZE = 128  # magic + layout digest, then shared hit/miss counters at offset 64
+
+    def __init__(self, path: str, fields: List[tuple]):
+        self.path = path
+        layout = []
+        offset = self.HEADER_SIZE
+        for name, shape, dtype in fields:
+            dtype = np.dtype(dtype)
+            layout.append((name, shape, dtype, offset))
+            offset += -(-math.prod(shape) * dtype.itemsize // 64) * 64
+        self.size = offset
+        fingerprint = b"SVSC" + hashlib.blake2b(
+            repr([(name, shape, dtype.str) for name, shape, dtype, _ in layout]).encode(), digest_size=16
+        ).digest()
+
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self.lock():
+            if os.fstat(self._fd).st_size != self.size or os.pread(self._fd, len(fingerprint), 0) != fingerprint:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+                os.pwrite(self._fd, fingerprint, 0)
+                logger.info(f"🧠 Initialized shared cache {path} ({self.size / 1e6:.1f} MB)")
+        self._mmap = mmap.mmap(self._fd, self.size)
+        self.counters = np.ndarray((2,), dtype=np.uint64, buffer=self._mmap, offset=64)
+        self.arrays = {
+            name: np.ndarray(shape, dtype=dtype, buffer=self._mmap, offset=offset)
+            for name, shape, dtype, offset in layout
+        }
+
+    @contextlib.contextmanager
+    def lock(self):
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def count(self, hit: bool):
+        """Bump the shared hit or miss counter (caller holds the lock)"""
+        self.counters[0 if hit else 1] += 1
+
+    def hit_stats(self) -> Dict:
+        hits, misses = int(self.counters[0]), int(self.counters[1])
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "shared": True,
+            "path": self.path,
+        }
+
+
+class SharedEmbeddingCache:
+    """
+    Drop-in replacement for an LRUCache of embeddings, shared by all worker processes.
+    Keys are hashed to 128 bits and placed in an 8-way set-associative table; a slot holds the
+    key hash, a last-used tick and the float32 vector (2 KB for a 512-d embedding), and the
+    least recently used way of a full set is overwritten.
+    """
+
+    WAYS = 8
+
+    def __init__(self, path: str, max_size: int, dim: int):
+        self.sets = max(1, max_size // self.WAYS)
+        self.max_size = self.sets * self.WAYS
+        self.dim = dim
+        self._region = SharedMemoryRegion(
+            path,
+            [
+                ("keys", (self.sets, self.WAYS, 2), np.uint64),
+                ("last_used", (self.sets, self.WAYS), np.uint64),
+                ("vectors", (self.sets, self.WAYS, dim), np.float32),
+                ("clock", (1,), np.uint64),
+            ],
+        )
+        self._keys = self._region.arrays["keys"]
+        self._last_used = self._region.arrays["last_used"]
+        self._vectors = self._region.arrays["vectors"]
+        self._clock = self._region.arrays["clock"]
+
+    def _locate(self, key: str):
+        tag = np.frombuffer(hashlib.blake2b(key.encode(), digest_size=16).digest(), dtype=np.uint64).copy()
+        tag[0] |= 1  # an all-zero tag marks an empty way
+        return int(tag[1] % self.sets), tag
+
+    def _find(self, set_index: int, tag: np.ndarray) -> int:
+        ways = self._keys[set_index]
+        match = np.flatnonzero((ways[:, 0] == tag[0]) & (ways[:, 1] == tag[1]))
+        return int(match[0]) if match.size else -1
+
+    def get(self, key: str) -> Optional[List[float]]:
+        set_index, tag = self._locate(key)
+        with self._region.lock():
+            way = self._find(set_index, tag)
+            self._region.count(way >= 0)
+            if way < 0:
+                return None
+            self._clock[0] += 1
+            self._last_used[set_index, way] = self._clock[0]
+            return self._vectors[set_index, way].tolist()
+
+    def put(self, key: str, value: List[float]):
+        if len(value) != self.dim:
+            return
+        set_index, tag = self._locate(key)
+        vector = np.asarray(value, dtype=np.float32)
+        with self._region.lock():
+            way = self._find(set_index, tag)
+            if way < 0:
+                empty = np.flatnonzero(self._keys[set_index, :, 0] == 0)
+                way = int(empty[0]) if empty.size else int(np.argmin(self._last_used[set_index]))
+            self._clock[0] += 1
+            self._vectors[set_index, way] = vector
+            self._keys[set_index, way] = tag
+            self._last_used[set_index, way] = self._clock[0]
+
+    def stats(self) -> Dict:
+        with self._region.lock():
+            size = int(np.count_nonzero(self._keys[:, :, 0]))
+            return {"size": size, "max_size": self.max_size, **self._region.hit_stats()}
+
+
+class SharedSemanticResultCache(SemanticResultCache):
+    """
+    SemanticResultCache whose slots live in shared memory, so a result cached by one worker
+    process is a hit in all of them. Query embeddings sit in one float32 (max_size, dim)
+    matrix as before; values are stored as zlib-compressed JSON in fixed-size byte slots,
+    and values larger than value_bytes are not cached.
+    """
+
+    def __init__(self, path: str, max_size: int, threshold: float, ttl_seconds: int, dim: int, value_bytes: int):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.dim = dim
+        self.value_bytes = value_bytes
+        self.oversized = 0
+        self._region = SharedMemoryRegion(
+            path,
+            [
+                ("matrix", (max_size, dim), np.float32),
+                ("contexts", (max_size, 2), np.uint64),
+                ("stored_at", (max_size,), np.float64),
+                ("last_used", (max_size,), np.uint64),
+                ("valid", (max_size,), np.bool_),
+                ("value_lengths", (max_size,), np.uint32),
+                ("values", (max_size, value_bytes), np.uint8),
+                ("clock", (1,), np.uint64),
+            ],
+        )
+        arrays = self._region.arrays
+        self._matrix = arrays["matrix"]
+        self._contexts = arrays["contexts"]
+        self._stored_at = arrays["stored_at"]
+        self._last_used = arrays["last_used"]
+        self._valid = arrays["valid"]
+        self._value_lengths = arrays["value_lengths"]
+        self._values = arrays["values"]
+        self._clock = arrays["clock"]
+
+    def lookup(self, embedding: List[float], context: str):
+        """Return (value, similarity) of the best cached match above threshold, or None"""
+        query = self._normalize(embedding)
+        if query.shape[0] != self.dim:
+            return None
+        tag = self._context_tag(context)
+
+        with self._region.lock():
+            expired = self._valid & (time.time() - self._stored_at > self.ttl_seconds)
+            self._valid[expired] = False
+
+            candidates = self._valid & (self._contexts[:, 0] == tag[0]) & (self._contexts[:, 1] == tag[1])
+            best = -1
+            if candidates.any():
+                similarities = np.where(candidates, self._matrix @ query, -np.inf)
+                best = int(np.argmax(similarities))
+                if similarities[best] < self.threshold:
+                    best = -1
+
+            self._region.count(best >= 0)
+            if best < 0:
+                return None
+            self._clock[0] += 1
+            self._last_used[best] = self._clock[0]
+            payload = self._values[best, : self._value_lengths[best]].tobytes()
+
+        return json.loads(zlib.decompress(payload)), float(similarities[best])
+
+    def put(self, embedding: List[float], context: str, value):
+        query = self._normalize(embedding)
+        if query.shape[0] != self.dim:
+            return
+        payload = zlib.compress(json.dumps(value, separators=(",", ":"), default=_json_default).encode(), 1)
+        if len(payload) > self.value_bytes:
+            self.oversized += 1
+            return
+        tag = self._context_tag(context)
+
+        with self._region.lock():
+            free_slots = np.flatnonzero(~self._valid)
+            slot = int(free_slots[0]) if free_slots.size else int(np.argmin(self._last_used))
+
+            self._clock[0] += 1
+            self._matrix[slot] = query
+            self._contexts[slot] = tag
+            self._values[slot, : len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+            self._value_lengths[slot] = len(payload)
+            self._stored_at[slot] = time.time()
+            self._last_used[slot] = self._clock[0]
+            self._valid[slot] = True
+
+    def stats(self) -> Dict:
+        with self._region.lock():
+            return {
+                "size": int(self._valid.sum()),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "value_bytes": self.value_bytes,
+                "oversized": self.oversized,
+                **self._region.hit_stats(),
+            }
+
+
+def _json_default(value):
+    """json.dumps fallback for numpy scalars and arrays in cached results"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class PersistentEmbeddingStore:
+    """
+    Query embeddings persisted on the task's disk, so they survive restarts and deploys.
+    Records of (128-bit key, last-used minute, float32 vector) are appended to an mmapped arena
+    file, and each process keeps a key -> slot dict built by scanning it, so a lookup is a dict
+    probe plus one vector copy. Keys hash the model ID and the normalized input. compact()
+    keeps the max_records most recently used records, rewriting them to a new file that is
+    renamed into place. Worker processes share one store: writers serialize on a lock file and
+    readers lazily pick up records appended (or a file compacted) by other processes.
+    """
+
+    MAGIC = b"SVES"
+    HEADER = struct.Struct("<4sIQQ")  # magic, dim, capacity, count
+    HEADER_SIZE = 64
+    GROW_RECORDS = 4096
+    COMPACT_RATIO = 1.25  # compact once the arena holds this many times max_records
+
+    def __init__(self, directory: str, dim: int, max_records: int):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "embeddings.f32")
+        self.dim = dim
+        self.max_records = max_records
+        self.record_dtype = np.dtype([("key", "V16"), ("last_used", "<u4"), ("vector", "<f4", (dim,))])
+        self._lock_fd = os.open(os.path.join(directory, "embeddings.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+        self._fd = None
+        self._mmap = None
+        self._records = None
+        self._inode = None
+        self._index: Dict[bytes, int] = {}
+        self._indexed = 0
+        self.hits = 0
+        self.misses = 0
+        self.compactions = 0
+        self._compacting = False
+
+        with self._locked():
+            self._open()
+        logger.info(f"💾 Embedding store {self.path}: {len(self._index)} embeddings")
+
+    @staticmethod
+    def make_key(model_id: str, normalized_input: str) -> bytes:
+        return hashlib.blake2b(f"{model_id}\0{normalized_input}".encode(), digest_size=16).digest()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Thread lock plus the cross-process file lock; re-entrant, the flock is dropped by the outermost exit"""
+        with self._thread_lock:
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _write_header(self, fd: int, capacity: int, count: int):
+        os.pwrite(fd, self.HEADER.pack(self.MAGIC, self.dim, capacity, count), 0)
+
+    def _open(self):
+        """(Re)map the store file, creating or resetting it if missing or of another layout (caller holds _locked)"""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        header = os.pread(fd, self.HEADER.size, 0)
+        magic, dim, capacity, _ = (
+            self.HEADER.unpack(header) if len(header) == self.HEADER.size else (b"", 0, 0, 0)
+        )
+        expected_size = self.HEADER_SIZE + capacity * self.record_dtype.itemsize
+        if magic != self.MAGIC or dim != self.dim or os.fstat(fd).st_size < expected_size:
+            capacity = self.GROW_RECORDS
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, self.HEADER_SIZE + capacity * self.record_dtype.itemsize)
+            self._write_header(fd, capacity, 0)
+
+        old_fd = self._fd
+        self._fd = fd
+        self._inode = os.fstat(fd).st_ino
+        self._map(capacity)
+        if old_fd is not None:
+            os.close(old_fd)
+        self._index = {}
+        self._indexed = 0
+        self._index_tail()
+
+    def _map(self, capacity: int):
+        old_mapping = self._mmap
+        self._records = None
+        self._mmap = mmap.mmap(self._fd, self.HEADER_SIZE + capacity * self.record_dtype.itemsize)
+        self._records = np.ndarray((capacity,), dtype=self.record_dtype, buffer=self._mmap, offset=self.HEADER_SIZE)
+        if old_mapping is not None:
+            try:
+                old_mapping.close()
+            except BufferError:
+                pass  # still referenced by a numpy view; released together with it
+
+    def _header(self):
+        _, _, capacity, count = self.HEADER.unpack_from(self._mmap, 0)
+        return capacity, count
+
+    def _index_tail(self):
+        capacity, count = self._header()
+        if capacity > self._records.shape[0]:
+            self._map(capacity)
+        if count > self._indexed:
+            keys = np.ascontiguousarray(self._records["key"][self._indexed:count]).tobytes()
+            for offset in range(0, len(keys), 16):
+                self._index[keys[offset:offset + 16]] = self._indexed + offset // 16
+            self._indexed = count
+
+    def _replaced(self) -> bool:
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def _refresh(self):
+        """
+        Pick up a store compacted or appended to by another process. Reopening may reset the
+        file, so it happens under the file lock, after checking again that no one else did it.
+        """
+        if self._replaced():
+            with self._locked():
+                if self._replaced():
+                    self._open()
+                    return
+        self._index_tail()
+
+    def get(self, model_id: str, normalized_input: str) -> Optional[List[float]]:
+        key = self.make_key(model_id, normalized_input)
+        with self._thread_lock:
+            self._refresh()
+            slot = self._index.get(key)
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._records["last_used"][slot] = int(time.time() // 60)
+            return self._records["vector"][slot].tolist()
+
+    def put(self, model_id: str, normalized_input: str, embedding: List[float]):
+        """Append an embedding; compaction, when due, runs on a background thread"""
+        if len(embedding) != self.dim:
+            return
+        key = self.make_key(model_id, normalized_input)
+        with self._locked():
+            self._refresh()
+            if key in self._index:
+                return
+            capacity, count = self._header()
+            if count >= capacity:
+                capacity += self.GROW_RECORDS
+                os.ftruncate(self._fd, self.HEADER_SIZE + capacity * self.record_dtype.itemsize)
+                self._write_header(self._fd, capacity, count)
+                self._map(capacity)
+
+            self._records["key"][count] = np.void(key)
+            self._records["last_used"][count] = int(time.time() // 60)
+            self._records["vector"][count] = embedding
+            # Publish the record only once it is fully written
+            self._write_header(self._fd, capacity, count + 1)
+            self._index[key] = count
+            self._indexed = count + 1
+            needs_compaction = count + 1 > self.max_records * self.COMPACT_RATIO and not self._compacting
+            if needs_compaction:
+                self._compacting = True
+
+        if needs_compaction:
+            threading.Thread(target=self.compact, name="embedding-store-compact", daemon=True).start()
+
+    def _live_records(self) -> np.ndarray:
+        """Copy of the max_records most recently used records, in arena order (caller holds the lock)"""
+        _, count = self._header()
+        records = self._records[:count]
+        if count <= self.max_records:
+            return records.copy()
+        keep = np.sort(np.argsort(records["last_used"], kind="stable")[-self.max_records:])
+        return records[keep]
+
+    def _write_file(self, path: str, records: np.ndarray):
+        with open(path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.dim, len(records), len(records)).ljust(self.HEADER_SIZE, b"\0"))
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """Drop least recently used records beyond max_records and rewrite the arena densely"""
+        with self._locked():
+            self._refresh()
+            _, count = self._header()
+            records = self._live_records()
+            compacted_path = self.path + ".compact"
+            self._write_file(compacted_path, records)
+            os.replace(compacted_path, self.path)
+            self._open()
+            self.compactions += 1
+            self._compacting = False
+        logger.info(f"💾 Compacted embedding store: {count} -> {len(records)} records")
+
+    def snapshot_to_s3(self, s3_client, bucket: str, key: str):
+        """Upload a compacted copy of the store, used to bootstrap new tasks"""
+        snapshot_path = self.path + f".snapshot-{os.getpid()}"
+        with self._locked():
+            self._refresh()
+            records = self._live_records()
+        try:
+            self._write_file(snapshot_path, records)
+            s3_client.upload_file(snapshot_path, bucket, key)
+        finally:
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+        logger.info(f"💾 Uploaded embedding store snapshot ({len(records)} records) to s3://{bucket}/{key}")
+
+    def bootstrap_from_s3(self, s3_client, bucket: str, key: str) -> bool:
+        """Replace an empty local store with the S3 snapshot; False if not empty or no usable snapshot"""
+        with self._locked():
+            self._refresh()
+            if self._header()[1] > 0:
+                return False
+            download_path = self.path + ".download"
+            try:
+                s3_client.download_file(bucket, key, download_path)
+                with open(download_path, "rb") as f:
+                    magic, dim, _, count = self.HEADER.unpack(f.read(self.HEADER.size))
+                if magic != self.MAGIC or dim != self.dim:
+                    logger.warning(f"Ignoring embedding store snapshot with layout {magic!r}/{dim}")
+                    return False
+                os.replace(download_path, self.path)
+                self._open()
+            except ClientError as e:
+                logger.info(f"No embedding store snapshot at s3://{bucket}/{key}: {e}")
+                return False
+            finally:
+                if os.path.exists(download_path):
+                    os.remove(download_path)
+        logger.info(f"💾 Bootstrapped embedding store from s3://{bucket}/{key} ({count} records)")
+        return True
+
+    def stats(self) -> Dict:
+        with self._thread_lock:
+            self._refresh()
+            capacity, count = self._header()
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "size": len(self._index),
+                "records": count,
+                "capacity": capacity,
+                "max_records": self.max_records,
+                "disk_mb": round(os.path.getsize(self.path) / 1e6, 1),
+                "compactions": self.compactions,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def normalize_query_text(text: str) -> str:
+    """Unicode-, whitespace- and case-normalized query text, used for persistent embedding keys"""
+    return " ".join(unicodedata.normalize("NFKC", text).split()).casefold()
+
+
+class PopularQueryLog:
+    """
+    Frequencies of normalized, cacheable search requests, used to warm the caches of new tasks.
+    Counts accumulate in memory and flush() merges them into a JSON file shared by the worker
+    processes (under a lock file). Stored counts decay with a half-life, so the ranking follows
+    recent traffic, and only the max_entries most frequent requests are kept.
+    """
+
+    def __init__(self, path: str, max_entries: int, half_life_seconds: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.half_life_seconds = half_life_seconds
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    @staticmethod
+    def request_key(query_text: str, search_type: str, top_k: int, coarse_to_fine: bool) -> str:
+        return json.dumps([normalize_query_text(query_text), search_type, top_k, coarse_to_fine])
+
+    def record(self, query_text: str, search_type: str, top_k: int, coarse_to_fine: bool):
+        key = self.request_key(query_text, search_type, top_k, coarse_to_fine)
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + 1
+            self.recorded += 1
+
+    def _load(self) -> tuple[Dict[str, float], float]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return data["counts"], data["updated_at"]
+        except FileNotFoundError:
+            return {}, time.time()
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable popular-query log {self.path}: {e}")
+            return {}, time.time()
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def flush(self):
+        """Decay the stored counts, add the pending ones and keep the top max_entries"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        with self._file_lock():
+            counts, updated_at = self._load()
+            now = time.time()
+            decay = 0.5 ** (max(now - updated_at, 0.0) / self.half_life_seconds)
+            counts = {key: count * decay for key, count in counts.items()}
+            for key, count in pending.items():
+                counts[key] = counts.get(key, 0.0) + count
+            top = sorted(counts.items(), key=lambda item: item[1], reverse=True)[: self.max_entries]
+
+            temp_path = f"{self.path}.{os.getpid()}"
+            with open(temp_path, "w") as f:
+                json.dump({"updated_at": now, "counts": {key: round(count, 3) for key, count in top}}, f)
+            os.replace(temp_path, self.path)
+
+    def top(self, n: int) -> List[Dict[str, Any]]:
+        """The n most frequent requests as SearchRequest fields plus their decayed count"""
+        with self._file_lock():
+            counts, _ = self._load()
+        with self._lock:
+            for key, count in self._pending.items():
+                counts[key] = counts.get(key, 0.0) + count
+
+        requests = []
+        for key, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)[:n]:
+            query_text, search_type, top_k, coarse_to_fine = json.loads(key)
+            requests.append(
+                {
+                    "query_text": query_text,
+                    "search_type": search_type,
+                    "top_k": top_k,
+                    "coarse_to_fine": coarse_to_fine,
+                    "count": count,
+                }
+            )
+        return requests
+
+    def upload_to_s3(self, s3_client, bucket: str, key: str):
+        with self._file_lock():
+            if not os.path.exists(self.path):
+                return
+            s3_client.upload_file(self.path, bucket, key)
+        logger.info(f"📈 Uploaded popular-query log to s3://{bucket}/{key}")
+
+    def bootstrap_from_s3(self, s3_client, bucket: str, key: str) -> bool:
+        """Download the S3 copy when no local log exists yet"""
+        with self._file_lock():
+            if os.path.exists(self.path):
+                return False
+            download_path = f"{self.path}.download"
+            try:
+                s3_client.download_file(bucket, key, download_path)
+                os.replace(download_path, self.path)
+            except ClientError as e:
+                logger.info(f"No popular-query log at s3://{bucket}/{key}: {e}")
+                return False
+            finally:
+                if os.path.exists(download_path):
+                    os.remove(download_path)
+        logger.info(f"📈 Bootstrapped popular-query log from s3://{bucket}/{key}")
+        return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"path": self.path, "recorded": self.recorded, "pending": len(self._pending)}
+
+
+class VideoCatalogCache:
+    """
+    Cache of the /list response. The expensive per-video aggregation is only rerun when a cheap
+    change signal (clip count and newest created_at) moves. The serialized response, including
+    presigned URLs, is rebuilt when the catalog changes or a new presign window starts (every
+    half URL lifetime). Its weak ETag is derived from both, so every worker process answers
+    If-None-Match the same way and a 304 never leaves a client with expired URLs.
+    """
+
+    def __init__(self, presign_seconds: int):
+        self.presign_seconds = presign_seconds
+        self._signature = None
+        self._videos: Optional[List[Dict]] = None
+        self._body: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self._window = None
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+        self.refreshed_at = None
+        self.served = 0
+        self.not_modified = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._videos is not None
+
+    @staticmethod
+    def change_signature(client) -> str:
+        response = client.search(
+            index=INDEX_NAME,
+            body={"size": 0, "track_total_hits": True, "aggs": {"latest": {"max": {"field": "created_at"}}}},
+        )
+        return f"{response['hits']['total']['value']}:{response['aggregations']['latest'].get('value')}"
+
+    def refresh(self, client) -> bool:
+        """Rebuild the video list if the change signal moved; True if it was rebuilt"""
+        with self._lock:
+            signature = self.change_signature(client)
+            self.refreshed_at = time.time()
+            if signature == self._signature and self._videos is not None:
+                return False
+            videos = get_all_unique_videos(client)
+            if not videos and not signature.startswith("0:"):
+                # get_all_unique_videos logs and returns [] on errors; keep serving the old list,
+                # or stay not ready when there is none yet
+                logger.warning("Video catalog rebuild returned no videos for a non-empty index, keeping the previous list")
+                return False
+            self._videos = videos
+            self._signature = signature
+            self._body = None
+            self.rebuilds += 1
+        logger.info(f"📚 Video catalog rebuilt: {len(self._videos)} videos (signature {signature})")
+        return True
+
+    def response(self, s3_client) -> tuple[bytes, str]:
+        """Serialized VideosListResponse and its ETag, presigning again once per window"""
+        window = int(time.time() // max(self.presign_seconds // 2, 1))
+        with self._lock:
+            if self._body is None or window != self._window:
+                video_list = []
+                for video in self._videos:
+                    presigned_url = convert_s3_to_presigned_url(s3_client, video["video_path"], self.presign_seconds)
+                    thumbnail_path = video.get("thumbnail_path")
+                    thumbnail_url = thumbnail_path and (
+                        thumbnail_cdn_url(thumbnail_path)
+                        or convert_s3_to_presigned_url(s3_client, thumbnail_path, self.presign_seconds)
+                    )
+                    video_list.append(
+                        VideoMetadata(
+                            video_id=video["video_id"],
+                            video_path=presigned_url if presigned_url else video["video_path"],
+                            title=video.get("clip_text") or f"Video {video['video_id'][:8]}",
+                            thumbnail_url=thumbnail_url or None,
+                            duration=video.get("duration"),
+                            upload_date=video.get("upload_date"),
+                            clips_count=video.get("clips_count", 0),
+                        )
+                    )
+                self._body = VideosListResponse(videos=video_list, total=len(video_list)).model_dump_json().encode()
+                digest = hashlib.blake2b(self._signature.encode(), digest_size=8).hexdigest()
+                self._etag = f'W/"{digest}-{window}"'
+                self._window = window
+            self.served += 1
+            return self._body, self._etag
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "videos": len(self._videos) if self._videos is not None else None,
+                "signature": self._signature,
+                "etag": self._etag,
+                "rebuilds": self.rebuilds,
+                "refreshed_at": self.refreshed_at,
+                "served": self.served,
+                "not_modified": self.not_modified,
+            }
+
+
+class VideoCatalogIndex:
+    """
+    /list served straight off the video catalog index, one small document per video part that the
+    ingest lambda upserts. Pages are sorted and searched server-side and continued with search_after,
+    so a page costs the same however large the library grows. Cursors are opaque base64 JSON bound
+    to the sort, order and search text they were issued for. Presigned URLs are reused within a
+    presign window, so repeated pages serialize identically and carry a stable weak ETag.
+    """
+
+    def __init__(self, index_name: str, presign_seconds: int):
+        self.index_name = index_name
+        self.presign_seconds = presign_seconds
+        self.ready = False
+        self._presigned = LRUCache(4 * CATALOG_MAX_PAGE_SIZE)
+        self.pages = 0
+        self.not_modified = 0
+        self.backfilled = 0
+        self.backfilled_at = None
+
+    def create_index(self, client):
+        """Same mapping as the ingest lambda, for environments where /list runs before the first ingest"""
+        if client.indices.exists(index=self.index_name):
+            return
+        index_body = {
+            "settings": {"index": {"number_of_shards": 1, "number_of_replicas": 1}},
+            "mappings": {
+                "properties": {
+                    "catalog_id": {"type": "keyword"},
+                    "video_id": {"type": "keyword"},
+                    "video_path": {"type": "keyword"},
+                    "video_name": {
+                        "type": "text",
+                        "fields": {"raw": {"type": "keyword", "normalizer": "lowercase"}},
+                    },
+                    "part": {"type": "integer"},
+                    "part_count": {"type": "integer"},
+                    "clip_count": {"type": "integer"},
+                    "duration": {"type": "float"},
+                    "poster_path": {"type": "keyword", "index": False},
+                    "sprite_path": {"type": "keyword", "index": False},
+                    "sprite_frames": {"type": "integer"},
+                    "created_at": {"type": "date"},
+                }
+            },
+        }
+        client.indices.create(index=self.index_name, body=index_body)
+        logger.info(f"✓ Created video catalog index: {self.index_name}")
+
+    def ensure(self, client) -> bool:
+        """
+        Create the catalog index if needed and reconcile it with the clip index video by video:
+        videos whose clip count differs (or that are missing, e.g. ingested before the catalog
+        existed) are backfilled, and catalog documents of videos without clips are deleted.
+        Marks the catalog ready for /list.
+        """
+        self.create_index(client)
+        clip_counts = self.clip_counts(client)
+        cataloged = {
+            hit["_source"]["video_id"]: (hit["_id"], hit["_source"].get("clip_count"))
+            for hit in helpers.scan(
+                client, index=self.index_name, query={"_source": ["video_id", "clip_count"]}, size=1000
+            )
+        }
+        stale = [video_id for video_id, count in clip_counts.items() if cataloged.get(video_id, (None, None))[1] != count]
+        orphaned = [catalog_id for video_id, (catalog_id, _) in cataloged.items() if video_id not in clip_counts]
+
+        if stale:
+            logger.info(f"📚 Video catalog is out of date for {len(stale)}/{len(clip_counts)} videos, backfilling from {INDEX_NAME}")
+            self.backfill(client, stale)
+        if orphaned:
+            deleted, _ = helpers.bulk(
+                client,
+                ({"_op_type": "delete", "_index": self.index_name, "_id": catalog_id} for catalog_id in orphaned),
+                raise_on_error=False,
+                refresh="wait_for",
+            )
+            logger.info(f"🧹 Removed {deleted} catalog documents of videos without clips")
+        self.ready = True
+        return True
+
+    @staticmethod
+    def clip_counts(client) -> Dict[str, int]:
+        """Clips per video_id in the clip index, paging a composite aggregation"""
+        counts = {}
+        after = None
+        while True:
+            composite = {"size": CATALOG_BACKFILL_BATCH_SIZE, "sources": [{"video_id": {"terms": {"field": "video_id"}}}]}
+            if after:
+                composite["after"] = after
+            aggregation = client.search(
+                index=INDEX_NAME, body={"size": 0, "aggs": {"videos": {"composite": composite}}}
+            )["aggregations"]["videos"]
+            counts.update((bucket["key"]["video_id"], bucket["doc_count"]) for bucket in aggregation["buckets"])
+            after = aggregation.get("after_key")
+            if not aggregation["buckets"] or not after:
+                return counts
+
+    def backfill(self, client, video_ids: Optional[List[str]] = None) -> int:
+        """Rebuild the catalog documents of video_ids (default: every video) from the clip index"""
+        videos = []
+        after = None
+        while True:
+            composite = {"size": CATALOG_BACKFILL_BATCH_SIZE, "sources": [{"video_id": {"terms": {"field": "video_id"}}}]}
+            if after:
+                composite["after"] = after
+            body = {
+                "size": 0,
+                "query": {"terms": {"video_id": video_ids}} if video_ids else {"match_all": {}},
+                "aggs": {
+                    "videos": {
+                        "composite": composite,
+                        "aggs": {
+                            "first_clip": {
+                                "top_hits": {
+                                    "size": 1,
+                                    "sort": [{"timestamp_start": "asc"}],
+                                    "_source": ["video_id", "video_path", "video_name", "part", "video_duration_sec"],
+                                }
+                            },
+                            "poster": {
+                                "filter": {"exists": {"field": "thumbnail_path"}},
+                                "aggs": {
+                                    "first": {
+                                        "top_hits": {
+                                            "size": 1,
+                                            "sort": [{"timestamp_start": "asc"}],
+                                            "_source": ["thumbnail_path"],
+                                        }
+                                    }
+                                },
+                            },
+                            "clip_count": {"value_count": {"field": "video_id"}},
+                            "latest": {"max": {"field": "created_at"}},
+                        },
+                    }
+                },
+            }
+            aggregation = client.search(index=INDEX_NAME, body=body)["aggregations"]["videos"]
+            for bucket in aggregation["buckets"]:
+                source = bucket["first_clip"]["hits"]["hits"][0]["_source"]
+                poster_hits = bucket["poster"]["first"]["hits"]["hits"]
+                part = source.get("part") or 0
+                videos.append(
+                    {
+                        "catalog_id": f"{source['video_id']}_part{part}",
+                        "video_id": source["video_id"],
+                        "video_path": source.get("video_path"),
+                        "video_name": source.get("video_name"),
+                        "part": part,
+                        "clip_count": bucket["clip_count"]["value"],
+                        "duration": source.get("video_duration_sec"),
+                        "poster_path": poster_hits[0]["_source"].get("thumbnail_path") if poster_hits else None,
+                        "created_at": bucket["latest"].get("value_as_string"),
+                    }
+                )
+            after = aggregation.get("after_key")
+            if not aggregation["buckets"] or not after:
+                break
+
+        actions = [
+            {"_op_type": "index", "_index": self.index_name, "_id": video["catalog_id"], "_source": video}
+            for video in videos
+        ]
+        written, _ = helpers.bulk(client, actions, chunk_size=500, raise_on_error=False, refresh="wait_for")
+        self.backfilled = written
+        self.backfilled_at = time.time()
+        logger.info(f"✓ Video catalog backfilled: {written} video parts")
+        return written
+
+    @staticmethod
+    def encode_cursor(sort: str, order: str, q: Optional[str], after: List) -> str:
+        payload = json.dumps({"s": sort, "o": order, "q": q, "a": after}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort: str, order: str, q: Optional[str]) -> List:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        except (ValueError, TypeError):
+            raise ValueError("Malformed cursor")
+        if not isinstance(payload, dict) or not isinstance(payload.get("a"), list):
+            raise ValueError("Malformed cursor")
+        if (payload.get("s"), payload.get("o"), payload.get("q")) != (sort, order, q):
+            raise ValueError("Cursor was issued for a different sort, order or search")
+        return payload["a"]
+
+    def query_body(self, limit: int, sort: str, order: str, q: Optional[str], after: Optional[List]) -> Dict:
+        field = CATALOG_SORT_FIELDS[sort]
+        sort_clause = {field: {"order": order}} if field == "_score" else {field: {"order": order, "missing": "_last"}}
+        body = {
+            "size": limit,
+            "track_total_hits": True,
+            "query": {"match_bool_prefix": {"video_name": q}} if q else {"match_all": {}},
+            # catalog_id breaks ties, so search_after never skips or repeats a document
+            "sort": [sort_clause, {"catalog_id": {"order": "asc"}}],
+        }
+        if after:
+            body["search_after"] = after
+        return body
+
+    def _presign(self, s3_client, path: Optional[str], window: int) -> Optional[str]:
+        if not path:
+            return None
+        url = self._presigned.get((path, window))
+        if url is None:
+            url = convert_s3_to_presigned_url(s3_client, path, self.presign_seconds)
+            if url:
+                self._presigned.put((path, window), url)
+        return url
+
+    def _image_url(self, s3_client, path: Optional[str], window: int) -> Optional[str]:
+        """CDN URL of a poster or sprite when a CDN is configured, a window-cached presigned URL otherwise"""
+        return thumbnail_cdn_url(path) or self._presign(s3_client, path, window)
+
+    def page(self, client, s3_client, limit: int, cursor: Optional[str], sort: str, order: str,
+             q: Optional[str]) -> tuple[bytes, str]:
+        """One serialized VideosListResponse page and its weak ETag; raises ValueError for bad parameters"""
+        after = self.decode_cursor(cursor, sort, order, q) if cursor else None
+        response = client.search(index=self.index_name, body=self.query_body(limit, sort, order, q, after))
+        hits = response["hits"]["hits"]
+        next_cursor = (
+            self.encode_cursor(sort, order, q, hits[-1]["sort"]) if len(hits) == limit else None
+        )
+
+        part_counts = self.part_counts(client, [hit["_source"].get("video_path") for hit in hits])
+
+        window = int(time.time() // max(self.presign_seconds // 2, 1))
+        videos = []
+        for hit in hits:
+            doc = hit["_source"]
+            videos.append(
+                VideoMetadata(
+                    video_id=doc["video_id"],
+                    video_path=self._presign(s3_client, doc.get("video_path"), window) or doc.get("video_path", ""),
+                    title=doc.get("video_name") or f"Video {doc['video_id'][:8]}",
+                    thumbnail_url=self._image_url(s3_client, doc.get("poster_path"), window),
+                    sprite_url=self._image_url(s3_client, doc.get("sprite_path"), window),
+                    sprite_frames=doc.get("sprite_frames"),
+                    duration=doc.get("duration"),
+                    upload_date=doc.get("created_at"),
+                    clips_count=doc.get("clip_count", 0),
+                    part=doc.get("part"),
+                    part_count=part_counts.get(doc.get("video_path")),
+                )
+            )
+        body = VideosListResponse(
+            videos=videos, total=response["hits"]["total"]["value"], next_cursor=next_cursor
+        ).model_dump_json().encode()
+
+        # Derived from the unsigned documents, so every worker agrees on the tag within a window
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(json.dumps([hit["_source"] for hit in hits], sort_keys=True, default=str).encode())
+        digest.update(f"{response['hits']['total']['value']}:{next_cursor}:{sorted(part_counts.items())}".encode())
+        self.pages += 1
+        return body, f'W/"{digest.hexdigest()}-{window}"'
+
+    def part_counts(self, client, video_paths: List[str]) -> Dict[str, int]:
+        """
+        Catalog documents (parts) per source video, counted at read time: parts of one video are
+        ingested in parallel, so a count stored with each part would race
+        """
+        video_paths = sorted({path for path in video_paths if path})
+        if not video_paths:
+            return {}
+        response = client.search(
+            index=self.index_name,
+            body={
+                "size": 0,
+                "query": {"terms": {"video_path": video_paths}},
+                "aggs": {"parts": {"terms": {"field": "video_path", "size": len(video_paths)}}},
+            },
+        )
+        return {bucket["key"]: bucket["doc_count"] for bucket in response["aggregations"]["parts"]["buckets"]}
+
+    def stats(self) -> Dict:
+        return {
+            "index": self.index_name,
+            "ready": self.ready,
+            "pages": self.pages,
+            "not_modified": self.not_modified,
+            "backfilled": self.backfilled,
+            "backfilled_at": self.backfilled_at,
+            "presigned_urls": self._presigned.stats(),
+        }
+
+
+class SuggestionIndex:
+    """
+    Typeahead over video names and popular search queries. Each entry is indexed under every word
+    start of its normalized text in one sorted list of (suffix, entry id) pairs, so a prefix lookup
+    is two bisects plus a top-k by weight over the matching slice, memoized until the index changes.
+    rebuild() swaps in a freshly built index; add() inserts or reweights one entry in place, holding
+    new query texts back until their count reaches min_query_count.
+    """
+
+    def __init__(self, memo_size: int, min_query_count: float = SUGGEST_MIN_QUERY_COUNT):
+        self.min_query_count = min_query_count
+        self._pending = LRUCache(memo_size)
+        self._texts: List[str] = []
+        self._weights: List[float] = []
+        self._sources: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._pairs: List[tuple] = []
+        self._generation = 0
+        self._memo = LRUCache(memo_size)
+        self._lock = threading.Lock()
+        self._latencies_us = deque(maxlen=1000)
+        self.built_at = None
+        self.lookups = 0
+        self.added = 0
+
+    @staticmethod
+    def _suffixes(normalized: str) -> List[str]:
+        return [normalized[i:] for i in range(len(normalized)) if i == 0 or normalized[i - 1] == " "]
+
+    def rebuild(self, entries: List[tuple]):
+        """Replace the index with (text, weight, source) entries; duplicate texts add up their weights"""
+        texts, weights, sources, ids = [], [], [], {}
+        for text, weight, source in entries:
+            normalized = normalize_query_text(text)
+            if not normalized or len(normalized) > SUGGEST_MAX_TEXT_LENGTH:
+                continue
+            entry_id = ids.get(normalized)
+            if entry_id is None:
+                ids[normalized] = len(texts)
+                texts.append(text.strip())
+                weights.append(weight)
+                sources.append(source)
+            else:
+                weights[entry_id] += weight
+        pairs = sorted((suffix, entry_id) for normalized, entry_id in ids.items() for suffix in self._suffixes(normalized))
+
+        with self._lock:
+            self._texts, self._weights, self._sources, self._ids, self._pairs = texts, weights, sources, ids, pairs
+            self._pending = LRUCache(self._pending.max_size)
+            self._generation += 1
+            self.built_at = time.time()
+
+    def add(self, text: str, weight: float = 1.0, source: str = "query"):
+        """
+        Count one more use of text. A new query text is inserted into the sorted pairs once
+        its count since the last rebuild reaches min_query_count.
+        """
+        normalized = normalize_query_text(text)
+        if not normalized or len(normalized) > SUGGEST_MAX_TEXT_LENGTH:
+            return
+        with self._lock:
+            entry_id = self._ids.get(normalized)
+            if entry_id is None and source == "query":
+                weight += self._pending.get(normalized) or 0.0
+                if weight < self.min_query_count:
+                    self._pending.put(normalized, weight)
+                    return
+            if entry_id is None:
+                entry_id = self._ids[normalized] = len(self._texts)
+                self._texts.append(text.strip())
+                self._weights.append(weight)
+                self._sources.append(source)
+                for suffix in self._suffixes(normalized):
+                    bisect.insort(self._pairs, (suffix, entry_id))
+            else:
+                self._weights[entry_id] += weight
+            self._generation += 1
+            self.added += 1
+
+    def lookup(self, prefix: str, limit: int) -> List[Dict]:
+        """Up to limit entries with a word starting with prefix, most frequent first"""
+        started = time.perf_counter()
+        normalized = normalize_query_text(prefix)
+        if not normalized:
+            return []
+        memo_key = (self._generation, normalized, limit)
+        suggestions = self._memo.get(memo_key)
+        if suggestions is None:
+            with self._lock:
+                lo = bisect.bisect_left(self._pairs, (normalized,))
+                hi = bisect.bisect_left(self._pairs, (normalized + "\U0010ffff",), lo)
+                matches = {entry_id for _, entry_id in self._pairs[lo:hi]}
+                best = heapq.nlargest(limit, matches, key=lambda i: (self._weights[i], -len(self._texts[i])))
+                suggestions = [
+                    {"text": self._texts[i], "source": self._sources[i], "weight": round(self._weights[i], 3)}
+                    for i in best
+                ]
+                self._memo.put(memo_key, suggestions)
+        self.lookups += 1
+        self._latencies_us.append((time.perf_counter() - started) * 1e6)
+        return suggestions
+
+    def stats(self) -> Dict:
+        latencies = sorted(self._latencies_us)
+        with self._lock:
+            return {
+                "entries": len(self._texts),
+                "pairs": len(self._pairs),
+                "built_at": self.built_at,
+                "lookups": self.lookups,
+                "added": self.added,
+                "p50_us": round(latencies[len(latencies) // 2], 1) if latencies else None,
+                "p99_us": round(latencies[int(len(latencies) * 0.99)], 1) if latencies else None,
+                "memo": self._memo.stats(),
+            }
+
+
+class ImageEmbeddingCache:
+    """
+    LRU cache of query-image embeddings, addressable two ways:
+    - exactly, by (sha256 of the uploaded bytes, query text): repeats skip decoding entirely
+    - approximately, by (perceptual hash, query text): re-encoded, resized or EXIF-stripped
+      copies of the same picture match within max_distance differing hash bits
+    """
+
+    def __init__(self, max_size: int, max_distance: int, shared: Optional[SharedEmbeddingCache] = None):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        # Exact lookups missing here fall back to the cache shared with other worker processes
+        self.shared = shared
+        self._data = OrderedDict()  # (sha256, text) -> (phash, embedding)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+
+    def get_exact(self, sha256: str, text: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._data.get((sha256, text))
+            if entry is not None:
+                self._data.move_to_end((sha256, text))
+                self.exact_hits += 1
+                return entry[1]
+
+        embedding = self.shared.get(f"{sha256}:{text}") if self.shared else None
+        if embedding is not None:
+            self.put(sha256, None, text, embedding, share=False)
+            with self._lock:
+                self.exact_hits += 1
+        return embedding
+
+    def get_similar(self, phash: Optional[int], text: str) -> Optional[tuple[List[float], int]]:
+        """Closest cached embedding for the same text within max_distance bits, as (embedding, distance)"""
+        with self._lock:
+            best_key, best_distance = None, self.max_distance + 1
+            if phash is not None:
+                for key, (cached_phash, _) in self._data.items():
+                    if key[1] != text or cached_phash is None:
+                        continue
+                    distance = (phash ^ cached_phash).bit_count()
+                    if distance < best_distance:
+                        best_key, best_distance = key, distance
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(best_key)
+            self.perceptual_hits += 1
+            return self._data[best_key][1], best_distance
+
+    def put(self, sha256: str, phash: Optional[int], text: str, embedding: List[float], share: bool = True):
+        with self._lock:
+            self._data[(sha256, text)] = (phash, embedding)
+            self._data.move_to_end((sha256, text))
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        if share and self.shared:
+            self.shared.put(f"{sha256}:{text}", embedding)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.exact_hits + self.perceptual_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "max_distance": self.max_distance,
+                "exact_hits": self.exact_hits,
+                "perceptual_hits": self.perceptual_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "shared": self.shared.stats() if self.shared else None,
+            }
+
+
+class BedrockHedger:
+    """
+    Hedged requests for Bedrock calls with a long latency tail.
+    A call that may be hedged runs on a hedge thread; if it has not returned after the configured
+    percentile of that operation's recent latencies, an identical backup call is started and
+    whichever succeeds first wins (the loser finishes in the background and is discarded).
+    Hedges are paid for from one global token bucket that earns budget_ratio tokens per call,
+    so they never add more than about budget_ratio to Bedrock spend. A backup takes its own slot
+    of the operation's limiter, and no hedge is tried while the limiter is saturated or the
+    breaker is not closed; those calls run inline on the caller's thread.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        percentile: float,
+        min_delay_ms: float,
+        budget_ratio: float,
+        max_burst: int = BEDROCK_HEDGE_MAX_BURST,
+        window: int = BEDROCK_HEDGE_LATENCY_WINDOW,
+        min_samples: int = BEDROCK_HEDGE_MIN_SAMPLES,
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay_ms = min_delay_ms
+        self.budget_ratio = budget_ratio
+        self.max_burst = max_burst
+        self.window = window
+        self.min_samples = min_samples
+        self._tokens = 0.0
+        self._latencies: Dict[str, deque] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=BEDROCK_POOL_MAXSIZE, thread_name_prefix="bedrock-hedge")
+
+    def _record(self, operation: str, started: float):
+        latency_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._latencies.setdefault(operation, deque(maxlen=self.window)).append(latency_ms)
+
+    def _submit(self, operation: str, fn):
+        started = time.perf_counter()
+        future = self._executor.submit(fn)
+        future.add_done_callback(lambda f: self._record(operation, started))
+        return future
+
+    def hedge_delay_ms(self, operation: str) -> Optional[float]:
+        """Current hedge delay for an operation, None until enough latencies have been seen"""
+        with self._lock:
+            latencies = self._latencies.get(operation)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            return max(self.min_delay_ms, float(np.percentile(latencies, self.percentile)))
+
+    def _take_hedge_token(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    @staticmethod
+    def _can_hedge(limiter, breaker) -> bool:
+        """No backups while the dependency is saturated or its breaker is open or probing"""
+        return not (limiter and limiter.saturated) and not (breaker and breaker.state != "closed")
+
+    def call(self, operation: str, fn, limiter=None, breaker=None):
+        """
+        Run fn() (a complete Bedrock call, including reading the response body), hedged if enabled.
+        limiter and breaker are the operation's AdaptiveConcurrencyLimiter and CircuitBreaker.
+        """
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            stats = self._stats.setdefault(operation, {"calls": 0, "hedged": 0, "hedge_wins": 0, "skipped": 0})
+            stats["calls"] += 1
+            self._tokens = min(self.max_burst, self._tokens + self.budget_ratio)
+            has_token = self._tokens >= 1.0
+
+        delay_ms = self.hedge_delay_ms(operation)
+        if delay_ms is None or not has_token or not self._can_hedge(limiter, breaker):
+            if delay_ms is not None and has_token:
+                with self._lock:
+                    stats["skipped"] += 1
+            started = time.perf_counter()
+            try:
+                return fn()
+            finally:
+                self._record(operation, started)
+
+        primary = self._submit(operation, fn)
+        done, _ = wait([primary], timeout=delay_ms / 1000)
+        if done:
+            return primary.result()
+        if not self._can_hedge(limiter, breaker) or (limiter and not limiter.try_acquire_nowait()):
+            with self._lock:
+                stats["skipped"] += 1
+            return primary.result()
+        if not self._take_hedge_token():
+            if limiter:
+                limiter.release_threadsafe()
+            return primary.result()
+
+        backup = self._submit(operation, fn)
+        if limiter:
+            backup.add_done_callback(lambda f: limiter.release_threadsafe())
+        with self._lock:
+            stats["hedged"] += 1
+        logger.info(f"⏱️ Hedging {operation} after {delay_ms:.0f} ms")
+
+        pending = {primary, backup}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None or not pending:
+                    if future is backup and future.exception() is None:
+                        with self._lock:
+                            stats["hedge_wins"] += 1
+                    return future.result()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            operations = {}
+            for operation, stats in self._stats.items():
+                latencies = self._latencies.get(operation, ())
+                operations[operation] = {
+                    **stats,
+                    "hedge_rate": round(stats["hedged"] / stats["calls"], 4) if stats["calls"] else 0.0,
+                    "hedge_win_rate": round(stats["hedge_wins"] / stats["hedged"], 4) if stats["hedged"] else 0.0,
+                    "p50_ms": round(float(np.percentile(latencies, 50)), 1) if latencies else None,
+                    "p99_ms": round(float(np.percentile(latencies, 99)), 1) if latencies else None,
+                }
+            return {
+                "enabled": self.enabled,
+                "percentile": self.percentile,
+                "budget_ratio": self.budget_ratio,
+                "budget_tokens": round(self._tokens, 2),
+                "operations": operations,
+            }
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker (closed -> open -> half_open -> closed).
+    While open, calls are rejected immediately with CircuitOpenError. After reset_seconds a
+    single probe call is let through; success closes the circuit, failure re-opens it.
+    Client errors (4xx other than throttling) are the caller's fault and do not count.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != "closed"
+
+    @staticmethod
+    def _counts_as_failure(error: Exception) -> bool:
+        if isinstance(error, ClientError):
+            status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 500)
+            return status >= 500 or status == 429
+        return True
+
+    def _before_call(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} circuit is open")
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"{self.name} circuit is half-open, probe in flight")
+                self._probe_in_flight = True
+
+    def _after_call(self, error: Optional[Exception]):
+        with self._lock:
+            was_probe = self._probe_in_flight
+            self._probe_in_flight = False
+            if error is None or not self._counts_as_failure(error):
+                if self.state != "closed":
+                    logger.info(f"✓ {self.name} circuit closed")
+                self.state = "closed"
+                self.consecutive_failures = 0
+                return
+
+            self.failures += 1
+            self.consecutive_failures += 1
+            if was_probe or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    logger.warning(
+                        f"⚡ {self.name} circuit opened after {self.consecutive_failures} failures: {error}"
+                    )
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def call(self, fn):
+        self._before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            self._after_call(e)
+            raise
+        self._after_call(None)
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+            }
+
+
+class OverloadedError(HTTPException):
+    """A dependency's admission queue is full or the wait for a slot timed out (HTTP 429)"""
+
+    def __init__(self, dependency: str):
+        super().__init__(
+            status_code=429,
+            detail=f"Service is busy ({dependency}), please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+# Set on a limiter's executor thread while run() executes a call there (see _run_admitted)
+_admitted_call = threading.local()
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Bulkhead for one dependency: an AIMD concurrency limit, a FIFO wait queue and a bounded
+    executor the calls run on, so a slow dependency cannot take over the shared thread pool.
+    - Additive increase: +1/limit per call that finished under the latency target
+    - Multiplicative decrease: limit * ADMISSION_BACKOFF on throttling or slow calls,
+      at most once per ADMISSION_DECREASE_INTERVAL_SECONDS
+    - Load shedding: OverloadedError (429) when the queue is full or a slot takes too long
+    acquire/release run on the event loop; feedback (on_result/on_overload) may come from threads.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        max_limit: int,
+        latency_target_ms: float,
+        min_limit: int = ADMISSION_MIN_LIMIT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_wait_ms: float = ADMISSION_MAX_WAIT_MS,
+        self_measured: bool = False,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target_ms = latency_target_ms
+        self.max_queue = max_queue
+        self.max_wait_ms = max_wait_ms
+        # True when run() should feed its own latency back (no call-level hook for this dependency)
+        self.self_measured = self_measured
+        self._limit = float(min(initial_limit, max_limit))
+        self._in_flight = 0
+        self._waiters: deque = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_limit, thread_name_prefix=name)
+        self.admitted = 0
+        self.shed = 0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    def on_result(self, latency_ms: float, overloaded: bool = False):
+        """AIMD feedback from one completed call"""
+        if overloaded or latency_ms > self.latency_target_ms:
+            self.on_overload()
+            return
+        with self._lock:
+            self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+
+    def on_overload(self) -> bool:
+        """Multiplicative decrease; returns False if a decrease happened too recently"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < ADMISSION_DECREASE_INTERVAL_SECONDS:
+                return False
+            self._last_decrease = now
+            self._limit = max(self.min_limit, self._limit * ADMISSION_BACKOFF)
+            self.decreases += 1
+            return True
+
+    @property
+    def saturated(self) -> bool:
+        return self._in_flight >= self.limit or bool(self._waiters)
+
+    def _grant_waiters(self):
+        while self._waiters:
+            with self._lock:
+                if self._in_flight >= self.limit:
+                    return
+                waiter = self._waiters.popleft()
+                if waiter.done():
+                    continue
+                self._in_flight += 1
+            waiter.set_result(None)
+
+    async def acquire(self):
+        self._loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                self.admitted += 1
+                return
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            raise OverloadedError(self.name)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=self.max_wait_ms / 1000)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        if not waiter.done():
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            self.shed += 1
+            raise OverloadedError(self.name)
+        self.admitted += 1
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._grant_waiters()
+
+    def try_acquire_nowait(self) -> bool:
+        """From any thread: take a slot only if one is free right now and nobody is queued"""
+        with self._lock:
+            if self._loop is None or self._in_flight >= self.limit or self._waiters:
+                return False
+            self._in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release_threadsafe(self):
+        """Release a slot taken with try_acquire_nowait from a worker thread"""
+        try:
+            self._loop.call_soon_threadsafe(self.release)
+        except RuntimeError:
+            pass  # event loop already closed (shutdown)
+
+    def _run_admitted(self, fn, *args, **kwargs):
+        """Executor side of run(): marks the thread so call-level hooks know which limiter admitted it"""
+        _admitted_call.limiter = self
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _admitted_call.limiter = None
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking call on this dependency's executor once a slot is available"""
+        await self.acquire()
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(self._run_admitted, fn, *args, **kwargs)
+            )
+        finally:
+            if self.self_measured:
+                self.on_result((time.perf_counter() - started) * 1000)
+            self.release()
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "max_limit": self.max_limit,
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "decreases": self.decreases,
+        }
+
+
+def _is_throttling_error(error: Exception) -> bool:
+    """Bedrock/OpenSearch errors that mean "send less" rather than "this request is wrong"."""
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in ("ThrottlingException", "ServiceUnavailableException", "ModelNotReadyException") or status in (429, 503)
+    if isinstance(error, TransportError):
+        return error.status_code in (429, 503, "TIMEOUT", "N/A")
+    return isinstance(error, (TimeoutError, ReadTimeoutError, ConnectTimeoutError))
+
+
+class IntentPrototypeClassifier:
+    """
+    Local replacement for the Nova Micro VISUAL_FOCUS/AUDIO_FOCUS/BALANCED call.
+    Scores a query embedding against one L2-normalized prototype per class and turns the
+    cosine similarities into probabilities with a temperature softmax. The probabilities
+    blend the per-class [visual, audio] weights into continuous RRF weights.
+    """
+
+    def __init__(self, temperature: float):
+        self.temperature = temperature
+        self.labels: List[str] = []
+        self.prototypes: Optional[np.ndarray] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.prototypes is not None
+
+    def set_prototypes(self, prototypes: Dict[str, List[float]]):
+        self.labels = list(prototypes)
+        self.prototypes = _l2_normalize_rows(
+            np.asarray([prototypes[label] for label in self.labels], dtype=np.float32)
+        )
+
+    def load_or_build(self, bedrock_runtime, s3_client=None, path: str = INTENT_PROTOTYPES_PATH):
+        """
+        Load prototypes from path, else from the video bucket, else embed INTENT_PROTOTYPE_PHRASES
+        with Marengo 3 and save them to both. Worker processes serialize on a lock file, so only the
+        first one downloads or builds and the rest load its (atomically replaced) file.
+        """
+        lock_fd = None
+        try:
+            if not os.path.exists(path):
+                lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            self._load_or_build(bedrock_runtime, s3_client, path)
+        except Exception as e:
+            logger.error(f"Error preparing intent prototypes: {e}", exc_info=True)
+        finally:
+            if lock_fd is not None:
+                os.close(lock_fd)
+
+    @staticmethod
+    def _s3_key() -> str:
+        """Bucket key of the prototypes built from the current model and seed phrases"""
+        digest = hashlib.blake2b(
+            json.dumps([MARENGO3_MODEL_ID, INTENT_PROTOTYPE_PHRASES], sort_keys=True).encode(), digest_size=8
+        ).hexdigest()
+        return f"{INTENT_PROTOTYPES_S3_PREFIX}{digest}.json"
+
+    @staticmethod
+    def _save(prototypes: Dict[str, List[float]], path: str):
+        try:
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(prototypes, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save intent prototypes to {path}: {e}")
+
+    def _load_or_build(self, bedrock_runtime, s3_client, path: str):
+        bucket = os.environ.get("AWS_S3_BUCKET")
+        try:
+            if os.path.exists(path):
+                with open(path) as f:
+                    self.set_prototypes(json.load(f))
+                logger.info(f"✓ Loaded intent prototypes from {path}")
+                self.calibrate()
+                return
+
+            if s3_client and bucket:
+                try:
+                    body = s3_client.get_object(Bucket=bucket, Key=self._s3_key())["Body"].read()
+                    prototypes = json.loads(body)
+                    self.set_prototypes(prototypes)
+                    logger.info(f"✓ Loaded intent prototypes from s3://{bucket}/{self._s3_key()}")
+                    self.calibrate()
+                    self._save(prototypes, path)
+                    return
+                except ClientError as e:
+                    if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                        logger.warning(f"Could not download intent prototypes: {e}")
+
+            prototypes = {}
+            for label, phrases in INTENT_PROTOTYPE_PHRASES.items():
+                embeddings = [generate_embedding_marengo3(bedrock_runtime, text=phrase) for phrase in phrases]
+                embeddings = [e for e in embeddings if e]
+                if not embeddings:
+                    logger.warning(f"Could not embed prototype phrases for {label}, classifier disabled")
+                    return
+                centroid = _l2_normalize_rows(np.asarray(embeddings, dtype=np.float32)).mean(axis=0)
+                prototypes[label] = centroid.tolist()
+
+            self.set_prototypes(prototypes)
+            logger.info("✓ Built intent prototypes from seed phrases")
+            self.calibrate()
+            self._save(prototypes, path)
+
+            if s3_client and bucket:
+                try:
+                    s3_client.put_object(
+                        Bucket=bucket, Key=self._s3_key(), Body=json.dumps(prototypes).encode(),
+                        ContentType="application/json",
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not upload intent prototypes: {e}")
+
+        except Exception as e:
+            logger.error(f"Error preparing intent prototypes: {e}", exc_info=True)
+
+    def fit_temperature(
+        self, records: List[Dict], temperatures: np.ndarray = INTENT_CALIBRATION_TEMPERATURES
+    ) -> Optional[tuple[float, float]]:
+        """
+        Temperature with the lowest mean negative log-likelihood of the logged LLM labels
+        (records as written by log_intent_decision). Returns (temperature, nll), or None
+        when no record is usable.
+        """
+        dim = self.prototypes.shape[1]
+        usable = [r for r in records if r.get("llm_focus") in self.labels and len(r.get("embedding") or ()) == dim]
+        if not usable:
+            return None
+
+        similarities = _l2_normalize_rows(np.asarray([r["embedding"] for r in usable], dtype=np.float32)) @ self.prototypes.T
+        targets = np.asarray([self.labels.index(r["llm_focus"]) for r in usable])
+        best = None
+        for temperature in temperatures:
+            logits = similarities / temperature
+            logits -= logits.max(axis=1, keepdims=True)
+            log_probabilities = logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+            nll = float(-log_probabilities[np.arange(len(usable)), targets].mean())
+            if best is None or nll < best[1]:
+                best = (float(temperature), nll)
+        return best
+
+    def calibrate(self, path: Optional[str] = INTENT_DECISION_LOG_PATH):
+        """
+        Refit the temperature on the randomly sampled decisions of the log once it holds
+        INTENT_CALIBRATION_MIN_DECISIONS of them
+        """
+        records = sampled_intent_decisions(load_intent_decisions(path)) if path else []
+        if len(records) < INTENT_CALIBRATION_MIN_DECISIONS:
+            return
+        fitted = self.fit_temperature(records)
+        if fitted:
+            logger.info(
+                f"✓ Calibrated intent temperature {self.temperature} -> {fitted[0]:.4f} "
+                f"on {len(records)} sampled decisions (NLL {fitted[1]:.3f})"
+            )
+            self.temperature = fitted[0]
+
+    def classify(self, embedding: List[float]) -> tuple[str, Dict[str, float], List[float]]:
+        """Return (label, {label: probability}, blended [visual, audio] weights)"""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        logits = (self.prototypes @ query) / self.temperature
+        probabilities = np.exp(logits - logits.max())
+        probabilities /= probabilities.sum()
+
+        label = self.labels[int(np.argmax(probabilities))]
+        weights = sum(
+            p * np.asarray(VISUAL_AUDIO_PREFERENCES[l][1]) for l, p in zip(self.labels, probabilities)
+        )
+        # Pipeline weights sum to 1, keep that after rounding
+        visual_weight = round(float(weights[0]), 4)
+        return (
+            label,
+            {l: round(float(p), 4) for l, p in zip(self.labels, probabilities)},
+            [visual_weight, round(1.0 - visual_weight, 4)],
+        )
+
+
+def load_intent_decisions(path: str) -> List[Dict]:
+    """Read the JSON-lines decision log written by log_intent_decision (empty if missing)"""
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        logger.warning(f"Stopped reading intent decision log {path} at an unreadable line: {e}")
+    return records
+
+
+def sampled_intent_decisions(records: List[Dict]) -> List[Dict]:
+    """Decisions logged for a random sample of queries, the unbiased subset used for calibration"""
+    return [record for record in records if record.get("source") == "sample"]
+
+
+def log_intent_decision(
+    query_text: str, embedding: List[float], llm_focus: str, prototype_focus: Optional[str], source: str
+):
+    """
+    Append an LLM vs. prototype decision to INTENT_DECISION_LOG_PATH (JSON lines) for offline evaluation.
+    source is "sample" for randomly sampled queries and "fallback" for low-confidence ones.
+    """
+    if not INTENT_DECISION_LOG_PATH:
+        return
+    try:
+        record = {
+            "query": query_text,
+            "llm_focus": llm_focus,
+            "prototype_focus": prototype_focus,
+            "source": source,
+            "embedding": [round(float(v), 5) for v in embedding],
+        }
+        with open(INTENT_DECISION_LOG_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        logger.warning(f"Could not log intent decision: {e}")
+
+
+# Stored vectors of source clips used by "more like this clip" searches
+clip_vector_cache = LRUCache(CLIP_VECTOR_CACHE_SIZE)
+
+def _shared_cache_path(name: str) -> str:
+    return os.path.join(SHARED_CACHE_DIR, f"{SHARED_CACHE_PREFIX}-{name}")
+
+
+# Marengo 3 image (and text+image) embeddings keyed on the image's content and perceptual hashes
+image_embedding_cache = ImageEmbeddingCache(
+    IMAGE_EMBEDDING_CACHE_SIZE,
+    IMAGE_PHASH_MAX_DISTANCE,
+    shared=(
+        SharedEmbeddingCache(_shared_cache_path("image-embeddings"), IMAGE_EMBEDDING_CACHE_SIZE, MARENGO3_EMBEDDING_DIM)
+        if SHARED_CACHE_ENABLED
+        else None
+    ),
+)
+
+# Hedging for Marengo 3 embedding and Nova Micro classification calls
+bedrock_hedger = BedrockHedger(
+    BEDROCK_HEDGING_ENABLED,
+    BEDROCK_HEDGE_PERCENTILE,
+    BEDROCK_HEDGE_MIN_DELAY_MS,
+    BEDROCK_HEDGE_BUDGET_RATIO,
+)
+
+# One circuit breaker per Bedrock model, around the (possibly hedged) call
+bedrock_breakers = {
+    operation: CircuitBreaker(operation, BEDROCK_BREAKER_FAILURE_THRESHOLD, BEDROCK_BREAKER_RESET_SECONDS)
+    for operation in ("marengo3", "marengo2.7", "nova-micro")
+}
+
+# Marengo 3 text embeddings keyed on the exact query text
+text_embedding_cache = (
+    SharedEmbeddingCache(_shared_cache_path("text-embeddings"), TEXT_EMBEDDING_CACHE_SIZE, MARENGO3_EMBEDDING_DIM)
+    if SHARED_CACHE_ENABLED
+    else LRUCache(TEXT_EMBEDDING_CACHE_SIZE)
+)
+
+
+def _open_embedding_store() -> Optional[PersistentEmbeddingStore]:
+    if not EMBEDDING_STORE_ENABLED:
+        return None
+    try:
+        return PersistentEmbeddingStore(EMBEDDING_STORE_DIR, MARENGO3_EMBEDDING_DIM, EMBEDDING_STORE_MAX_RECORDS)
+    except OSError as e:
+        logger.warning(f"Persistent embedding store disabled, could not open {EMBEDDING_STORE_DIR}: {e}")
+        return None
+
+
+# Marengo 3 text and image query embeddings that outlive the process (behind the in-memory caches),
+# opened at startup so importing the module creates no files
+embedding_store: Optional[PersistentEmbeddingStore] = None
+
+# Serialized /list response, rebuilt when the clip index changes
+video_catalog = VideoCatalogCache(CATALOG_PRESIGN_SECONDS)
+
+# Paged /list off the video-level catalog index, used once it has been checked (and backfilled)
+catalog_index = VideoCatalogIndex(VIDEO_CATALOG_INDEX_NAME, CATALOG_PRESIGN_SECONDS)
+
+# /suggest prefix index over video names and popular queries
+suggestion_index = SuggestionIndex(SUGGEST_MEMO_SIZE)
+
+# Popular /search-3 requests, replayed by the startup warm-up
+query_log = (
+    PopularQueryLog(QUERY_LOG_PATH, QUERY_LOG_MAX_ENTRIES, QUERY_LOG_HALF_LIFE_HOURS * 3600)
+    if QUERY_LOG_ENABLED
+    else None
+)
+
+
+# Per-dependency admission control; Bedrock and OpenSearch feed back per call, S3 (presigning) per batch
+admission_limiters = {
+    name: AdaptiveConcurrencyLimiter(name, initial, maximum, target_ms, self_measured=name == "s3")
+    for name, (initial, maximum, target_ms) in ADMISSION_LIMITS.items()
+}
+bedrock_embed_limiter = admission_limiters["bedrock-embed"]
+bedrock_llm_limiter = admission_limiters["bedrock-llm"]
+opensearch_limiter = admission_limiters["opensearch"]
+s3_limiter = admission_limiters["s3"]
+BEDROCK_OPERATION_LIMITERS = {
+    "marengo3": bedrock_embed_limiter,
+    "marengo2.7": bedrock_embed_limiter,
+    "nova-micro": bedrock_llm_limiter,
+}
+
+# Latest sampled event loop lag (ms), see _event_loop_lag_monitor
+event_loop_lag_ms = 0.0
+
+
+def call_bedrock(operation: str, fn):
+    """Run a Bedrock call through its circuit breaker and the hedger, feeding latency to its limiter"""
+    started = time.perf_counter()
+    try:
+        breaker = bedrock_breakers[operation]
+        result = breaker.call(
+            lambda: bedrock_hedger.call(operation, fn, BEDROCK_OPERATION_LIMITERS[operation], breaker)
+        )
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        BEDROCK_OPERATION_LIMITERS[operation].on_result(
+            (time.perf_counter() - started) * 1000, overloaded=_is_throttling_error(e)
+        )
+        raise
+    BEDROCK_OPERATION_LIMITERS[operation].on_result((time.perf_counter() - started) * 1000)
+    return result
+
+
+class MeasuredUrllib3HttpConnection(Urllib3HttpConnection):
+    """
+    urllib3 OpenSearch connection with TCP keepalive that feeds per-request latency and 429/timeout
+    errors to the opensearch limiter and tracks how close the pool is to saturation.
+    Only requests admitted by opensearch_limiter.run are measured: background scans, bulk writes
+    and backfills run outside it and their latency says nothing about serving capacity.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._saturated = 0
+
+    def _create_urllib3_pool(self):
+        super()._create_urllib3_pool()
+        self.pool.conn_kw["socket_options"] = TCP_KEEPALIVE_SOCKET_OPTIONS
+
+    # Long-running maintenance calls whose latency says nothing about overload
+    UNMEASURED_PATHS = ("/_plugins/_knn/warmup",)
+
+    def perform_request(self, method, url, *args, **kwargs):
+        with self._stats_lock:
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            if self._in_flight > self.pool.pool.maxsize:
+                self._saturated += 1
+        measured = (
+            getattr(_admitted_call, "limiter", None) is opensearch_limiter
+            and not url.startswith(self.UNMEASURED_PATHS)
+        )
+        started = time.perf_counter()
+        try:
+            response = super().perform_request(method, url, *args, **kwargs)
+        except Exception as e:
+            if measured:
+                opensearch_limiter.on_result((time.perf_counter() - started) * 1000, overloaded=_is_throttling_error(e))
+            raise
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+        if measured:
+            opensearch_limiter.on_result((time.perf_counter() - started) * 1000)
+        return response
+
+    def pool_stats(self) -> Dict[str, Any]:
+        stats = _urllib3_pool_stats(self.pool)
+        with self._stats_lock:
+            stats.update(
+                {
+                    "in_flight": self._in_flight,
+                    "peak_in_flight": self._peak_in_flight,
+                    "saturated_requests": self._saturated,
+                }
+            )
+        return stats
+
+
+def _urllib3_pool_stats(pool) -> Dict[str, Any]:
+    """Size, idle/in-use connections and totals of one urllib3 connection pool"""
+    # The pool queue holds idle connections plus None placeholders for slots never opened
+    maxsize = pool.pool.maxsize
+    idle = sum(1 for conn in list(pool.pool.queue) if conn is not None)
+    in_use = maxsize - pool.pool.qsize()
+    return {
+        "host": pool.host,
+        "maxsize": maxsize,
+        "idle": idle,
+        "in_use": in_use,
+        "utilization": round(in_use / maxsize, 3) if maxsize else 0.0,
+        "connections_opened": pool.num_connections,
+        "requests": pool.num_requests,
+    }
+
+
+def _botocore_pool_stats(client) -> List[Dict[str, Any]]:
+    """urllib3 pool stats for every host a boto3 client has connected to"""
+    try:
+        manager = client._endpoint.http_session._manager
+        return [_urllib3_pool_stats(manager.pools[key]) for key in list(manager.pools.keys())]
+    except (AttributeError, KeyError) as e:
+        logger.debug(f"Could not read botocore pool stats: {e}")
+        return []
+
+
+async def _event_loop_lag_monitor():
+    """Sample how late the event loop wakes up, reported by /admission/stats"""
+    global event_loop_lag_ms
+    interval = EVENT_LOOP_LAG_INTERVAL_MS / 1000
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        event_loop_lag_ms = max(0.0, (time.perf_counter() - started - interval) * 1000)
+
+
+# Prototype-based visual/audio focus classifier (prototypes are loaded at startup)
+intent_classifier = IntentPrototypeClassifier(INTENT_PROTOTYPE_TEMPERATURE)
+
+# Fused /search-3 results keyed on query-embedding similarity
+if SHARED_CACHE_ENABLED:
+    semantic_result_cache = SharedSemanticResultCache(
+        _shared_cache_path("semantic-results"),
+        SEMANTIC_CACHE_SIZE,
+        SEMANTIC_CACHE_THRESHOLD,
+        SEMANTIC_CACHE_TTL_SECONDS,
+        MARENGO3_EMBEDDING_DIM,
+        SHARED_RESULT_VALUE_BYTES,
+    )
+else:
+    semantic_result_cache = SemanticResultCache(
+        SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL_SECONDS
+    )
+
 
 # Initialize clients at startup
 opensearch_client: OpenSearch
@@ -144,19 +2702,55 @@ bedrock_runtime = None
 s3_client = None
 vector_pipeline_exists = False
 hybrid_pipeline_exists = False
+# Startup stages (name -> {"status": pending|running|done|timed_out|failed, ...}) gating /health
+readiness: Dict[str, Dict[str, Any]] = {}
+# Whether this worker process runs the startup and background jobs, see LEADER_STATE_PATH
+is_leader_worker = True
+# Video catalog index preparation in the elected worker: pending|ready|failed
+catalog_state = "pending"
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize clients and pipelines on application startup"""
     global opensearch_client, bedrock_runtime, s3_client, vector_pipeline_exists, hybrid_pipeline_exists
+    global is_leader_worker, embedding_store
 
     try:
+        is_leader_worker = _try_worker_lock("startup")
+        if SERVER_WORKERS > 1:
+            logger.info(
+                "👑 This worker runs the startup and background jobs"
+                if is_leader_worker
+                else "This worker mirrors the startup jobs of the elected worker"
+            )
+
         logger.info("Initializing clients...")
         # logger.info("1")
         opensearch_client = get_opensearch_client()
-        bedrock_runtime = boto3.client("bedrock-runtime", region_name="us-east-1")
-        s3_client = boto3.client("s3", region_name="us-east-1")
+        bedrock_runtime = boto3.client(
+            "bedrock-runtime",
+            region_name="us-east-1",
+            config=Config(
+                connect_timeout=BEDROCK_CONNECT_TIMEOUT_SECONDS,
+                read_timeout=BEDROCK_READ_TIMEOUT_SECONDS,
+                # Fail fast (2 standard attempts) so the circuit breakers and the AIMD limiter see
+                # errors promptly; no adaptive client-side rate limiting on top of the limiter
+                retries={"max_attempts": 2, "mode": "standard"},
+                max_pool_connections=BEDROCK_POOL_MAXSIZE,
+                tcp_keepalive=True,
+            ),
+        )
+        s3_client = boto3.client(
+            "s3",
+            region_name="us-east-1",
+            config=Config(
+                connect_timeout=S3_CONNECT_TIMEOUT_SECONDS,
+                read_timeout=S3_READ_TIMEOUT_SECONDS,
+                max_pool_connections=S3_POOL_MAXSIZE,
+                tcp_keepalive=True,
+            ),
+        )
 
         logger.info("Initializing search pipelines...")
         hybrid_pipeline_exists = _create_hybrid_search_pipeline(opensearch_client)
@@ -171,20 +2765,221 @@ async def startup_event():
         logger.info("Creating combination search pipelines for Marengo 3...")
         _create_combination_pipelines(opensearch_client)
 
+        asyncio.create_task(_event_loop_lag_monitor())
+
+        embedding_store = await asyncio.to_thread(_open_embedding_store)
+        if embedding_store and EMBEDDING_STORE_SNAPSHOT_S3_URI:
+            await asyncio.to_thread(
+                embedding_store.bootstrap_from_s3, s3_client, *_split_s3_uri(EMBEDDING_STORE_SNAPSHOT_S3_URI)
+            )
+        if query_log and QUERY_LOG_S3_URI:
+            await asyncio.to_thread(query_log.bootstrap_from_s3, s3_client, *_split_s3_uri(QUERY_LOG_S3_URI))
+        if SNAPSHOT_INTERVAL_SECONDS > 0 and (EMBEDDING_STORE_SNAPSHOT_S3_URI or QUERY_LOG_S3_URI):
+            asyncio.create_task(_s3_snapshot_loop())
+        if query_log:
+            asyncio.create_task(_query_log_flush_loop())
+        if is_leader_worker:
+            asyncio.create_task(_prepare_video_catalog_index())
+        asyncio.create_task(_video_catalog_refresh_loop())
+        if SUGGEST_ENABLED:
+            asyncio.create_task(_suggestion_refresh_loop())
+
+        logger.info("Preparing intent prototypes in the background...")
+        prototypes_task = asyncio.create_task(
+            asyncio.to_thread(intent_classifier.load_or_build, bedrock_runtime, s3_client)
+        )
+
+        # Stages run by the elected worker; the cache warm-up only when the caches are shared
+        leader_stages = []
+        warmup_prerequisites = [prototypes_task]
+        if KNN_WARMUP_ENABLED:
+            readiness["knn_warmup"] = {"status": "pending"}
+            leader_stages.append("knn_warmup")
+            if is_leader_worker:
+                warmup_prerequisites.append(asyncio.create_task(_warm_up_knn_at_startup()))
+
+        if WARMUP_ENABLED and query_log:
+            readiness["cache_warmup"] = {"status": "pending"}
+            if SHARED_CACHE_ENABLED:
+                leader_stages.append("cache_warmup")
+            if is_leader_worker or not SHARED_CACHE_ENABLED:
+                asyncio.create_task(_warm_up_caches(warmup_prerequisites))
+
+        if is_leader_worker:
+            _publish_leader_state()
+        else:
+            asyncio.create_task(_follow_leader_state(leader_stages))
+
         # logger.info("Configuring S3 CORS policy...")
         # _configure_s3_cors(s3_client)
 
+        if NEIGHBOR_GRAPH_REFRESH_SECONDS > 0:
+            logger.info(
+                f"Scheduling incremental neighbor graph refresh every {NEIGHBOR_GRAPH_REFRESH_SECONDS}s"
+            )
+            asyncio.create_task(_neighbor_graph_refresh_loop())
+
         logger.info("✓ All clients and pipelines initialized successfully")
     except Exception as e:
         logger.error(f"✗ Startup initialization failed: {e}", exc_info=True)
         raise
 
 
+@contextlib.contextmanager
+def _try_file_lock(path: str):
+    """Try to take an exclusive flock on path without waiting; yields whether it was acquired"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+        else:
+            yield True
+    finally:
+        os.close(fd)
+
+
+def _require_admin_key(x_admin_key: Optional[str]):
+    """Reject the request unless X-Admin-Key matches the configured ADMIN_API_KEY"""
+    if not ADMIN_API_KEY or not x_admin_key or not hmac.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Admin key required")
+
+
+# Worker lock file descriptors, kept open (and their locks held) for the life of the process
+_worker_lock_fds: Dict[str, int] = {}
+
+
+def _try_worker_lock(name: str) -> bool:
+    """
+    Take the named worker lock without waiting. The worker that gets it keeps it for its lifetime,
+    so exactly one live worker runs the job; the others can retry to take over once it exits.
+    """
+    fd = _worker_lock_fds.get(name)
+    if fd is None:
+        fd = _worker_lock_fds[name] = os.open(
+            os.path.join(tempfile.gettempdir(), f"search-videos-{name}.lock"), os.O_RDWR | os.O_CREAT, 0o600
+        )
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+def _publish_leader_state():
+    """Write the elected worker's startup stages and catalog state for the other workers (atomic replace)"""
+    if SERVER_WORKERS <= 1 or not is_leader_worker:
+        return
+    state = {"parent_pid": os.getppid(), "readiness": readiness, "catalog": catalog_state}
+    temp_path = f"{LEADER_STATE_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(temp_path, LEADER_STATE_PATH)
+    except OSError as e:
+        logger.warning(f"Could not publish leader state to {LEADER_STATE_PATH}: {e}")
+
+
+def _read_leader_state() -> Optional[Dict[str, Any]]:
+    """The elected worker's published state, if it was written by a sibling worker of this process"""
+    try:
+        with open(LEADER_STATE_PATH) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("parent_pid") == os.getppid() else None
+
+
+async def _follow_leader_state(leader_stages: List[str]):
+    """Mirror the elected worker's startup stages and catalog switch-over until they have finished"""
+    while True:
+        state = await asyncio.to_thread(_read_leader_state)
+        if state:
+            for name in leader_stages:
+                if name in state["readiness"]:
+                    readiness[name] = state["readiness"][name]
+            if state["catalog"] == "ready" and not catalog_index.ready:
+                catalog_index.ready = True
+                logger.info(f"✓ /list is served from the video catalog index {VIDEO_CATALOG_INDEX_NAME}")
+            if state["catalog"] != "pending" and all(
+                readiness[name]["status"] not in ("pending", "running") for name in leader_stages
+            ):
+                return
+        await asyncio.sleep(LEADER_STATE_POLL_SECONDS)
+
+
+def _split_s3_uri(uri: str) -> tuple[str, str]:
+    bucket, _, key = uri.removeprefix("s3://").partition("/")
+    return bucket, key
+
+
+async def _s3_snapshot_loop():
+    """
+    Periodically upload the embedding store and the popular-query log when they changed.
+    The worker process holding the snapshot lock does the uploads; the others keep
+    trying to take it over.
+    """
+    uploaded_records = None
+    uploaded_query_log_mtime = None
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+        if not _try_worker_lock("snapshot"):
+            continue
+        try:
+            if embedding_store and EMBEDDING_STORE_SNAPSHOT_S3_URI:
+                records = embedding_store.stats()["records"]
+                if records and records != uploaded_records:
+                    await asyncio.to_thread(
+                        embedding_store.snapshot_to_s3, s3_client, *_split_s3_uri(EMBEDDING_STORE_SNAPSHOT_S3_URI)
+                    )
+                    uploaded_records = records
+        except Exception as e:
+            logger.warning(f"Could not snapshot embedding store: {e}")
+        try:
+            if query_log and QUERY_LOG_S3_URI and os.path.exists(query_log.path):
+                mtime = os.path.getmtime(query_log.path)
+                if mtime != uploaded_query_log_mtime:
+                    await asyncio.to_thread(query_log.upload_to_s3, s3_client, *_split_s3_uri(QUERY_LOG_S3_URI))
+                    uploaded_query_log_mtime = mtime
+        except Exception as e:
+            logger.warning(f"Could not upload popular-query log: {e}")
+
+
+async def _query_log_flush_loop():
+    """Merge this worker's query counts into the shared popular-query log"""
+    while True:
+        await asyncio.sleep(QUERY_LOG_FLUSH_SECONDS)
+        try:
+            await asyncio.to_thread(query_log.flush)
+        except Exception as e:
+            logger.warning(f"Could not flush popular-query log: {e}")
+
+
 class SearchRequest(BaseModel):
     query_text: Optional[str] = None
     image_base64: Optional[str] = None
     top_k: int = 10
     search_type: str = "hybrid"
+    coarse_to_fine: bool = False
+    coarse_top_videos: int = Field(COARSE_TOP_VIDEOS, ge=1, le=COARSE_MAX_TOP_VIDEOS)
+    video_id: Optional[str] = None
+    time_start: Optional[float] = None
+    time_end: Optional[float] = None
+    group_by_video: bool = False
+    clips_per_video: int = GROUP_CLIPS_PER_VIDEO
+    diversity: float = 0.0
+    merge_segments: bool = False
+    merge_gap_sec: float = MERGE_GAP_SEC
+    federated: bool = False
+
+
+class SimilarClipsRequest(BaseModel):
+    clip_id: str
+    top_k: int = 10
+    preference: str = "BALANCED"
+    exclude_adjacent: bool = True
+    adjacent_window_sec: float = SIMILAR_ADJACENT_WINDOW_SEC
 
 
 class VideoMetadata(BaseModel):
@@ -195,11 +2990,16 @@ class VideoMetadata(BaseModel):
     duration: Optional[float] = None
     upload_date: Optional[str] = None
     clips_count: int = 0
+    sprite_url: Optional[str] = None
+    sprite_frames: Optional[int] = None
+    part: Optional[int] = None
+    part_count: Optional[int] = None
 
 
 class VideosListResponse(BaseModel):
     videos: List[VideoMetadata]
     total: int
+    next_cursor: Optional[str] = None
 
 
 class SearchResponse(BaseModel):
@@ -209,12 +3009,241 @@ class SearchResponse(BaseModel):
     search_type: str
     total: int
     clips: List[Dict]
+    videos: Optional[List[Dict]] = None
+    cache_hit: bool = False
+    degraded: bool = False
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint for ECS task"""
-    return {"status": "healthy", "service": "video-search"}
+    """Health check endpoint for ECS task, 503 until the startup warm-up stages have finished"""
+    if any(stage["status"] in ("pending", "running") for stage in readiness.values()):
+        return JSONResponse(
+            status_code=503,
+            content={"status": "warming", "service": "video-search", "readiness": readiness},
+        )
+    return {"status": "healthy", "service": "video-search", "readiness": readiness}
+
+
+async def _warm_up_caches(prerequisites: List[asyncio.Task]):
+    """
+    Replay the most popular requests so their embeddings, intents and fused results are cached
+    before the task reports healthy. Whatever is unfinished after WARMUP_TIME_BUDGET_SECONDS
+    is cancelled.
+    """
+    stage = readiness["cache_warmup"]
+    stage["status"] = "running"
+    _publish_leader_state()
+    started = time.monotonic()
+    try:
+        popular = await asyncio.to_thread(query_log.top, WARMUP_TOP_QUERIES)
+        # Prototype intents are part of the cached results and cold k-NN graphs would only slow
+        # the replay down, so let both finish first (within the same budget)
+        await asyncio.wait(prerequisites, timeout=WARMUP_TIME_BUDGET_SECONDS)
+
+        semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
+
+        async def warm(entry: Dict[str, Any]):
+            async with semaphore:
+                await run_search_marengo3(
+                    SearchRequest(**{field: value for field, value in entry.items() if field != "count"})
+                )
+
+        tasks = [asyncio.create_task(warm(entry)) for entry in popular]
+        done, pending = set(), set()
+        if tasks:
+            remaining = WARMUP_TIME_BUDGET_SECONDS - (time.monotonic() - started)
+            done, pending = await asyncio.wait(tasks, timeout=max(remaining, 0.0))
+            for task in pending:
+                task.cancel()
+        failed = sum(1 for task in done if task.exception() is not None)
+        stage.update(
+            status="timed_out" if pending else "done",
+            queries=len(popular),
+            warmed=len(done) - failed,
+            failed=failed,
+            seconds=round(time.monotonic() - started, 1),
+        )
+        logger.info(
+            f"🔥 Cache warm-up {stage['status']}: {stage['warmed']}/{len(popular)} popular queries "
+            f"in {stage['seconds']}s"
+        )
+    except Exception as e:
+        stage.update(status="failed", error=str(e), seconds=round(time.monotonic() - started, 1))
+        logger.warning(f"Cache warm-up failed: {e}")
+    _publish_leader_state()
+
+
+def knn_memory_stats(client) -> Dict[str, Any]:
+    """Graph memory per node and index, cache capacity and circuit breaker state from the k-NN stats API"""
+    response = client.plugins.knn.stats()
+    nodes = []
+    for node_id, node in response.get("nodes", {}).items():
+        nodes.append(
+            {
+                "node": node_id,
+                "graph_memory_usage_kb": node.get("graph_memory_usage"),
+                "graph_memory_usage_percentage": node.get("graph_memory_usage_percentage"),
+                "cache_capacity_reached": node.get("cache_capacity_reached"),
+                "eviction_count": node.get("eviction_count"),
+                "indices_in_cache": node.get("indices_in_cache", {}),
+            }
+        )
+    return {"circuit_breaker_triggered": response.get("circuit_breaker_triggered", False), "nodes": nodes}
+
+
+def warm_up_knn_indexes(client, indexes: List[str], timeout_seconds: float) -> Dict[str, Any]:
+    """
+    Load the faiss graphs of `indexes` into native memory with the k-NN warmup API.
+    Indexes with failed shards (e.g. still recovering or relocating) are retried until
+    timeout_seconds; warming stops early if the k-NN circuit breaker trips, since loading
+    more graphs would only evict others.
+    """
+    started = time.monotonic()
+    deadline = started + timeout_seconds
+    pending = [index for index in indexes if client.indices.exists(index=index)]
+    shards: Dict[str, Any] = {}
+    memory = None
+    while pending:
+        for index in list(pending):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                response = client.plugins.knn.warmup(index=index, params={"request_timeout": remaining})
+                shards[index] = response.get("_shards", {})
+                if not shards[index].get("failed"):
+                    pending.remove(index)
+            except TransportError as e:
+                shards[index] = {"error": str(e)}
+
+        memory = knn_memory_stats(client)
+        if memory["circuit_breaker_triggered"]:
+            logger.warning("⚠️ k-NN circuit breaker triggered, stopping graph warm-up")
+            break
+        if not pending or time.monotonic() + KNN_WARMUP_RETRY_SECONDS > deadline:
+            break
+        time.sleep(KNN_WARMUP_RETRY_SECONDS)
+
+    return {
+        "status": "timed_out" if pending else "done",
+        "indexes": shards,
+        "pending": pending,
+        "seconds": round(time.monotonic() - started, 1),
+        "memory": memory,
+    }
+
+
+# Summary of the most recent k-NN warm-up, reported by GET /knn/stats
+last_knn_warmup: Optional[Dict[str, Any]] = None
+
+
+async def _warm_up_knn_at_startup():
+    """Warm the k-NN graphs before /health reports healthy"""
+    global last_knn_warmup
+    stage = readiness["knn_warmup"]
+    stage["status"] = "running"
+    _publish_leader_state()
+    try:
+        last_knn_warmup = await asyncio.to_thread(_run_knn_warmup)
+        if last_knn_warmup is None:
+            stage.update(status="skipped", reason="another warm-up is running")
+            logger.info("k-NN graph warm-up already running elsewhere, skipping")
+            _publish_leader_state()
+            return
+        stage.update(status=last_knn_warmup["status"], seconds=last_knn_warmup["seconds"])
+        logger.info(f"🔥 k-NN graph warm-up {last_knn_warmup['status']} in {last_knn_warmup['seconds']}s")
+    except Exception as e:
+        stage.update(status="failed", error=str(e))
+        logger.warning(f"k-NN graph warm-up failed: {e}")
+    _publish_leader_state()
+
+
+def _run_knn_warmup() -> Optional[Dict[str, Any]]:
+    """Warm the vector indexes under the warm-up lock; None if another warm-up holds it"""
+    with _try_file_lock(KNN_WARMUP_LOCK_PATH) as acquired:
+        if not acquired:
+            return None
+        return warm_up_knn_indexes(
+            opensearch_client, [INDEX_NAME, VIDEO_CENTROID_INDEX_NAME], KNN_WARMUP_TIMEOUT_SECONDS
+        )
+
+
+@app.post("/knn/warmup")
+async def knn_warmup(x_admin_key: Optional[str] = Header(None)):
+    """
+    Warm the k-NN graphs of the vector indexes, e.g. after an ingest batch, a snapshot restore or
+    segment merges (requires X-Admin-Key). Unlike the startup warm-up this does not take the task
+    out of service; it is refused while OpenSearch is saturated and runs once at a time.
+    """
+    global last_knn_warmup
+    _require_admin_key(x_admin_key)
+    if opensearch_limiter.saturated:
+        raise OverloadedError(opensearch_limiter.name)
+    result = await asyncio.to_thread(_run_knn_warmup)
+    if result is None:
+        return {"status": "already_running"}
+    last_knn_warmup = result
+    return last_knn_warmup
+
+
+@app.get("/knn/stats")
+async def knn_stats():
+    """k-NN graph memory and circuit breaker state, plus the last warm-up summary"""
+    memory = await opensearch_limiter.run(knn_memory_stats, opensearch_client)
+    return {"memory": memory, "last_warmup": last_knn_warmup}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit-rate and size metrics of the caches (shared ones report totals across workers)"""
+    return {
+        "worker_pid": os.getpid(),
+        "semantic_results": semantic_result_cache.stats(),
+        "clip_vectors": clip_vector_cache.stats(),
+        "image_embeddings": image_embedding_cache.stats(),
+        "embedding_store": embedding_store.stats() if embedding_store else None,
+        "query_log": query_log.stats() if query_log else None,
+        "video_catalog": video_catalog.stats(),
+        "catalog_index": catalog_index.stats(),
+        "suggestions": suggestion_index.stats(),
+    }
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Concurrency limits, in-flight/queued calls and shed requests per dependency"""
+    return {
+        "event_loop_lag_ms": round(event_loop_lag_ms, 1),
+        "limiters": {name: limiter.stats() for name, limiter in admission_limiters.items()},
+    }
+
+
+@app.get("/pools/stats")
+async def pool_stats():
+    """Connection pool size, in-use/idle connections and saturation per client"""
+    opensearch_pools = []
+    if opensearch_client:
+        opensearch_pools = [
+            conn.pool_stats()
+            for conn in opensearch_client.transport.connection_pool.connections
+            if hasattr(conn, "pool_stats")
+        ]
+    return {
+        "opensearch": opensearch_pools,
+        "bedrock_runtime": _botocore_pool_stats(bedrock_runtime) if bedrock_runtime else [],
+        "s3": _botocore_pool_stats(s3_client) if s3_client else [],
+    }
+
+
+@app.get("/bedrock/stats")
+async def bedrock_stats():
+    """Bedrock latency, hedge rate, hedge wins and circuit breaker state per operation"""
+    return {
+        **bedrock_hedger.stats(),
+        "circuit_breakers": {operation: breaker.stats() for operation, breaker in bedrock_breakers.items()},
+        "text_embedding_cache": text_embedding_cache.stats(),
+    }
 
 
 @app.post("/search", response_model=SearchResponse)
@@ -342,21 +3371,104 @@ async def search_videos(request: SearchRequest):
 
 @app.post("/search-3", response_model=SearchResponse)
 async def search_videos_marengo3(request: SearchRequest):
+    response = await run_search_marengo3(request)
+    if query_log and _is_replayable_request(request) and not response.degraded:
+        query_log.record(request.query_text, request.search_type, request.top_k, request.coarse_to_fine)
+    if SUGGEST_ENABLED and request.query_text and response.total > 0 and not response.degraded:
+        suggestion_index.add(request.query_text)
+    return response
+
+
+def _is_replayable_request(request: SearchRequest) -> bool:
+    """Text-only requests without filters, the ones the startup warm-up can replay"""
+    return bool(
+        request.query_text
+        and not request.image_base64
+        and not request.video_id
+        and request.time_start is None
+        and request.time_end is None
+        and request.coarse_top_videos == COARSE_TOP_VIDEOS
+        and not request.group_by_video
+        and not request.federated
+    )
+
+
+@app.post("/search-3/image", response_model=SearchResponse)
+async def search_videos_marengo3_image(
+    image: UploadFile = File(...),
+    query_text: Optional[str] = Form(None),
+    top_k: int = Form(10),
+    search_type: str = Form("vector"),
+    video_id: Optional[str] = Form(None),
+    time_start: Optional[float] = Form(None),
+    time_end: Optional[float] = Form(None),
+    group_by_video: bool = Form(False),
+    clips_per_video: int = Form(GROUP_CLIPS_PER_VIDEO),
+    diversity: float = Form(0.0),
+    merge_segments: bool = Form(False),
+    merge_gap_sec: float = Form(MERGE_GAP_SEC),
+):
+    """
+    Marengo 3 image search with a binary multipart upload (no base64 inflation on the wire)
+    The upload is streamed and sniffed, hashed for the image embedding cache and only
+    base64-encoded once for Bedrock; the search itself is the same as /search-3.
+    """
+    try:
+        image_bytes, image_sha256 = await read_image_upload(image)
+    finally:
+        await image.close()
+
+    query_embedding = await embed_query_image(image_bytes, image_sha256, query_text)
+    del image_bytes
+
+    request = SearchRequest(
+        query_text=query_text,
+        top_k=top_k,
+        search_type=search_type,
+        video_id=video_id,
+        time_start=time_start,
+        time_end=time_end,
+        group_by_video=group_by_video,
+        clips_per_video=clips_per_video,
+        diversity=diversity,
+        merge_segments=merge_segments,
+        merge_gap_sec=merge_gap_sec,
+    )
+    return await run_search_marengo3(request, query_embedding=query_embedding, has_image=True)
+
+
+async def run_search_marengo3(
+    request: SearchRequest, query_embedding: Optional[List[float]] = None, has_image: bool = False
+) -> SearchResponse:
     """
     Marengo 3 unified search endpoint with intent classification
     - Text only: Classifies intent first, then generates embedding via Marengo 3
     - Image only: Uses image_base64, generates embedding via Marengo 3
     - Combined: Uses both query_text and image_base64 for multimodal search
+    - Uploaded image (/search-3/image): query_embedding is precomputed and has_image is set
 
     Intent classification (for text queries):
     - VISUAL: Focus on visual embeddings
     - AUDIO: Focus on audio embeddings
     - TRANSCRIPT: Focus on transcription embeddings
     - BALANCED: Use all three with balanced weights
+
+    With group_by_video, top_k counts videos and the response lists them in `videos`, each with
+    its clips_per_video best clips (collapsed in OpenSearch for single-modality k-NN, grouped in
+    one pass over the fused clip list otherwise).
+
+    diversity (0-1) reranks the clip list with maximal marginal relevance, trading relevance
+    for dissimilarity to the clips already ranked above; 0 keeps the fused order.
+
+    merge_segments merges adjacent or overlapping hits of one video (at most merge_gap_sec
+    apart) into a single segment before diversification, grouping and URL signing.
+
+    federated (text queries) also searches the legacy Marengo 2.7 library, see run_federated_search.
     """
     try:
         query_text = request.query_text
         image_base64 = request.image_base64
+        has_image = has_image or bool(image_base64)
         top_k = request.top_k
         search_type = request.search_type
 
@@ -368,10 +3480,27 @@ async def search_videos_marengo3(request: SearchRequest):
     }
 
         # Validate that at least one input is provided
-        if not query_text and not image_base64:
+        if not query_text and not has_image:
             raise HTTPException(
                 status_code=400, detail="Either query_text or image_base64 is required"
             )
+        if request.group_by_video and not 1 <= request.clips_per_video <= GROUP_MAX_CLIPS_PER_VIDEO:
+            raise HTTPException(
+                status_code=400,
+                detail=f"clips_per_video must be between 1 and {GROUP_MAX_CLIPS_PER_VIDEO}",
+            )
+        if not 0.0 <= request.diversity <= 1.0:
+            raise HTTPException(status_code=400, detail="diversity must be between 0 and 1")
+        if request.merge_segments and not 0.0 <= request.merge_gap_sec <= MERGE_MAX_GAP_SEC:
+            raise HTTPException(
+                status_code=400, detail=f"merge_gap_sec must be between 0 and {MERGE_MAX_GAP_SEC}"
+            )
+        if request.federated:
+            if has_image or request.video_id:
+                raise HTTPException(
+                    status_code=400, detail="Federated search supports text queries over the whole library only"
+                )
+            return await run_federated_search(request)
 
         # Validate image if provided
         if image_base64:
@@ -381,12 +3510,12 @@ async def search_videos_marengo3(request: SearchRequest):
             logger.info("✓ Image validation passed")
 
         # Determine search type for logging
-        if query_text and image_base64:
+        if query_text and has_image:
             logger.info(
                 f"🔄 Multimodal search (Marengo 3): text='{query_text[:50]}...' + image (top_k: {top_k})"
             )
             search_input_type = "multimodal"
-        elif image_base64:
+        elif has_image:
             logger.info(f"📷 Image-only search (Marengo 3) (top_k: {top_k})")
             search_input_type = "image"
         else:
@@ -397,10 +3526,42 @@ async def search_videos_marengo3(request: SearchRequest):
 
         # STEP 1 & 2: Run intent classification and embedding generation CONCURRENTLY
         classified_intent = None
-        query_embedding = None
+        intent_weights = None
+
+        if query_embedding is not None:
+            # Embedding already generated from an uploaded image
+            classified_intent = "VISUAL_FOCUS"
+        elif query_text and not image_base64 and search_type == "vector" and intent_classifier.ready:
+            # For text-only vector search: Generate the embedding, then classify it locally. The LLM
+            # is only asked when the prototypes are not confident (or the query is sampled for the log).
+            logger.info("📊 Step 1 & 2: Generating embedding and classifying intent from prototypes...")
+            query_embedding = await bedrock_embed_limiter.run(
+                generate_embedding_marengo3, bedrock_runtime, text=query_text
+            )
+
+            if query_embedding:
+                prototype_intent, probabilities, intent_weights = intent_classifier.classify(query_embedding)
+                confidence = probabilities[prototype_intent]
+                logger.info(
+                    f"✓ Prototype intent: {prototype_intent} (probabilities {probabilities}, weights {intent_weights})"
+                )
+                source = "sample" if random.random() < INTENT_SHADOW_SAMPLE_RATE else "fallback"
+
+                if confidence < INTENT_PROTOTYPE_MIN_CONFIDENCE:
+                    # Low confidence: fall back to the LLM and its fixed-weight pipeline
+                    logger.info(f"Prototype confidence {confidence:.2f} too low, falling back to LLM")
+                    classified_intent = await detect_visual_audio_focus_llm(bedrock_runtime, query_text)
+                    intent_weights = None
+                    log_intent_decision(query_text, query_embedding, classified_intent, prototype_intent, source)
+                else:
+                    classified_intent = prototype_intent
+                    if source == "sample":
+                        asyncio.create_task(
+                            _shadow_llm_intent(query_text, query_embedding, prototype_intent)
+                        )
 
         # COMMENTED OUT: Intent classification temporarily disabled
-        if query_text and not image_base64 and search_type == "vector":
+        elif query_text and not image_base64 and search_type == "vector":
             # For text-only vector search: Run BOTH intent classification and embedding generation in parallel
             logger.info(
                 "📊 Step 1 & 2: Running intent classification and embedding generation concurrently..."
@@ -409,7 +3570,7 @@ async def search_videos_marengo3(request: SearchRequest):
             # Create both tasks
             # intent_task = classify_query_intent(bedrock_runtime, query_text)
             intent_task = detect_visual_audio_focus_llm(bedrock_runtime, query_text)
-            embedding_task = asyncio.to_thread(
+            embedding_task = bedrock_embed_limiter.run(
                 generate_embedding_marengo3,
                 bedrock_runtime,
                 text=query_text,
@@ -436,30 +3597,111 @@ async def search_videos_marengo3(request: SearchRequest):
             logger.info(
                 f"� Step 2:  Generating {search_input_type} embedding using Marengo 3"
             )
-            query_embedding = generate_embedding_marengo3(
-                bedrock_runtime, text=query_text, image_base64=image_base64
-            )
+            if image_base64:
+                # Decoded once here for normalization and hashing, see prepare_query_image.
+                # validate_image only decodes the header, so malformed base64 surfaces here.
+                try:
+                    image_bytes = base64.b64decode(image_base64)
+                except binascii.Error as e:
+                    raise HTTPException(status_code=400, detail=f"Invalid base64 encoding: {str(e)}")
+                query_embedding = await embed_query_image(
+                    image_bytes, hashlib.sha256(image_bytes).hexdigest(), query_text
+                )
+                del image_bytes
+            else:
+                query_embedding = await bedrock_embed_limiter.run(
+                    generate_embedding_marengo3, bedrock_runtime, text=query_text
+                )
             classified_intent = "VISUAL_FOCUS"
         logger.info(
             f"✓ Generated {search_input_type} embedding (Marengo 3) with {len(query_embedding) if query_embedding else 0} dimensions"
         )
 
         if not query_embedding:
+            if query_text:
+                # Bedrock is failing or its circuit is open: answer with title matches instead of a 500.
+                # Merging, diversity (stored clip vectors) and grouping need no query embedding.
+                logger.warning("⚠️ No query embedding, degrading to keyword search over video_name")
+                return await run_degraded_keyword_search(request)
+            if bedrock_breakers["marengo3"].is_open:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Image search is temporarily unavailable, please retry shortly",
+                )
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to generate {search_input_type} embedding (Marengo 3)",
             )
 
-        # STEP 3: Perform search based on type
+        # STEP 3: Perform search based on type (or reuse a semantically identical query's results)
         logger.info(f"📊 Step 3: Performing {search_type} search (Marengo 3)")
 
-        if search_type == "hybrid":
+        cache_context = json.dumps(
+            [
+                search_input_type,
+                search_type,
+                request.coarse_to_fine,
+                request.coarse_top_videos,
+                request.video_id,
+                request.time_start,
+                request.time_end,
+                request.clips_per_video if request.group_by_video else None,
+                # Collapsed visual/audio searches fetch exactly top_k videos
+                top_k if request.group_by_video and search_type in ("visual", "audio") else None,
+            ]
+        )
+        cached = (
+            semantic_result_cache.lookup(query_embedding, cache_context)
+            if SEMANTIC_CACHE_ENABLED
+            else None
+        )
+
+        if cached is not None:
+            (results, classified_intent, intent_weights), similarity = cached
+            logger.info(f"✓ Semantic cache hit (similarity {similarity:.4f})")
+        elif request.video_id and search_type in ("hybrid", "vector", "visual", "audio"):
+            logger.info(f"📊 Searching inside video {request.video_id}")
+            if search_type == "visual":
+                fields, weights, pipeline = ["emb_visual"], [1.0], None
+            elif search_type == "audio":
+                fields, weights, pipeline = ["emb_audio"], [1.0], None
+            else:
+                pipeline, weights = VISUAL_AUDIO_PREFERENCES[
+                    classified_intent if classified_intent else "BALANCED"
+                ]
+                fields = VISUAL_AUDIO_FIELDS
+            results = await opensearch_limiter.run(
+                video_scoped_search_marengo3,
+                opensearch_client,
+                query_embedding,
+                request.video_id,
+                fields,
+                weights,
+                pipeline=pipeline,
+                time_start=request.time_start,
+                time_end=request.time_end,
+            )
+        elif search_type == "hybrid":
             logger.info(
                 "⚠️ Hybrid search not yet implemented for Marengo 3, using vector search instead"
             )
-            results = vector_search_marengo3(
+            results = await opensearch_limiter.run(
+                vector_search_marengo3,
                 opensearch_client, query_embedding, top_k, "video_clips_3_lucene", preference = classified_intent if classified_intent else "BALANCED" 
             )
+        elif search_type == "vector" and request.coarse_to_fine:
+            logger.info(
+                f"📊 Using coarse-to-fine search (top {request.coarse_top_videos} videos)"
+            )
+            results = await opensearch_limiter.run(
+                coarse_to_fine_search_marengo3,
+                opensearch_client,
+                query_embedding,
+                top_k,
+                "video_clips_3_lucene",
+                preference=classified_intent if classified_intent else "BALANCED",
+                top_videos=request.coarse_top_videos,
+            )
         elif search_type == "vector":
             # COMMENTED OUT: Intent-based vector search temporarily disabled
             # # For vector search, use intent classification if available (text-only queries)
@@ -484,16 +3726,27 @@ async def search_videos_marengo3(request: SearchRequest):
             #     )
             # Using balanced vector search (all 3 modalities)
             logger.info("📊 Using balanced vector search (all 3 modalities)")
-            results = vector_search_marengo3(
-                opensearch_client, query_embedding, top_k, "video_clips_3_lucene", preference = classified_intent if classified_intent else "BALANCED"
+            results = await opensearch_limiter.run(
+                vector_search_marengo3,
+                opensearch_client, query_embedding, top_k, "video_clips_3_lucene", preference = classified_intent if classified_intent else "BALANCED",
+                weights=intent_weights,
+            )
+        elif search_type in ("visual", "audio") and request.group_by_video:
+            results = await opensearch_limiter.run(
+                collapsed_knn_search_marengo3,
+                opensearch_client,
+                query_embedding,
+                "emb_visual" if search_type == "visual" else "emb_audio",
+                top_k,
+                request.clips_per_video,
             )
         elif search_type == "visual":
-            results = visual_search_marengo3(
-                opensearch_client, query_embedding, top_k, "video_clips_3_lucene"
+            results = await opensearch_limiter.run(
+                visual_search_marengo3, opensearch_client, query_embedding, top_k, "video_clips_3_lucene"
             )
         elif search_type == "audio":
-            results = audio_search_marengo3(
-                opensearch_client, query_embedding, top_k, "video_clips_3_lucene"
+            results = await opensearch_limiter.run(
+                audio_search_marengo3, opensearch_client, query_embedding, top_k, "video_clips_3_lucene"
             )
         # elif search_type == "transcription":
         #     results = transcription_search_marengo3(
@@ -517,17 +3770,33 @@ async def search_videos_marengo3(request: SearchRequest):
                 detail=f"Invalid search_type: {search_type}. Supported: vector, visual, audio, transcription, visual_audio, visual_transcription, audio_transcription",
             )
 
+        if cached is None and SEMANTIC_CACHE_ENABLED and results:
+            semantic_result_cache.put(query_embedding, cache_context, (results, classified_intent, intent_weights))
+
+        if request.merge_segments:
+            merged = merge_adjacent_clips(results, request.merge_gap_sec)
+            logger.info(f"✓ Merged {len(results)} clips into {len(merged)} segments")
+            results = merged
+
+        # Diversify after caching, so one cached candidate list serves every diversity setting
+        if request.diversity > 0 and len(results) > 1:
+            results = await opensearch_limiter.run(
+                diversify_results, opensearch_client, results, request.diversity
+            )
+
         query_display = query_text if query_text else ""
         search_type_display = search_type
 
         # Convert S3 paths to presigned URLs
-        results = convert_s3_to_presigned_urls(s3_client, results)
+        results = await s3_limiter.run(convert_s3_to_presigned_urls, s3_client, results)
 
         logger.info(f"✓ Search (Marengo 3) completed, found {len(results)} results")
 
         # Retrieve actual weights from OpenSearch pipeline configuration
         weights_used = []
-        if classified_intent and classified_intent in intent_pipeline_map:
+        if intent_weights:
+            weights_used = intent_weights
+        elif classified_intent and classified_intent in intent_pipeline_map:
             try:
                 pipeline_id = intent_pipeline_map[classified_intent]
                 pipeline_response = opensearch_client.search_pipeline.get(id=pipeline_id)
@@ -538,6 +3807,20 @@ async def search_videos_marengo3(request: SearchRequest):
         else:
             weights_used = []
 
+        if request.group_by_video:
+            videos = group_results_by_video(results, top_k, request.clips_per_video)
+            logger.info(f"✓ Grouped {len(results)} clips into {len(videos)} videos")
+            return SearchResponse(
+                query=query_display,
+                classified_intent=classified_intent,
+                weights_used=weights_used,
+                search_type=search_type_display,
+                total=len(videos),
+                clips=[],
+                videos=videos,
+                cache_hit=cached is not None,
+            )
+
         return SearchResponse(
             query=query_display,
             classified_intent=classified_intent,
@@ -545,48 +3828,348 @@ async def search_videos_marengo3(request: SearchRequest):
             search_type=search_type_display,
             total=len(results),
             clips=results,
+            cache_hit=cached is not None,
         )
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in search-3: {str(e)}", exc_info=True)
+        logger.error(f"Error in search-3: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def run_degraded_keyword_search(request: SearchRequest) -> SearchResponse:
+    """
+    Answer a text query with video_name matches while no query embedding can be generated
+    (Bedrock failing or its circuit open). Merging, diversity (stored clip vectors) and
+    grouping need no query embedding and apply as usual.
+    """
+    query_text = request.query_text
+    top_k = request.top_k
+    post_processed = request.group_by_video or request.merge_segments or request.diversity > 0
+    results = await opensearch_limiter.run(
+        keyword_search_marengo3,
+        opensearch_client,
+        query_text,
+        max(top_k, TOP_K) if post_processed else top_k,
+        "video_clips_3_lucene",
+        video_id=request.video_id,
+        time_start=request.time_start,
+        time_end=request.time_end,
+    )
+    if request.merge_segments:
+        results = merge_adjacent_clips(results, request.merge_gap_sec)
+    if request.diversity > 0 and len(results) > 1:
+        results = await opensearch_limiter.run(
+            diversify_results, opensearch_client, results, request.diversity
+        )
+    if not request.group_by_video:
+        results = results[:top_k]
+    results = await s3_limiter.run(convert_s3_to_presigned_urls, s3_client, results)
+    if request.group_by_video:
+        videos = group_results_by_video(results, top_k, request.clips_per_video)
+        return SearchResponse(
+            query=query_text, search_type="keyword", total=len(videos), clips=[], videos=videos, degraded=True
+        )
+    return SearchResponse(
+        query=query_text,
+        search_type="keyword",
+        total=len(results),
+        clips=results,
+        degraded=True,
+    )
+
+
+async def run_federated_search(request: SearchRequest) -> SearchResponse:
+    """
+    Search the Marengo 3 and legacy Marengo 2.7 libraries together: both query embeddings are
+    generated concurrently (each behind its model's circuit breaker), all k-NN lists run in one
+    _msearch and are fused with weighted RRF. If neither embedding is available the query degrades
+    to keyword search like /search-3. merge_segments and group_by_video apply as in /search-3;
+    diversity does not, the two models' vectors live in different spaces.
+    """
+    query_text = request.query_text
+    top_k = request.top_k
+    logger.info(f"🔀 Federated search (Marengo 3 + 2.7): '{query_text}' (top_k: {top_k})")
+    embedding_3, embedding_27 = await asyncio.gather(
+        bedrock_embed_limiter.run(generate_embedding_marengo3, bedrock_runtime, text=query_text),
+        bedrock_embed_limiter.run(generate_text_embedding, bedrock_runtime, query_text, guarded=True),
+    )
+    if not embedding_3 and not embedding_27:
+        logger.warning("⚠️ No federated query embedding, degrading to keyword search over video_name")
+        return await run_degraded_keyword_search(request)
+    if not embedding_3 or not embedding_27:
+        logger.warning(f"⚠️ Federated search continues with the Marengo {'2.7' if embedding_27 else '3'} library only")
+
+    post_processed = request.group_by_video or request.merge_segments
+    results = await opensearch_limiter.run(
+        federated_search,
+        opensearch_client,
+        embedding_3,
+        embedding_27,
+        top_k=max(top_k, TOP_K) if post_processed else top_k,
+    )
+    if request.merge_segments:
+        results = merge_adjacent_clips(results, request.merge_gap_sec)
+    if not request.group_by_video:
+        results = results[:top_k]
+    results = await s3_limiter.run(convert_s3_to_presigned_urls, s3_client, results)
+
+    if request.group_by_video:
+        videos = group_results_by_video(results, top_k, request.clips_per_video)
+        return SearchResponse(
+            query=query_text, search_type="federated", total=len(videos), clips=[], videos=videos
+        )
+    return SearchResponse(query=query_text, search_type="federated", total=len(results), clips=results)
+
+
+@app.post("/similar-clips", response_model=SearchResponse)
+async def search_similar_clips(request: SimilarClipsRequest):
+    """
+    "More like this clip" (Marengo 3)
+    Reuses the stored emb_visual/emb_audio vectors of an indexed clip (its _id) to run
+    the modality-weighted k-NN directly, without a Bedrock round-trip.
+    """
+    try:
+        if request.preference not in VISUAL_AUDIO_PREFERENCES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid preference: {request.preference}. Supported: {', '.join(VISUAL_AUDIO_PREFERENCES)}",
+            )
+
+        source_clip = await opensearch_limiter.run(get_clip_vectors, opensearch_client, request.clip_id)
+        if source_clip is None:
+            raise HTTPException(status_code=404, detail=f"Clip not found: {request.clip_id}")
+
+        logger.info(f"🔍 More-like-this search for clip {request.clip_id} ({request.preference})")
+
+        results = await opensearch_limiter.run(
+            similar_clips_search_marengo3,
+            opensearch_client,
+            source_clip,
+            request.top_k,
+            "video_clips_3_lucene",
+            preference=request.preference,
+            exclude_adjacent=request.exclude_adjacent,
+            adjacent_window_sec=request.adjacent_window_sec,
+        )
+
+        results = await s3_limiter.run(convert_s3_to_presigned_urls, s3_client, results)
+
+        logger.info(f"✓ More-like-this search completed, found {len(results)} results")
+
+        return SearchResponse(
+            query=request.clip_id,
+            classified_intent=request.preference,
+            search_type="similar",
+            total=len(results),
+            clips=results,
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in similar-clips: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/related-clips/{clip_id}", response_model=SearchResponse)
+async def get_related_clips(clip_id: str, modality: str = "visual", top_k: int = 10):
+    """
+    Related clips from the precomputed nearest-neighbor graph
+    A single neighbor-document fetch plus a metadata mget, no k-NN query
+    """
+    try:
+        if modality not in [field.replace("emb_", "") for field in VISUAL_AUDIO_FIELDS]:
+            raise HTTPException(status_code=400, detail=f"Invalid modality: {modality}")
+
+        results = await opensearch_limiter.run(
+            get_related_clips_from_graph, opensearch_client, clip_id, modality, top_k
+        )
+        if results is None:
+            raise HTTPException(
+                status_code=404, detail=f"No neighbor graph entry for clip: {clip_id}"
+            )
+
+        results = await s3_limiter.run(convert_s3_to_presigned_urls, s3_client, results)
+
+        return SearchResponse(
+            query=clip_id,
+            search_type=f"related_{modality}",
+            total=len(results),
+            clips=results,
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in related-clips: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/neighbor-graph/refresh")
+async def refresh_neighbor_graph(full: bool = False, x_admin_key: Optional[str] = Header(None)):
+    """
+    Start a background (re)build of the clip nearest-neighbor graph
+    - full=false: only clips indexed since the last run are added (incremental)
+    - full=true: recompute every clip's neighbors from scratch (requires X-Admin-Key)
+    The build lock is taken here and released by the build thread when it finishes.
+    """
+    if full:
+        _require_admin_key(x_admin_key)
+
+    lock = contextlib.ExitStack()
+    if not lock.enter_context(_try_file_lock(NEIGHBOR_GRAPH_LOCK_PATH)):
+        lock.close()
+        return {"status": "already_running"}
+
+    def build():
+        with lock:
+            _run_neighbor_graph_build(opensearch_client, not full, NEIGHBOR_GRAPH_K)
+
+    asyncio.create_task(asyncio.to_thread(build))
+    return {"status": "started", "mode": "full" if full else "incremental"}
+
+
+@app.get("/list", response_model=VideosListResponse)
+async def list_all_videos(
+    limit: int = CATALOG_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: Optional[str] = None,
+    q: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    List videos one page at a time from the video catalog index.
+    - sort: created_at (default), name, duration, clips or relevance (default when q is given)
+    - order: asc or desc (default asc for name, desc otherwise)
+    - q: search-as-you-type match on the video name
+    - cursor: next_cursor of the previous page, valid for the same sort, order and q
+    Until the catalog index has been checked at startup, the whole list is served from the clip
+    aggregation in video_catalog (no paging). Both paths answer If-None-Match with 304.
+    """
+    q = q.strip() if q and q.strip() else None
+    sort = sort or ("relevance" if q else "created_at")
+    if sort not in CATALOG_SORT_FIELDS or (sort == "relevance" and not q):
+        raise HTTPException(status_code=400, detail=f"Invalid sort: {sort}")
+    order = order or ("asc" if sort == "name" else "desc")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail=f"Invalid order: {order}")
+    limit = max(1, min(limit, CATALOG_MAX_PAGE_SIZE))
+
+    try:
+        if catalog_index.ready:
+            stats = catalog_index
+            body, etag = await opensearch_limiter.run(
+                catalog_index.page, opensearch_client, s3_client, limit, cursor, sort, order, q
+            )
+        else:
+            stats = video_catalog
+            if not video_catalog.ready:
+                await opensearch_limiter.run(video_catalog.refresh, opensearch_client)
+                if not video_catalog.ready:
+                    raise HTTPException(status_code=503, detail="Video list is temporarily unavailable, please retry shortly")
+            body, etag = await s3_limiter.run(video_catalog.response, s3_client)
+
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+            stats.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in list_videos: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/list", response_model=VideosListResponse)
-async def list_all_videos():
-    """
-    Get all unique videos from the OpenSearch index
-    Returns video metadata including S3 paths and clip counts
-    """
+@app.post("/catalog/backfill")
+async def backfill_video_catalog():
+    """Rebuild the video catalog index from the clip index (e.g. after ingesting with an older lambda)"""
+    written = await opensearch_limiter.run(catalog_index.backfill, opensearch_client)
+    return {"status": "completed", "video_parts": written}
+
+
+async def _prepare_video_catalog_index():
+    """Check (and if needed backfill) the video catalog index before /list switches over to it"""
+    global catalog_state
     try:
-        # Get all unique videos from OpenSearch
-        videos = get_all_unique_videos(opensearch_client)
+        await asyncio.to_thread(catalog_index.ensure, opensearch_client)
+        catalog_state = "ready"
+        logger.info(f"✓ /list is served from the video catalog index {VIDEO_CATALOG_INDEX_NAME}")
+    except Exception as e:
+        catalog_state = "failed"
+        logger.warning(f"Video catalog index unavailable, /list keeps using the clip aggregation: {e}")
+    _publish_leader_state()
 
-        # Transform to response format
-        video_list = []
-        for video in videos:
-            # Generate presigned URL for private S3 bucket access
-            presigned_url = convert_s3_to_presigned_url(s3_client, video["video_path"])
 
-            video_list.append(
-                VideoMetadata(
-                    video_id=video["video_id"],
-                    video_path=presigned_url if presigned_url else video["video_path"],
-                    title=video.get("clip_text") or f"Video {video['video_id'][:8]}",
-                    thumbnail_url=video.get("thumbnail_url"),
-                    duration=video.get("duration"),
-                    upload_date=video.get("upload_date"),
-                    clips_count=video.get("clips_count", 0),
-                )
+async def _video_catalog_refresh_loop():
+    """Rebuild the cached clip-aggregation catalog whenever its change signal moves, until the catalog index takes over"""
+    while not catalog_index.ready:
+        try:
+            await opensearch_limiter.run(video_catalog.refresh, opensearch_client)
+        except Exception as e:
+            logger.warning(f"Could not refresh video catalog: {e}")
+        await asyncio.sleep(CATALOG_REFRESH_SECONDS)
+
+
+@app.get("/suggest")
+async def suggest(q: str = "", limit: int = SUGGEST_DEFAULT_LIMIT):
+    """
+    Typeahead suggestions for the search bar: video names and popular earlier searches (at least
+    SUGGEST_MIN_QUERY_COUNT times) with a word starting with q, ranked by how often they were searched
+    """
+    limit = max(1, min(limit, SUGGEST_MAX_LIMIT))
+    return {"query": q, "suggestions": suggestion_index.lookup(q, limit)}
+
+
+def collect_suggestions(client) -> List[tuple]:
+    """(text, weight, source) entries for the suggestion index: catalog video names and logged queries"""
+    entries = []
+    if catalog_index.ready:
+        after = None
+        while True:
+            body = {"size": 1000, "_source": ["video_name"], "sort": [{"catalog_id": {"order": "asc"}}]}
+            if after:
+                body["search_after"] = after
+            hits = client.search(index=VIDEO_CATALOG_INDEX_NAME, body=body)["hits"]["hits"]
+            entries.extend(
+                (hit["_source"]["video_name"], SUGGEST_VIDEO_NAME_WEIGHT, "video")
+                for hit in hits
+                if hit["_source"].get("video_name")
             )
+            if len(hits) < 1000:
+                break
+            after = hits[-1]["sort"]
+    elif video_catalog.ready:
+        entries.extend(
+            (video["clip_text"], SUGGEST_VIDEO_NAME_WEIGHT, "video")
+            for video in video_catalog._videos
+            if video.get("clip_text")
+        )
+    if query_log:
+        entries.extend(
+            (request["query_text"], request["count"], "query")
+            for request in query_log.top(QUERY_LOG_MAX_ENTRIES)
+            if request["count"] >= SUGGEST_MIN_QUERY_COUNT
+        )
+    return entries
 
-        return VideosListResponse(videos=video_list, total=len(video_list))
 
-    except Exception as e:
-        logger.error(f"Error in list_videos: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+async def _suggestion_refresh_loop():
+    """Rebuild the suggestion index from the catalog and the shared popular-query log"""
+    while True:
+        try:
+            entries = await opensearch_limiter.run(collect_suggestions, opensearch_client)
+            await asyncio.to_thread(suggestion_index.rebuild, entries)
+            logger.debug(f"💡 Suggestion index rebuilt: {suggestion_index.stats()['entries']} entries")
+        except Exception as e:
+            logger.warning(f"Could not rebuild suggestion index: {e}")
+        await asyncio.sleep(SUGGEST_REFRESH_SECONDS)
 
 
 @app.post("/generate-upload-presigned-url")
@@ -656,21 +4239,35 @@ def get_opensearch_client():
     session = boto3.Session()
     credentials = session.get_credentials()
 
-    auth = AWSV4SignerAuth(credentials, "us-east-1", "es")
+    auth = Urllib3AWSV4SignerAuth(credentials, "us-east-1", "es")
 
     return OpenSearch(
         hosts=[{"host": opensearch_host, "port": 443}],
         http_auth=auth,
         use_ssl=True,
         verify_certs=True,
-        connection_class=RequestsHttpConnection,
-        pool_maxsize=20,
+        connection_class=MeasuredUrllib3HttpConnection,
+        pool_maxsize=OPENSEARCH_POOL_MAXSIZE,
+        timeout=OPENSEARCH_TIMEOUT_SECONDS,
+        max_retries=OPENSEARCH_MAX_RETRIES,
+        retry_on_timeout=True,
+        retry_on_status=OPENSEARCH_RETRY_ON_STATUS,
     )
 
 
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """Return the image format from its leading magic bytes, or None if unsupported"""
+    for signature, image_format in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return image_format
+    return None
+
+
 def validate_image(image_base64: str) -> tuple[bool, str]:
     """
     Validate if the provided base64 string is a valid image
+    Only the first base64 block is decoded for the magic bytes; the decoded size is
+    derived from the string length, so the full image is decoded once, by Bedrock.
     Returns (is_valid, error_message)
     """
     try:
@@ -678,42 +4275,29 @@ def validate_image(image_base64: str) -> tuple[bool, str]:
         if not image_base64 or len(image_base64.strip()) == 0:
             return False, "Image base64 string is empty"
 
-        # Try to decode base64
+        # Decode just enough characters (16 chars -> 12 bytes) for the signature check
         try:
-            image_data = base64.b64decode(image_base64)
+            header = base64.b64decode(image_base64[:16])
         except Exception as e:
             return False, f"Invalid base64 encoding: {str(e)}"
 
+        image_size = len(image_base64) * 3 // 4 - image_base64[-2:].count("=")
+
         # Check minimum size (at least 100 bytes)
-        if len(image_data) < 100:
+        if image_size < IMAGE_MIN_BYTES:
             return False, "Image data is too small"
 
         # Check maximum size (5MB)
-        max_size = 5 * 1024 * 1024
-        if len(image_data) > max_size:
+        if image_size > IMAGE_MAX_BYTES:
             return False, "Image data exceeds 5MB limit"
 
-        # Validate image magic bytes (signatures)
-        valid_signatures = {
-            b"\xff\xd8\xff": "jpeg",
-            b"\x89\x50\x4e\x47": "png",
-            b"\x47\x49\x46": "gif",
-            b"\x52\x49\x46\x46": "webp",
-        }
-
-        is_valid_image = False
-        for signature in valid_signatures:
-            if image_data.startswith(signature):
-                is_valid_image = True
-                break
-
-        if not is_valid_image:
+        if sniff_image_format(header) is None:
             return (
                 False,
                 "Image format not supported. Supported formats: JPEG, PNG, GIF, WebP",
             )
 
-        logger.info(f"✓ Image validation passed. Size: {len(image_data)} bytes")
+        logger.info(f"✓ Image validation passed. Size: {image_size} bytes")
         return True, ""
 
     except Exception as e:
@@ -721,9 +4305,267 @@ def validate_image(image_base64: str) -> tuple[bool, str]:
         return False, f"Image validation error: {str(e)}"
 
 
-def generate_text_embedding(bedrock_runtime, text: str) -> List[float]:
-    """Generate embedding for text query using Bedrock Marengo"""
+class RequestBodyLimitMiddleware:
+    """
+    Reject request bodies larger than max_bytes with 413 before the app parses them: up front
+    from Content-Length, otherwise as soon as the received chunks pass the limit
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": "Request body too large"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(RequestBodyLimitMiddleware, max_bytes=REQUEST_BODY_MAX_BYTES)
+
+
+async def read_image_upload(upload: UploadFile) -> tuple[bytearray, str]:
+    """
+    Copy an uploaded image in IMAGE_UPLOAD_CHUNK_SIZE chunks into one preallocated buffer
+    Starlette has already spooled the request body (RequestBodyLimitMiddleware caps its size),
+    so this only avoids extra copies: the format is sniffed from the first chunk, the 5 MB
+    image limit is checked as chunks are copied and the bytes are hashed on the fly.
+    Returns (image_bytes, sha256 hex digest)
+    """
+    if upload.size is not None and upload.size > IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Image data exceeds 5MB limit")
+
+    buffer = bytearray(upload.size or 0)
+    view = memoryview(buffer)
+    digest = hashlib.sha256()
+    size = 0
+
+    while True:
+        chunk = await upload.read(IMAGE_UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if size == 0 and sniff_image_format(chunk) is None:
+            raise HTTPException(
+                status_code=415,
+                detail="Image format not supported. Supported formats: JPEG, PNG, GIF, WebP",
+            )
+        end = size + len(chunk)
+        if end > IMAGE_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Image data exceeds 5MB limit")
+        if end <= len(buffer):
+            view[size:end] = chunk
+        else:
+            # Size unknown up front (or the file grew): fall back to appending
+            view.release()
+            buffer[size:] = chunk
+            view = memoryview(buffer)
+        digest.update(chunk)
+        size = end
+
+    view.release()
+    del buffer[size:]
+
+    if size < IMAGE_MIN_BYTES:
+        raise HTTPException(status_code=400, detail="Image data is too small")
+
+    logger.info(f"✓ Image upload read. Size: {size} bytes")
+    return buffer, digest.hexdigest()
+
+
+def _splice_base64(prefix: bytes, data: bytes, suffix: bytes) -> bytearray:
+    """prefix + base64(data) + suffix, encoded chunk by chunk into one preallocated buffer"""
+    encoded_size = 4 * ((len(data) + 2) // 3)
+    body = bytearray(len(prefix) + encoded_size + len(suffix))
+    body[: len(prefix)] = prefix
+    body[len(prefix) + encoded_size :] = suffix
+
+    source, target = memoryview(data), memoryview(body)
+    step = 3 * IMAGE_UPLOAD_CHUNK_SIZE  # multiple of 3 so chunks encode without padding
+    offset = len(prefix)
+    for start in range(0, len(data), step):
+        encoded = binascii.b2a_base64(source[start : start + step], newline=False)
+        target[offset : offset + len(encoded)] = encoded
+        offset += len(encoded)
+    source.release()
+    target.release()
+    return body
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, rows are frequencies"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    basis = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    basis[0] /= np.sqrt(2)
+    return basis.astype(np.float32)
+
+
+_PHASH_DCT = _dct_matrix(32)
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    """
+    64-bit DCT perceptual hash: the lowest 8x8 frequencies of a 32x32 grayscale thumbnail,
+    thresholded at their median. Robust to re-encoding, rescaling and small colour changes.
+    """
+    pixels = np.asarray(image.convert("L").resize((32, 32), Image.Resampling.LANCZOS), dtype=np.float32)
+    low_frequencies = (_PHASH_DCT @ pixels @ _PHASH_DCT.T)[:8, :8].flatten()
+    bits = low_frequencies > np.median(low_frequencies[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def normalize_image(image_bytes: bytes) -> tuple[bytes, int]:
+    """
+    Decode a query image once, apply its EXIF orientation, downscale it to
+    IMAGE_NORMALIZE_MAX_SIDE and re-encode it as a metadata-free JPEG.
+    JPEGs are decoded directly at reduced scale (draft mode). The original bytes are kept
+    when re-encoding would not make them smaller.
+    Returns (image bytes to embed, perceptual hash)
+    """
+    max_side = IMAGE_NORMALIZE_MAX_SIDE
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency onto white, JPEG has no alpha channel
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        phash = perceptual_hash(image)
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=IMAGE_NORMALIZE_JPEG_QUALITY, optimize=True)
+
+    normalized = output.getvalue()
+    if len(normalized) >= len(image_bytes):
+        return image_bytes, phash
+    return normalized, phash
+
+
+def prepare_query_image(
+    image_bytes: bytes, image_sha256: str, text: Optional[str] = None
+) -> tuple[Optional[List[float]], bytes, Optional[int]]:
+    """
+    Everything before the Bedrock call for an uploaded query image, CPU-bound and run off the
+    event loop. Exact repeats are served from the cache (or embedding store) by content hash.
+    Otherwise the image is normalized (see normalize_image) and near-identical earlier uploads
+    are matched by perceptual hash.
+    Returns (cached embedding or None, image bytes to embed, perceptual hash)
+    """
+    text = text or ""
+    embedding = image_embedding_cache.get_exact(image_sha256, text)
+    if embedding is not None:
+        logger.info(f"✓ Image embedding cache hit ({image_sha256[:12]})")
+        return embedding, image_bytes, None
+    store_input = f"image:{image_sha256}:{normalize_query_text(text)}"
+    embedding = embedding_store.get(MARENGO3_MODEL_ID, store_input) if embedding_store else None
+    if embedding is not None:
+        logger.info(f"✓ Image embedding store hit ({image_sha256[:12]})")
+        image_embedding_cache.put(image_sha256, None, text, embedding)
+        return embedding, image_bytes, None
+
+    phash = None
+    if IMAGE_NORMALIZE_ENABLED:
+        try:
+            start = time.perf_counter()
+            original_size = len(image_bytes)
+            image_bytes, phash = normalize_image(image_bytes)
+            logger.info(
+                f"✓ Normalized image {original_size} -> {len(image_bytes)} bytes "
+                f"in {(time.perf_counter() - start) * 1000:.1f} ms (phash {phash:016x})"
+            )
+        except Exception as e:
+            logger.warning(f"Could not normalize image, embedding the original bytes: {e}")
+
+    cached = image_embedding_cache.get_similar(phash, text)
+    if cached is not None:
+        embedding, distance = cached
+        logger.info(f"✓ Image embedding cache hit by perceptual hash (distance {distance})")
+        image_embedding_cache.put(image_sha256, phash, text, embedding)
+        return embedding, image_bytes, phash
+
+    return None, image_bytes, phash
+
+
+def get_image_embedding_marengo3(
+    bedrock_runtime, image_bytes: bytes, image_sha256: str, text: Optional[str] = None, phash: Optional[int] = None
+) -> List[float]:
+    """
+    Marengo 3 image (or text+image) embedding for a query image prepared by prepare_query_image
+    The bytes are base64-encoded once, straight into the Bedrock request body: base64 needs
+    no JSON escaping, so the body is spliced together instead of going through json.dumps.
+    """
+    text = text or ""
     try:
+        if text:
+            input_type = "multimodal (text+image)"
+            request_body = {
+                "inputType": "text_image",
+                "text_image": {"inputText": text, "mediaSource": {"base64String": ""}},
+            }
+        else:
+            input_type = "image"
+            request_body = {"inputType": "image", "image": {"mediaSource": {"base64String": ""}}}
+
+        prefix, suffix = json.dumps(request_body).encode().split(b'"base64String": ""')
+        body = _splice_base64(prefix + b'"base64String": "', image_bytes, b'"' + suffix)
+        logger.info(f"🔄 Generating {input_type} embedding (Marengo 3) from {len(image_bytes)} image bytes")
+        embedding = _invoke_marengo3(bedrock_runtime, body, input_type)
+    except CircuitOpenError as e:
+        logger.warning(f"⚡ Skipping Marengo 3 image embedding: {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Error generating image embedding (Marengo 3): {e}", exc_info=True)
+        return []
+
+    if embedding:
+        image_embedding_cache.put(image_sha256, phash, text, embedding)
+        if embedding_store:
+            embedding_store.put(MARENGO3_MODEL_ID, f"image:{image_sha256}:{normalize_query_text(text)}", embedding)
+    return embedding
+
+
+async def embed_query_image(image_bytes: bytes, image_sha256: str, text: Optional[str] = None) -> List[float]:
+    """
+    Query image embedding: cache lookups and normalization on their own thread, then only the
+    Bedrock call inside the embedding limiter
+    """
+    embedding, image_bytes, phash = await asyncio.to_thread(prepare_query_image, image_bytes, image_sha256, text)
+    if embedding is not None:
+        return embedding
+    return await bedrock_embed_limiter.run(
+        get_image_embedding_marengo3, bedrock_runtime, image_bytes, image_sha256, text, phash
+    )
+
+
+def generate_text_embedding(bedrock_runtime, text: str, guarded: bool = False) -> List[float]:
+    """
+    Generate embedding for text query using Bedrock Marengo
+    guarded: run through the marengo2.7 circuit breaker and hedger (only for calls admitted by
+    bedrock_embed_limiter, whose latency feedback they provide)
+    """
+
+    def invoke():
         request_body = {"inputType": "text", "inputText": text, "textTruncate": "none"}
 
         response = bedrock_runtime.invoke_model(
@@ -733,13 +4575,19 @@ def generate_text_embedding(bedrock_runtime, text: str) -> List[float]:
             accept="application/json",
         )
 
-        result = json.loads(response["body"].read())
+        return json.loads(response["body"].read())
+
+    try:
+        result = call_bedrock("marengo2.7", invoke) if guarded else invoke()
 
         if "data" in result and len(result["data"]) > 0:
             return result["data"][0].get("embedding", [])
 
         return []
 
+    except CircuitOpenError as e:
+        logger.warning(f"⚡ Skipping Marengo 2.7 text embedding: {e}")
+        return []
     except Exception as e:
         logger.error(f"Error generating text embedding: {e}", exc_info=True)
         return []
@@ -789,6 +4637,22 @@ def generate_image_embedding(bedrock_runtime, image_base64: str) -> List[float]:
 # ============ INTENT CLASSIFICATION FUNCTION ============
 
 
+def invoke_nova_micro(bedrock_runtime, request_body: Dict) -> Dict:
+    """Nova Micro invoke_model call (circuit breaker + hedging), returns the parsed response"""
+    body = json.dumps(request_body)
+
+    def invoke():
+        response = bedrock_runtime.invoke_model(
+            modelId="amazon.nova-micro-v1:0",
+            body=body,
+            contentType="application/json",
+            accept="application/json",
+        )
+        return json.loads(response["body"].read())
+
+    return call_bedrock("nova-micro", invoke)
+
+
 async def classify_query_intent(bedrock_runtime, query_text: str) -> str:
     """
     Classify user query intent using Bedrock Nova Micro model.
@@ -815,15 +4679,7 @@ INPUT: {query_text}"""
         logger.info(f"🔍 Classifying query intent: '{query_text[:50]}...'")
 
         request_body = {"messages": [{"role": "user", "content": [{"text": prompt}]}]}
-
-        response = bedrock_runtime.invoke_model(
-            modelId="amazon.nova-micro-v1:0",
-            body=json.dumps(request_body),
-            contentType="application/json",
-            accept="application/json",
-        )
-
-        result = json.loads(response["body"].read())
+        result = await bedrock_llm_limiter.run(invoke_nova_micro, bedrock_runtime, request_body)
         logger.info(f"Nova Micro response: {result}")
         intent = (
             result.get("output", [{}])
@@ -845,12 +4701,21 @@ INPUT: {query_text}"""
         logger.info(f"✓ Query intent classified as: {intent}")
         return intent
 
+    except (CircuitOpenError, OverloadedError) as e:
+        logger.warning(f"⚡ Skipping intent classification, defaulting to BALANCED: {e}")
+        return "BALANCED"
     except Exception as e:
         logger.error(f"Error classifying query intent: {e}", exc_info=True)
         logger.info("Defaulting to BALANCED intent due to classification error")
         return "BALANCED"
 
 
+async def _shadow_llm_intent(query_text: str, query_embedding: List[float], prototype_intent: str):
+    """Ask the LLM about a sampled confident query in the background and log it next to the prototype decision"""
+    llm_focus = await detect_visual_audio_focus_llm(bedrock_runtime, query_text)
+    log_intent_decision(query_text, query_embedding, llm_focus, prototype_intent, "sample")
+
+
 def get_search_type_from_intent(intent: str) -> str:
     """
     Map intent classification to search type for weighted search
@@ -889,15 +4754,7 @@ INPUT: {query_text}"""
         logger.info(f"🔍 Detecting visual/audio focus: '{query_text[:50]}...'")
 
         request_body = {"messages": [{"role": "user", "content": [{"text": prompt}]}]}
-
-        response = bedrock_runtime.invoke_model(
-            modelId="amazon.nova-micro-v1:0",
-            body=json.dumps(request_body),
-            contentType="application/json",
-            accept="application/json",
-        )
-
-        result = json.loads(response["body"].read())
+        result = await bedrock_llm_limiter.run(invoke_nova_micro, bedrock_runtime, request_body)
         logger.info(f"Nova Micro response: {result}")
         focus = (
             result.get("output", [{}])
@@ -919,12 +4776,92 @@ INPUT: {query_text}"""
         logger.info(f"✓ Visual/Audio focus detected as: {focus}")
         return focus
 
+    except (CircuitOpenError, OverloadedError) as e:
+        logger.warning(f"⚡ Skipping visual/audio focus detection, defaulting to BALANCED: {e}")
+        return "BALANCED"
     except Exception as e:
         logger.error(f"Error detecting visual/audio focus: {e}", exc_info=True)
         logger.info("Defaulting to BALANCED due to detection error")
         return "BALANCED"
 
 
+def count_modality_keywords(query_text: str) -> tuple[int, int, int]:
+    """Count the distinct visual, audio and text keywords in a query (whole words only)"""
+    visual_count = audio_count = text_count = 0
+    for keyword in set(_WORD_PATTERN.findall(query_text.lower())).intersection(_MODALITY_KEYWORD_FLAGS):
+        is_visual, is_audio, is_text = _MODALITY_KEYWORD_FLAGS[keyword]
+        visual_count += is_visual
+        audio_count += is_audio
+        text_count += is_text
+    return visual_count, audio_count, text_count
+
+
+def count_modality_keywords_batch(queries: List[str]) -> np.ndarray:
+    """
+    (n_queries, 3) array of distinct visual/audio/text keyword counts.
+    All queries are joined and tokenized in a single regex pass; the token -> keyword
+    lookup, per-query de-duplication and counting are done with NumPy.
+    """
+    n_queries = len(queries)
+    counts = np.zeros((n_queries, 3), dtype=np.int32)
+    if n_queries == 0:
+        return counts
+
+    # Newlines separate the queries, so newlines inside a query become spaces
+    text = "\n".join((query_text or "").lower().replace("\n", " ") for query_text in queries)
+    words = _BATCH_TOKEN_PATTERN.findall(text)
+    tokens = np.fromiter(map(_BATCH_TOKEN_IDS.get, words, repeat(-1)), dtype=np.int64, count=len(words))
+
+    query_indices = np.cumsum(tokens == 0)
+    is_keyword = tokens > 0
+    n_tokens = len(_BATCH_TOKEN_IDS)
+    distinct = np.unique(query_indices[is_keyword] * n_tokens + tokens[is_keyword])
+    rows, keyword_ids = np.divmod(distinct, n_tokens)
+
+    for column in range(3):
+        counts[:, column] = np.bincount(
+            rows, weights=_BATCH_TOKEN_FLAGS[keyword_ids, column], minlength=n_queries
+        )
+    return counts
+
+
+# combination_type -> (count columns compared, preference when the first / second wins)
+_COMBINATION_PREFERENCES = {
+    "visual_audio": (0, 1, "VISUAL_FOCUS", "AUDIO_FOCUS"),
+    "visual_transcription": (0, 2, "VISUAL_FOCUS", "TEXT_FOCUS"),
+    "audio_transcription": (1, 2, "AUDIO_FOCUS", "TEXT_FOCUS"),
+}
+
+
+def detect_modality_preference_batch(queries: List[str], combination_type: str) -> List[str]:
+    """
+    Vectorized detect_modality_preference for offline evaluation and batch paths.
+    Returns one preference per query.
+    """
+    if combination_type not in _COMBINATION_PREFERENCES:
+        return ["BALANCED"] * len(queries)
+
+    first, second, first_focus, second_focus = _COMBINATION_PREFERENCES[combination_type]
+    counts = count_modality_keywords_batch(queries)
+    preferences = np.full(len(queries), "BALANCED", dtype=object)
+    preferences[counts[:, first] > counts[:, second]] = first_focus
+    preferences[counts[:, second] > counts[:, first]] = second_focus
+    return preferences.tolist()
+
+
+def _preference_from_counts(counts: tuple[int, int, int], combination_type: str) -> str:
+    """Pick the focus for a combination search from (visual, audio, text) keyword counts"""
+    if combination_type not in _COMBINATION_PREFERENCES:
+        return "BALANCED"
+
+    first, second, first_focus, second_focus = _COMBINATION_PREFERENCES[combination_type]
+    if counts[first] > counts[second]:
+        return first_focus
+    if counts[second] > counts[first]:
+        return second_focus
+    return "BALANCED"
+
+
 def detect_modality_preference(query_text: str, combination_type: str) -> str:
     """
     Analyze query text to detect modality preference for combination searches.
@@ -939,42 +4876,11 @@ def detect_modality_preference(query_text: str, combination_type: str) -> str:
     if not query_text:
         return "BALANCED"
     
-    query_lower = query_text.lower()
-    
-    # Count keyword occurrences
-    visual_count = sum(1 for keyword in VISUAL_KEYWORDS if keyword in query_lower)
-    audio_count = sum(1 for keyword in AUDIO_KEYWORDS if keyword in query_lower)
-    text_count = sum(1 for keyword in TEXT_KEYWORDS if keyword in query_lower)
-    
-    logger.info(f"🔍 Modality keyword counts - Visual: {visual_count}, Audio: {audio_count}, Text: {text_count}")
-    
-    # Determine preference based on combination type
-    if combination_type == "visual_audio":
-        if visual_count > audio_count and visual_count > 0:
-            preference = "VISUAL_FOCUS"
-        elif audio_count > visual_count and audio_count > 0:
-            preference = "AUDIO_FOCUS"
-        else:
-            preference = "BALANCED"
-    
-    elif combination_type == "visual_transcription":
-        if visual_count > text_count and visual_count > 0:
-            preference = "VISUAL_FOCUS"
-        elif text_count > visual_count and text_count > 0:
-            preference = "TEXT_FOCUS"
-        else:
-            preference = "BALANCED"
+    counts = count_modality_keywords(query_text)
     
-    elif combination_type == "audio_transcription":
-        if audio_count > text_count and audio_count > 0:
-            preference = "AUDIO_FOCUS"
-        elif text_count > audio_count and text_count > 0:
-            preference = "TEXT_FOCUS"
-        else:
-            preference = "BALANCED"
+    logger.info(f"🔍 Modality keyword counts - Visual: {counts[0]}, Audio: {counts[1]}, Text: {counts[2]}")
     
-    else:
-        preference = "BALANCED"
+    preference = _preference_from_counts(counts, combination_type)
     
     logger.info(f"✓ Detected modality preference for {combination_type}: {preference}")
     return preference
@@ -1002,34 +4908,11 @@ async def detect_modality_preference_llm(bedrock_runtime, query_text: str, combi
         return await detect_visual_audio_focus_llm(bedrock_runtime, query_text)
     
     # For other combination types, use keyword-based detection
-    query_lower = query_text.lower()
-    
-    # Count keyword occurrences
-    visual_count = sum(1 for keyword in VISUAL_KEYWORDS if keyword in query_lower)
-    audio_count = sum(1 for keyword in AUDIO_KEYWORDS if keyword in query_lower)
-    text_count = sum(1 for keyword in TEXT_KEYWORDS if keyword in query_lower)
+    counts = count_modality_keywords(query_text)
     
-    logger.info(f"🔍 Modality keyword counts - Visual: {visual_count}, Audio: {audio_count}, Text: {text_count}")
-    
-    # Determine preference based on combination type
-    if combination_type == "visual_transcription":
-        if visual_count > text_count and visual_count > 0:
-            preference = "VISUAL_FOCUS"
-        elif text_count > visual_count and text_count > 0:
-            preference = "TEXT_FOCUS"
-        else:
-            preference = "BALANCED"
-    
-    elif combination_type == "audio_transcription":
-        if audio_count > text_count and audio_count > 0:
-            preference = "AUDIO_FOCUS"
-        elif text_count > audio_count and text_count > 0:
-            preference = "TEXT_FOCUS"
-        else:
-            preference = "BALANCED"
+    logger.info(f"🔍 Modality keyword counts - Visual: {counts[0]}, Audio: {counts[1]}, Text: {counts[2]}")
     
-    else:
-        preference = "BALANCED"
+    preference = _preference_from_counts(counts, combination_type)
     
     logger.info(f"✓ Detected modality preference for {combination_type}: {preference}")
     return preference
@@ -1053,6 +4936,15 @@ def generate_embedding_marengo3(
 
         # Text-only request
         if text and not image_base64:
+            cached = text_embedding_cache.get(text)
+            if cached is not None:
+                logger.info(f"✓ Text embedding cache hit (Marengo 3): '{text[:50]}...'")
+                return cached
+            cached = embedding_store.get(MARENGO3_MODEL_ID, normalize_query_text(text)) if embedding_store else None
+            if cached is not None:
+                logger.info(f"✓ Text embedding store hit (Marengo 3): '{text[:50]}...'")
+                text_embedding_cache.put(text, cached)
+                return cached
             logger.info(f"🔄 Generating text embedding (Marengo 3): '{text[:50]}...'")
             request_body = {"inputType": "text", "text": {"inputText": text}}
 
@@ -1085,35 +4977,51 @@ def generate_embedding_marengo3(
                 },
             }
 
-        logger.info(f"📤 Invoking Marengo 3 model")
+        input_type = (
+            "multimodal (text+image)"
+            if (text and image_base64)
+            else ("image" if image_base64 else "text")
+        )
+        embedding = _invoke_marengo3(bedrock_runtime, json.dumps(request_body), input_type)
+        if embedding and input_type == "text":
+            text_embedding_cache.put(text, embedding)
+            if embedding_store:
+                embedding_store.put(MARENGO3_MODEL_ID, normalize_query_text(text), embedding)
+        return embedding
+
+    except CircuitOpenError as e:
+        logger.warning(f"⚡ Skipping Marengo 3 embedding: {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Error generating embedding (Marengo 3): {e}", exc_info=True)
+        return []
+
+
+def _invoke_marengo3(bedrock_runtime, body, input_type: str) -> List[float]:
+    """Send a prepared Marengo 3 request body (str or bytes) and return the first embedding"""
+    logger.info(f"📤 Invoking Marengo 3 model")
+
+    def invoke():
         response = bedrock_runtime.invoke_model(
-            modelId="us.twelvelabs.marengo-embed-3-0-v1:0",
-            body=json.dumps(request_body),
+            modelId=MARENGO3_MODEL_ID,
+            body=body,
             contentType="application/json",
             accept="application/json",
         )
+        return json.loads(response["body"].read())
 
-        result = json.loads(response["body"].read())
-        logger.info(f"✓ Marengo 3 response received")
-
-        if "data" in result and len(result["data"]) > 0:
-            embedding = result["data"][0].get("embedding", [])
-            input_type = (
-                "multimodal (text+image)"
-                if (text and image_base64)
-                else ("image" if image_base64 else "text")
-            )
-            logger.info(
-                f"✓ Generated {input_type} embedding (Marengo 3) with {len(embedding)} dimensions"
-            )
-            return embedding
+    result = call_bedrock("marengo3", invoke)
+    logger.info(f"✓ Marengo 3 response received")
 
-        logger.warning(f"No embedding data in Marengo 3 response. Response: {result}")
-        return []
+    if "data" in result and len(result["data"]) > 0:
+        embedding = result["data"][0].get("embedding", [])
+        logger.info(
+            f"✓ Generated {input_type} embedding (Marengo 3) with {len(embedding)} dimensions"
+        )
+        return embedding
 
-    except Exception as e:
-        logger.error(f"Error generating embedding (Marengo 3): {e}", exc_info=True)
-        return []
+    logger.warning(f"No embedding data in Marengo 3 response. Response: {result}")
+    return []
 
 
 def search_with_image(
@@ -1233,6 +5141,13 @@ def convert_s3_to_presigned_url(
         return None
 
 
+def thumbnail_cdn_url(s3_path: Optional[str]) -> Optional[str]:
+    """Map an s3://bucket/key image path onto THUMBNAIL_CDN_BASE_URL, None when no CDN is configured"""
+    if not THUMBNAIL_CDN_BASE_URL or not s3_path or not s3_path.startswith("s3://"):
+        return None
+    return f"{THUMBNAIL_CDN_BASE_URL}/{s3_path[5:].split('/', 1)[-1]}"
+
+
 def get_all_unique_videos(client) -> List[Dict]:
     """Get all unique videos from OpenSearch index"""
     search_body = {
@@ -1244,7 +5159,8 @@ def get_all_unique_videos(client) -> List[Dict]:
                     "video_metadata": {
                         "top_hits": {
                             "size": 1,
-                            "_source": ["video_id", "video_path", "clip_text"],
+                            "sort": [{"timestamp_start": "asc"}],
+                            "_source": ["video_id", "video_path", "clip_text", "thumbnail_path"],
                         }
                     },
                     "clip_count": {"cardinality": {"field": "clip_id"}},
@@ -1607,24 +5523,14 @@ def vector_search_marengo3(
     top_k: int = 10,
     INDEX_NAME: str = "video_clips_3_lucene",
     preference: str = "BALANCED",
+    weights: Optional[List[float]] = None,
 ) -> List[Dict]:
     
     # Map preference to pipeline and weights
-    pipeline_map = {
-        "VISUAL_FOCUS": VECTOR_PIPELINE_3_VISUAL_AUDIO_VISUAL_FOCUS,
-        "AUDIO_FOCUS": VECTOR_PIPELINE_3_VISUAL_AUDIO_AUDIO_FOCUS,
-        "BALANCED": VECTOR_PIPELINE_3_VISUAL_AUDIO_BALANCED
-    }
-    
-    weights_map = {
-        "VISUAL_FOCUS": COMBINATION_WEIGHTS["VISUAL_AUDIO_VISUAL_FOCUS"],
-        "AUDIO_FOCUS": COMBINATION_WEIGHTS["VISUAL_AUDIO_AUDIO_FOCUS"],
-        "BALANCED": COMBINATION_WEIGHTS["VISUAL_AUDIO_BALANCED"]
-    }
-    
-    selected_pipeline = pipeline_map[preference]
-    selected_weights = weights_map[preference]
-    
+    selected_pipeline, selected_weights = VISUAL_AUDIO_PREFERENCES[preference]
+    if weights:
+        selected_weights = weights
+
     logger.info(f"📊 Using {preference} pipeline for visual_audio search with weights {selected_weights}")
     
     search_body = {
@@ -1658,7 +5564,26 @@ def vector_search_marengo3(
     }
 
 
-    if vector_pipeline_exists:
+    if weights:
+        # Continuous weights: temporary RRF pipeline defined in the request body
+        search_body["search_pipeline"] = {
+            "phase_results_processors": [
+                {
+                    "score-ranker-processor": {
+                        "combination": {
+                            "technique": "rrf",
+                            "rank_constant": RRF_RANK_CONSTANT,
+                            "parameters": {"weights": selected_weights},
+                        }
+                    }
+                }
+            ]
+        }
+        search_params = {
+                "index": INDEX_NAME,
+                "body": search_body
+            }
+    elif vector_pipeline_exists:
         search_params = {
                 "index": INDEX_NAME,
                 "body": search_body,
@@ -1776,6 +5701,226 @@ def visual_search_marengo3(
         return []
 
 
+def collapsed_knn_search_marengo3(
+    client,
+    query_embedding: List[float],
+    field: str,
+    top_videos: int,
+    clips_per_video: int,
+    INDEX_NAME: str = "video_clips_3_lucene",
+) -> List[Dict]:
+    """
+    Single-modality k-NN collapsed on video_id: the top_videos best videos, each with its
+    clips_per_video best clips as inner hits. Returned flat, best video first and its clips
+    in score order, ready for group_results_by_video. Each clip carries video_matched_clips,
+    the number of its video's clips among the k-NN candidates (the inner hits' total).
+    """
+    search_body = {
+        "size": top_videos,
+        "query": {
+            "knn": {field: {"vector": query_embedding, "k": max(INNER_TOP_K, top_videos * clips_per_video)}}
+        },
+        "collapse": {
+            "field": "video_id",
+            "inner_hits": {
+                "name": "best_clips",
+                "size": clips_per_video,
+                "sort": [{"_score": "desc"}],
+                "_source": CLIP_SOURCE_FIELDS,
+            },
+        },
+        # The collapsed hit is the best inner hit again, only the inner hits carry documents
+        "_source": False,
+    }
+
+    try:
+        response = client.search(index=INDEX_NAME, body=search_body)
+        results = []
+        for hit in response["hits"]["hits"]:
+            inner_hits = hit["inner_hits"]["best_clips"]
+            matched = inner_hits["hits"]["total"]["value"]
+            results.extend(dict(clip, video_matched_clips=matched) for clip in parse_search_results(inner_hits))
+        logger.info(
+            f"✓ Collapsed {field} search (Marengo 3) completed, {len(response['hits']['hits'])} videos / {len(results)} clips"
+        )
+        return results
+    except Exception as e:
+        logger.error(f"Collapsed search (Marengo 3) error: {e}", exc_info=True)
+        return []
+
+
+def merge_adjacent_clips(results: List[Dict], gap_sec: float = MERGE_GAP_SEC) -> List[Dict]:
+    """
+    Merge hits of the same video whose time ranges overlap or lie at most gap_sec apart into one
+    segment (sort by video and start, then a single sweep). A segment takes the metadata, thumbnail
+    and _id of its best clip, spans all merged clips, scores as its best clip (mean_score and
+    merged_clips describe the rest) and lists its clip_ids. Segments come back in score order.
+    The input clips are not modified.
+    """
+    if not results:
+        return []
+
+    segments = []
+    current = None
+    for rank, clip in sorted(
+        enumerate(results), key=lambda item: (item[1].get("video_id") or "", item[1].get("timestamp_start") or 0.0)
+    ):
+        start = clip.get("timestamp_start") or 0.0
+        end = clip.get("timestamp_end") or start
+        if current is not None and clip.get("video_id") == current["video_id"] and start <= current["end"] + gap_sec:
+            current["end"] = max(current["end"], end)
+            current["clips"].append((rank, clip))
+        else:
+            current = {"video_id": clip.get("video_id"), "start": start, "end": end, "clips": [(rank, clip)]}
+            segments.append(current)
+
+    merged = []
+    for segment in segments:
+        # The best clip has the lowest rank in the (score-ordered) input list
+        best_rank, best = min(segment["clips"], key=lambda item: item[0])
+        if len(segment["clips"]) == 1:
+            merged.append((best_rank, best))
+            continue
+        scores = [clip.get("score") or 0.0 for _, clip in segment["clips"]]
+        result = dict(best)
+        result["timestamp_start"] = segment["start"]
+        result["timestamp_end"] = segment["end"]
+        result["clip_duration"] = round(segment["end"] - segment["start"], 2)
+        result["mean_score"] = sum(scores) / len(scores)
+        result["merged_clips"] = len(segment["clips"])
+        result["clip_ids"] = [clip.get("clip_id") for _, clip in segment["clips"]]
+        merged.append((best_rank, result))
+
+    merged.sort(key=lambda item: item[0])
+    return [result for _, result in merged]
+
+
+def federated_search(
+    client,
+    embedding_3: Optional[List[float]],
+    embedding_27: Optional[List[float]],
+    preference: str = "BALANCED",
+    candidates: int = FEDERATED_CANDIDATES,
+    top_k: int = TOP_K,
+) -> List[Dict]:
+    """
+    Per-modality k-NN lists over the Marengo 3 index and the legacy Marengo 2.7 index in a single
+    _msearch, fused with weighted RRF (score = sum of weight / (RRF_RANK_CONSTANT + rank)); the
+    top_k best are returned. A clip's hits from the lists of its own library add up; a clip of
+    the other library joins it when both come from the same video_path and their time ranges
+    overlap by at least FEDERATED_MIN_OVERLAP of the shorter one (each fused result holds at most
+    one clip per model and keeps the metadata of the clip seen first). `sources` lists the models
+    that found it.
+    """
+    _, weights = VISUAL_AUDIO_PREFERENCES[preference]
+    lists = []
+    if embedding_3:
+        lists += [(INDEX_NAME, field, weight, embedding_3) for field, weight in zip(VISUAL_AUDIO_FIELDS, weights)]
+    if embedding_27:
+        lists += [
+            (LEGACY_INDEX_NAME, field, weight * FEDERATED_LEGACY_WEIGHT, embedding_27)
+            for field, weight in zip(LEGACY_KNN_FIELDS, weights)
+        ]
+    if not lists:
+        return []
+
+    body = []
+    for index_name, field, _, embedding in lists:
+        body.append({"index": index_name})
+        body.append(
+            {
+                "size": candidates,
+                "query": {"knn": {field: {"vector": embedding, "k": candidates}}},
+                "_source": CLIP_SOURCE_FIELDS,
+            }
+        )
+
+    try:
+        responses = client.msearch(body=body)["responses"]
+    except Exception as e:
+        logger.error(f"Federated _msearch error: {e}", exc_info=True)
+        return []
+
+    fused: List[Dict] = []
+    by_clip: Dict[tuple, Dict] = {}
+    by_video: Dict[Any, List[Dict]] = {}
+    for (index_name, field, weight, _), response in zip(lists, responses):
+        if "error" in response:
+            logger.warning(f"Federated {index_name}/{field} search failed: {response['error']}")
+            continue
+        model = "marengo3" if index_name == INDEX_NAME else "marengo2.7"
+        for rank, hit in enumerate(response["hits"]["hits"], start=1):
+            source = hit["_source"]
+            result = by_clip.get((index_name, hit["_id"]))
+            if result is None:
+                start = source.get("timestamp_start") or 0.0
+                end = max(source.get("timestamp_end") or start, start)
+                same_video = by_video.setdefault(source.get("video_path"), [])
+                result = next(
+                    (
+                        other
+                        for other in same_video
+                        if model not in other["sources"] and _ranges_overlap(other, start, end)
+                    ),
+                    None,
+                )
+                if result is None:
+                    result = dict(source, _id=hit["_id"], score=0.0, sources=[])
+                    fused.append(result)
+                    same_video.append(result)
+                by_clip[(index_name, hit["_id"])] = result
+            result["score"] += weight / (RRF_RANK_CONSTANT + rank)
+            if model not in result["sources"]:
+                result["sources"].append(model)
+
+    results = sorted(fused, key=lambda result: result["score"], reverse=True)[:top_k]
+    logger.info(
+        f"✓ Federated search fused {len(lists)} lists into {len(fused)} clips "
+        f"({sum('marengo2.7' in result['sources'] for result in results)} of the top {len(results)} from Marengo 2.7)"
+    )
+    return results
+
+
+def _ranges_overlap(result: Dict, start: float, end: float) -> bool:
+    """Whether [start, end] overlaps result's time range by FEDERATED_MIN_OVERLAP of the shorter one"""
+    other_start = result.get("timestamp_start") or 0.0
+    other_end = max(result.get("timestamp_end") or other_start, other_start)
+    overlap = min(end, other_end) - max(start, other_start)
+    if overlap <= 0:
+        # Ranges without a duration only match the same start
+        return overlap == 0 and round(start, 1) == round(other_start, 1)
+    return overlap >= FEDERATED_MIN_OVERLAP * min(end - start, other_end - other_start)
+
+
+def group_results_by_video(results: List[Dict], top_videos: int, clips_per_video: int) -> List[Dict]:
+    """
+    Group a score-ordered clip list by video in one pass: videos rank by their best clip and
+    keep their clips_per_video best clips. matched_clips is the number of the video's clips among
+    the search's candidates: every clip of the video in results, or video_matched_clips when the
+    collapsed search only returned the best ones.
+    """
+    groups: Dict[str, Dict] = {}
+    for clip in results:
+        group = groups.get(clip["video_id"])
+        if group is None:
+            if len(groups) == top_videos:
+                continue
+            group = groups[clip["video_id"]] = {
+                "video_id": clip["video_id"],
+                "video_name": clip.get("video_name"),
+                "video_path": clip.get("video_path"),
+                "video_duration_sec": clip.get("video_duration_sec"),
+                "thumbnail_path": clip.get("thumbnail_path"),
+                "score": clip.get("score"),
+                "matched_clips": 0,
+                "clips": [],
+            }
+        group["matched_clips"] = clip.get("video_matched_clips") or group["matched_clips"] + 1
+        if len(group["clips"]) < clips_per_video:
+            group["clips"].append(clip)
+    return list(groups.values())
+
+
 def audio_search_marengo3(
     client,
     query_embedding: List[float],
@@ -2075,6 +6220,866 @@ def audio_search_marengo3(
 #         return []
 
 
+# ============ EXACT (NUMPY) CLIP SCORING FOR MARENGO 3 ============
+
+
+def _l2_normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of a 2-D float32 matrix (zero rows stay zero)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def exact_score_clips(
+    query_embedding: List[float],
+    clip_vectors: Dict[str, np.ndarray],
+    fields: List[str],
+    weights: List[float],
+    rank_constant: int = RRF_RANK_CONSTANT,
+) -> np.ndarray:
+    """
+    Score clips exactly with NumPy, mirroring what OpenSearch returns for the same query.
+
+    clip_vectors maps an embedding field to an (n_clips, dim) matrix whose rows
+    are NaN for clips missing that modality. Several fields mirror the weighted RRF
+    search pipelines: each field is ranked by cosine similarity and the ranks are fused
+    as sum(weight / (rank_constant + rank)). A single field is a plain k-NN query, so it
+    gets the cosinesimil score (1 + cos) / 2, and clips missing it score 0.
+    """
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    if query_norm > 0:
+        query = query / query_norm
+
+    n_clips = next(iter(clip_vectors.values())).shape[0] if clip_vectors else 0
+    fused = np.zeros(n_clips, dtype=np.float64)
+
+    if len(fields) == 1:
+        matrix = clip_vectors.get(fields[0])
+        if matrix is not None and n_clips:
+            present = ~np.isnan(matrix).any(axis=1)
+            fused[present] = (1.0 + _l2_normalize_rows(matrix[present]) @ query) / 2.0
+        return fused
+
+    for field, weight in zip(fields, weights):
+        matrix = clip_vectors.get(field)
+        if matrix is None or n_clips == 0:
+            continue
+
+        present = ~np.isnan(matrix).any(axis=1)
+        if not present.any():
+            continue
+
+        similarities = _l2_normalize_rows(matrix[present]) @ query
+        order = np.argsort(-similarities, kind="stable")
+        ranks = np.empty_like(order)
+        ranks[order] = np.arange(1, order.size + 1)
+
+        fused[present] += weight / (rank_constant + ranks)
+
+    return fused
+
+
+def fetch_clip_vectors(
+    client,
+    query: Dict,
+    fields: List[str],
+    index_name: str = INDEX_NAME,
+    max_clips: int = FINE_MAX_CLIPS,
+) -> tuple[List[Dict], Dict[str, np.ndarray]]:
+    """
+    Fetch clip metadata plus stored embedding vectors for every clip matching query (at most max_clips).
+    Pages of FINE_PAGE_SIZE are sorted on clip_id and continued with search_after, so no single
+    response carries thousands of vectors.
+    Returns (metadata list, {field: (n_clips, dim) float32 matrix}) with NaN rows
+    for clips that do not carry a given modality.
+    """
+    metadata = []
+    vectors: Dict[str, List] = {field: [] for field in fields}
+    dim = None
+    after = None
+
+    while len(metadata) < max_clips:
+        page_size = min(FINE_PAGE_SIZE, max_clips - len(metadata))
+        search_body = {
+            "size": page_size,
+            "query": query,
+            "_source": CLIP_SOURCE_FIELDS + fields,
+            "sort": [{"clip_id": {"order": "asc"}}],
+        }
+        if after:
+            search_body["search_after"] = after
+
+        response = client.search(index=index_name, body=search_body)
+        hits = response.get("hits", {}).get("hits", [])
+
+        for hit in hits:
+            source = hit["_source"]
+            for field in fields:
+                vector = source.pop(field, None)
+                if vector is not None and dim is None:
+                    dim = len(vector)
+                vectors[field].append(vector)
+            source["_id"] = hit["_id"]
+            metadata.append(source)
+
+        if len(hits) < page_size:
+            break
+        after = hits[-1]["sort"]
+
+    matrices = {}
+    for field, rows in vectors.items():
+        matrix = np.full((len(rows), dim or 0), np.nan, dtype=np.float32)
+        for i, row in enumerate(rows):
+            if row is not None:
+                matrix[i] = row
+        matrices[field] = matrix
+
+    return metadata, matrices
+
+
+def find_top_videos_marengo3(
+    client,
+    query_embedding: List[float],
+    preference: str = "BALANCED",
+    top_videos: int = COARSE_TOP_VIDEOS,
+) -> List[str]:
+    """
+    Coarse step: kNN over the per-video centroid index, returns the best video_ids
+    Centroids are stored per video part, so parts are over-fetched and deduplicated down to top_videos.
+    """
+    selected_pipeline, _ = VISUAL_AUDIO_PREFERENCES[preference]
+    parts = top_videos * COARSE_PART_OVERFETCH
+
+    search_body = {
+        "size": parts,
+        "query": {
+            "hybrid": {
+                "queries": [
+                    {"knn": {field: {"vector": query_embedding, "k": parts}}}
+                    for field in VISUAL_AUDIO_FIELDS
+                ]
+            }
+        },
+        "_source": ["video_id", "part"],
+    }
+
+    search_params = {"index": VIDEO_CENTROID_INDEX_NAME, "body": search_body}
+    if vector_pipeline_exists:
+        search_params["search_pipeline"] = selected_pipeline
+
+    response = client.search(**search_params)
+
+    video_ids = []
+    for hit in response.get("hits", {}).get("hits", []):
+        video_id = hit["_source"].get("video_id")
+        if video_id and video_id not in video_ids:
+            video_ids.append(video_id)
+            if len(video_ids) == top_videos:
+                break
+
+    return video_ids
+
+
+def coarse_to_fine_search_marengo3(
+    client,
+    query_embedding: List[float],
+    top_k: int = 10,
+    INDEX_NAME: str = "video_clips_3_lucene",
+    preference: str = "BALANCED",
+    top_videos: int = COARSE_TOP_VIDEOS,
+) -> List[Dict]:
+    """
+    Coarse-to-fine vector search (Marengo 3)
+    1. Coarse: find the top videos from the per-video centroid index
+    2. Fine: exact NumPy scoring of the clips that belong to those videos only
+    Falls back to the regular clip-level kNN search if the centroid index is empty.
+    """
+    try:
+        video_ids = find_top_videos_marengo3(client, query_embedding, preference, top_videos)
+    except Exception as e:
+        logger.warning(f"Coarse centroid search failed, falling back to clip kNN: {e}")
+        video_ids = []
+
+    if not video_ids:
+        return vector_search_marengo3(client, query_embedding, top_k, INDEX_NAME, preference=preference)
+
+    logger.info(f"📊 Coarse step selected {len(video_ids)} videos")
+
+    try:
+        metadata, clip_vectors = fetch_clip_vectors(
+            client, {"terms": {"video_id": video_ids}}, VISUAL_AUDIO_FIELDS, INDEX_NAME
+        )
+    except Exception as e:
+        logger.error(f"Fine step clip fetch error: {e}", exc_info=True)
+        return []
+
+    if not metadata:
+        return []
+
+    _, weights = VISUAL_AUDIO_PREFERENCES[preference]
+    scores = exact_score_clips(query_embedding, clip_vectors, VISUAL_AUDIO_FIELDS, weights)
+
+    # Same result count and score scale as vector_search_marengo3 (normalized weighted RRF)
+    top_indices = np.argsort(-scores, kind="stable")[:top_k]
+    results = []
+    for i in top_indices:
+        if scores[i] <= 0:
+            break
+        result = metadata[i]
+        result["score_raw"] = float(scores[i])
+        result["score"] = round(normalize_rrf(float(scores[i])), 3)
+        results.append(result)
+
+    logger.info(
+        f"✓ Coarse-to-fine search ({preference}, Marengo 3) scored {len(metadata)} clips, returning {len(results)}"
+    )
+    return results
+
+
+def keyword_search_marengo3(
+    client,
+    query_text: str,
+    top_k: int = 10,
+    INDEX_NAME: str = "video_clips_3_lucene",
+    video_id: Optional[str] = None,
+    time_start: Optional[float] = None,
+    time_end: Optional[float] = None,
+) -> List[Dict]:
+    """
+    Degraded-mode search (no query embedding): BM25 match on video_name
+    Scores are divided by the best hit's score so they stay in the 0-1 range the UI expects.
+    """
+    query = {"match": {"video_name": {"query": query_text, "fuzziness": "AUTO"}}}
+    if video_id:
+        scope_filter = build_video_scope_filter(video_id, time_start, time_end)
+        query = {"bool": {"must": [query], "filter": scope_filter["bool"]["filter"]}}
+
+    try:
+        response = client.search(
+            index=INDEX_NAME,
+            body={"size": top_k, "query": query, "_source": CLIP_SOURCE_FIELDS},
+        )
+        results = parse_search_results(response)
+        max_score = max((r["score"] for r in results), default=0) or 1.0
+        for result in results:
+            result["score"] = round(result["score"] / max_score, 3)
+        logger.info(f"✓ Keyword search (degraded) found {len(results)} results")
+        return results
+
+    except Exception as e:
+        logger.error(f"Keyword search error: {e}", exc_info=True)
+        return []
+
+
+def build_video_scope_filter(
+    video_id: str, time_start: Optional[float] = None, time_end: Optional[float] = None
+) -> Dict:
+    """Filter clause restricting clips to one video and, optionally, a time range"""
+    filters = [{"term": {"video_id": video_id}}]
+    if time_start is not None:
+        filters.append({"range": {"timestamp_end": {"gte": time_start}}})
+    if time_end is not None:
+        filters.append({"range": {"timestamp_start": {"lte": time_end}}})
+    return {"bool": {"filter": filters}}
+
+
+def video_scoped_search_marengo3(
+    client,
+    query_embedding: List[float],
+    video_id: str,
+    fields: List[str],
+    weights: List[float],
+    pipeline: Optional[str] = None,
+    time_start: Optional[float] = None,
+    time_end: Optional[float] = None,
+    INDEX_NAME: str = "video_clips_3_lucene",
+) -> List[Dict]:
+    """
+    Search inside a single video (Marengo 3)
+    - Small videos (<= VIDEO_SCOPE_EXACT_MAX_CLIPS clips): fetch the clip vectors and score them exactly with NumPy
+    - Large videos: efficient filtered k-NN so that k is spent on this video only
+    """
+    scope_filter = build_video_scope_filter(video_id, time_start, time_end)
+
+    try:
+        clip_count = client.count(index=INDEX_NAME, body={"query": scope_filter})["count"]
+    except Exception as e:
+        logger.error(f"Video-scoped clip count error: {e}", exc_info=True)
+        return []
+
+    if clip_count == 0:
+        logger.info(f"No clips found for video {video_id} in the requested range")
+        return []
+
+    if clip_count <= VIDEO_SCOPE_EXACT_MAX_CLIPS:
+        logger.info(f"📊 Video-scoped exact scoring over {clip_count} clips")
+        try:
+            metadata, clip_vectors = fetch_clip_vectors(
+                client, scope_filter, fields, INDEX_NAME, max_clips=clip_count
+            )
+        except Exception as e:
+            logger.error(f"Video-scoped clip fetch error: {e}", exc_info=True)
+            return []
+
+        scores = exact_score_clips(query_embedding, clip_vectors, fields, weights)
+        results = []
+        for i in np.argsort(-scores, kind="stable")[:TOP_K]:
+            if scores[i] <= 0:
+                break
+            result = metadata[i]
+            result["score"] = float(scores[i])
+            results.append(result)
+        return results
+
+    logger.info(f"📊 Video-scoped filtered k-NN over {clip_count} clips")
+    knn_queries = [
+        {
+            "knn": {
+                field: {
+                    "vector": query_embedding,
+                    "k": INNER_TOP_K,
+                    "filter": scope_filter,
+                }
+            }
+        }
+        for field in fields
+    ]
+
+    if len(knn_queries) == 1:
+        search_params = {
+            "index": INDEX_NAME,
+            "body": {"size": TOP_K, "query": knn_queries[0], "_source": CLIP_SOURCE_FIELDS},
+        }
+    else:
+        search_params = {
+            "index": INDEX_NAME,
+            "body": {
+                "size": TOP_K,
+                "query": {"hybrid": {"queries": knn_queries}},
+                "_source": CLIP_SOURCE_FIELDS,
+            },
+        }
+        if vector_pipeline_exists and pipeline:
+            search_params["search_pipeline"] = pipeline
+
+    try:
+        response = client.search(**search_params)
+        logger.info(
+            f"✓ Video-scoped search (Marengo 3) completed, found {len(response.get('hits', {}).get('hits', []))} results"
+        )
+        return parse_search_results(response)
+    except Exception as e:
+        logger.error(f"Video-scoped search (Marengo 3) error: {e}", exc_info=True)
+        return []
+
+
+def get_clip_vectors(client, clip_id: str, INDEX_NAME: str = "video_clips_3_lucene") -> Optional[Dict]:
+    """Fetch (and cache) the stored embedding vectors and position of a single clip"""
+    cached = clip_vector_cache.get(clip_id)
+    if cached is not None:
+        return cached
+
+    try:
+        response = client.get(
+            index=INDEX_NAME,
+            id=clip_id,
+            _source_includes=["video_id", "timestamp_start", "timestamp_end"] + VISUAL_AUDIO_FIELDS,
+        )
+    except Exception as e:
+        logger.warning(f"Could not fetch clip {clip_id}: {e}")
+        return None
+
+    if not response.get("found"):
+        return None
+
+    source_clip = response["_source"]
+    source_clip["_id"] = response["_id"]
+    clip_vector_cache.put(clip_id, source_clip)
+    return source_clip
+
+
+def fetch_vectors_by_id(client, clip_ids: List[str], INDEX_NAME: str = "video_clips_3_lucene") -> Dict[str, Dict]:
+    """Stored vectors of many clips in one mget, sharing clip_vector_cache with get_clip_vectors"""
+    found = {}
+    missing = []
+    for clip_id in clip_ids:
+        cached = clip_vector_cache.get(clip_id)
+        if cached is not None:
+            found[clip_id] = cached
+        else:
+            missing.append(clip_id)
+
+    if missing:
+        response = client.mget(
+            index=INDEX_NAME,
+            body={"ids": missing},
+            _source_includes=["video_id", "timestamp_start", "timestamp_end"] + VISUAL_AUDIO_FIELDS,
+        )
+        for doc in response.get("docs", []):
+            if doc.get("found"):
+                source_clip = doc["_source"]
+                source_clip["_id"] = doc["_id"]
+                clip_vector_cache.put(doc["_id"], source_clip)
+                found[doc["_id"]] = source_clip
+    return found
+
+
+def mmr_rerank(relevance: np.ndarray, vectors: np.ndarray, diversity: float, k: Optional[int] = None) -> np.ndarray:
+    """
+    Maximal marginal relevance order of n candidates: the first k positions are picked greedily,
+    the rest keep their relevance order. relevance is (n,), vectors is (n, dim) with L2-normalized
+    (or zero) rows. All pairwise similarities come from one matmul; each greedy step then only
+    updates a running max-similarity vector, so the selection loop is O(n) per step.
+    """
+    n = len(relevance)
+    k = n if k is None else min(k, n)
+    span = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / span if span > 0 else np.ones(n, dtype=np.float32)
+    similarity = vectors @ vectors.T
+
+    # Picked candidates get -inf relevance, so they can never win again
+    weighted_relevance = (1.0 - diversity) * relevance
+    penalty = np.zeros(n, dtype=np.float32)
+    order = np.empty(k, dtype=np.int64)
+    for step in range(k):
+        best = int(np.argmax(weighted_relevance - penalty))
+        order[step] = best
+        weighted_relevance[best] = -np.inf
+        np.maximum(penalty, diversity * similarity[best], out=penalty)
+
+    ranked = np.argsort(-relevance, kind="stable")
+    return np.concatenate([order, ranked[np.isin(ranked, order, invert=True)]])
+
+
+def diversify_results(client, results: List[Dict], diversity: float) -> List[Dict]:
+    """
+    Rerank fused clips with MMR over their stored visual and audio vectors (each L2-normalized and
+    concatenated, so a similarity is the mean of the per-modality cosines). Clips whose vectors
+    cannot be fetched are only ranked by relevance.
+    """
+    candidates = results[:MMR_MAX_CANDIDATES]
+    try:
+        stored = fetch_vectors_by_id(client, [clip["_id"] for clip in candidates])
+    except Exception as e:
+        logger.warning(f"Could not fetch clip vectors for diversification, keeping fused order: {e}")
+        return results
+
+    blocks = []
+    for field in VISUAL_AUDIO_FIELDS:
+        matrix = np.zeros((len(candidates), MARENGO3_EMBEDDING_DIM), dtype=np.float32)
+        for i, clip in enumerate(candidates):
+            vector = stored.get(clip["_id"], {}).get(field)
+            if vector is not None:
+                matrix[i] = vector
+        blocks.append(_l2_normalize_rows(matrix))
+    vectors = np.hstack(blocks) / np.sqrt(len(blocks))
+
+    relevance = np.array([clip.get("score") or 0.0 for clip in candidates], dtype=np.float32)
+    started = time.perf_counter()
+    order = mmr_rerank(relevance, vectors, diversity, k=TOP_K)
+    logger.info(
+        f"✓ MMR diversity {diversity} over {len(candidates)} clips in {(time.perf_counter() - started) * 1000:.2f} ms"
+    )
+    return [candidates[i] for i in order] + results[MMR_MAX_CANDIDATES:]
+
+
+def similar_clips_search_marengo3(
+    client,
+    source_clip: Dict,
+    top_k: int = 10,
+    INDEX_NAME: str = "video_clips_3_lucene",
+    preference: str = "BALANCED",
+    exclude_adjacent: bool = True,
+    adjacent_window_sec: float = SIMILAR_ADJACENT_WINDOW_SEC,
+) -> List[Dict]:
+    """
+    Modality-weighted k-NN using a clip's own stored vectors (Marengo 3)
+    Each modality field is queried with the source clip's vector for that modality.
+    The source clip is always excluded; with exclude_adjacent, clips of the same video
+    within adjacent_window_sec of the source clip are excluded as well.
+    """
+    selected_pipeline, selected_weights = VISUAL_AUDIO_PREFERENCES[preference]
+
+    exclusions = [{"ids": {"values": [source_clip["_id"]]}}]
+    if exclude_adjacent and source_clip.get("video_id"):
+        exclusions.append(
+            {
+                "bool": {
+                    "filter": [
+                        {"term": {"video_id": source_clip["video_id"]}},
+                        {"range": {"timestamp_end": {"gte": source_clip.get("timestamp_start", 0) - adjacent_window_sec}}},
+                        {"range": {"timestamp_start": {"lte": source_clip.get("timestamp_end", 0) + adjacent_window_sec}}},
+                    ]
+                }
+            }
+        )
+    exclusion_filter = {"bool": {"must_not": exclusions}}
+
+    knn_queries = [
+        {
+            "knn": {
+                field: {
+                    "vector": source_clip[field],
+                    "k": INNER_TOP_K,
+                    "filter": exclusion_filter,
+                }
+            }
+        }
+        for field in VISUAL_AUDIO_FIELDS
+        if source_clip.get(field)
+    ]
+
+    if not knn_queries:
+        logger.warning(f"Clip {source_clip['_id']} has no stored visual/audio vectors")
+        return []
+
+    if len(knn_queries) == 1:
+        search_params = {
+            "index": INDEX_NAME,
+            "body": {"size": TOP_K, "query": knn_queries[0], "_source": CLIP_SOURCE_FIELDS},
+        }
+    else:
+        search_params = {
+            "index": INDEX_NAME,
+            "body": {
+                "size": TOP_K,
+                "query": {"hybrid": {"queries": knn_queries}},
+                "_source": CLIP_SOURCE_FIELDS,
+            },
+        }
+        if vector_pipeline_exists:
+            search_params["search_pipeline"] = selected_pipeline
+
+    logger.info(f"📊 Using {preference} pipeline for more-like-this search with weights {selected_weights}")
+
+    try:
+        response = client.search(**search_params)
+        logger.info(
+            f"✓ More-like-this search (Marengo 3) completed, found {len(response.get('hits', {}).get('hits', []))} results"
+        )
+        return parse_search_results(response)
+    except Exception as e:
+        logger.error(f"More-like-this search (Marengo 3) error: {e}", exc_info=True)
+        return []
+
+
+# ============ PRECOMPUTED CLIP NEIGHBOR GRAPH (MARENGO 3) ============
+
+
+def _create_neighbor_graph_index(client):
+    """Create the neighbor side index; neighbor lists live in _source only and are not indexed"""
+    if client.indices.exists(index=NEIGHBOR_INDEX_NAME):
+        return
+
+    index_body = {
+        "settings": {"index": {"number_of_shards": 1, "number_of_replicas": 1}},
+        "mappings": {
+            "dynamic": False,
+            "properties": {
+                "clip_id": {"type": "keyword"},
+                "updated_at": {"type": "date"},
+            },
+        },
+    }
+    client.indices.create(index=NEIGHBOR_INDEX_NAME, body=index_body)
+    logger.info(f"✓ Created neighbor graph index: {NEIGHBOR_INDEX_NAME}")
+
+
+def compute_top_k_neighbors(
+    queries: np.ndarray,
+    corpus: np.ndarray,
+    k: int,
+    self_rows: Optional[np.ndarray] = None,
+    batch_size: int = NEIGHBOR_GRAPH_BATCH_SIZE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k cosine neighbors of every query row among the corpus rows, in batches.
+    Rows containing NaN (missing modality) never match. self_rows[i] is the corpus row
+    of query i, excluded as a self-match (-1 if none). Returns (indices, scores) of
+    shape (n_queries, k); unused slots hold index -1 and score -inf.
+    """
+    n_queries = queries.shape[0]
+    indices = np.full((n_queries, k), -1, dtype=np.int64)
+    scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+
+    corpus_present = ~np.isnan(corpus).any(axis=1)
+    if n_queries == 0 or not corpus_present.any():
+        return indices, scores
+
+    corpus_normalized = _l2_normalize_rows(np.where(corpus_present[:, None], corpus, 0))
+    query_present = ~np.isnan(queries).any(axis=1)
+    queries_normalized = _l2_normalize_rows(np.where(query_present[:, None], queries, 0))
+    k_eff = min(k, corpus.shape[0])
+
+    for start in range(0, n_queries, batch_size):
+        end = min(start + batch_size, n_queries)
+        similarities = queries_normalized[start:end] @ corpus_normalized.T
+        similarities[:, ~corpus_present] = -np.inf
+        similarities[~query_present[start:end]] = -np.inf
+
+        if self_rows is not None:
+            batch_self = self_rows[start:end]
+            has_self = batch_self >= 0
+            similarities[np.flatnonzero(has_self), batch_self[has_self]] = -np.inf
+
+        candidates = np.argpartition(-similarities, k_eff - 1, axis=1)[:, :k_eff]
+        candidate_scores = np.take_along_axis(similarities, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")
+
+        indices[start:end, :k_eff] = np.take_along_axis(candidates, order, axis=1)
+        scores[start:end, :k_eff] = np.take_along_axis(candidate_scores, order, axis=1)
+
+    indices[~np.isfinite(scores)] = -1
+    return indices, scores
+
+
+def _clip_vector_matrices(sources: List[Dict], fields: List[str], dims: Optional[Dict[str, int]] = None) -> Dict[str, np.ndarray]:
+    """Stack clip vectors into {field: float32 matrix}; rows are NaN for clips missing that field"""
+    matrices = {}
+    for field in fields:
+        vectors = [source.get(field) for source in sources]
+        dim = dims[field] if dims else next((len(v) for v in vectors if v), 0)
+        matrix = np.full((len(vectors), dim), np.nan, dtype=np.float32)
+        for i, vector in enumerate(vectors):
+            if vector and dim:
+                matrix[i] = vector
+        matrices[field] = matrix
+    return matrices
+
+
+def _scan_clip_vector_batches(
+    client,
+    fields: List[str],
+    query: Dict,
+    dims: Optional[Dict[str, int]] = None,
+    batch_size: Optional[int] = NEIGHBOR_GRAPH_BATCH_SIZE,
+    INDEX_NAME: str = "video_clips_3_lucene",
+):
+    """
+    Scroll the clips matching query, yielding (clip ids, created_at values, {field: float32 matrix})
+    batches of batch_size clips (a single batch when None)
+    """
+    clip_ids, created_at, sources = [], [], []
+    for hit in helpers.scan(
+        client,
+        index=INDEX_NAME,
+        query={"query": query, "_source": ["created_at"] + fields},
+        size=500,
+    ):
+        clip_ids.append(hit["_id"])
+        created_at.append(hit["_source"].get("created_at") or "")
+        sources.append(hit["_source"])
+        if batch_size and len(clip_ids) == batch_size:
+            yield clip_ids, created_at, _clip_vector_matrices(sources, fields, dims)
+            clip_ids, created_at, sources = [], [], []
+    if clip_ids:
+        yield clip_ids, created_at, _clip_vector_matrices(sources, fields, dims)
+
+
+def _neighbor_ids(clip_ids: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """Map neighbor row indices to clip ids (None for unused slots)"""
+    return np.where(indices >= 0, clip_ids[np.maximum(indices, 0)], None)
+
+
+def _merge_top_k(ids: np.ndarray, scores: np.ndarray, more_ids: np.ndarray, more_scores: np.ndarray, k: int):
+    """Row-wise top-k of two (ids, scores) neighbor candidate sets"""
+    ids = np.concatenate([ids, more_ids], axis=1)
+    scores = np.concatenate([scores, more_scores], axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def _neighbor_list(ids: np.ndarray, scores: np.ndarray) -> tuple[List[str], List[float]]:
+    """Convert one row of neighbor ids/scores into compact id and score lists"""
+    valid = np.isfinite(scores)
+    return list(ids[valid]), [round(float(x), 4) for x in scores[valid]]
+
+
+def _write_neighbor_docs(client, docs: Dict[str, Dict]) -> tuple[int, set]:
+    """Bulk-index neighbor documents; returns (written, ids of failed documents)"""
+    actions = [
+        {"_op_type": "index", "_index": NEIGHBOR_INDEX_NAME, "_id": clip_id, "_source": doc}
+        for clip_id, doc in docs.items()
+    ]
+    written, errors = helpers.bulk(client, actions, chunk_size=500, raise_on_error=False)
+    return written, {next(iter(item.values())).get("_id") for item in errors}
+
+
+def build_neighbor_graph(client, incremental: bool = True, k: int = NEIGHBOR_GRAPH_K) -> int:
+    """
+    Compute the top-k neighbors of every clip per modality and store them in the side index.
+    Incremental runs only load the clips created since the last run, score them against each
+    other and against one streamed pass over the older clips, and merge them into the older
+    clips' stored lists. Full builds hold every vector in memory.
+    The watermark only advances past clips whose documents were all written, and never closer
+    than NEIGHBOR_GRAPH_WATERMARK_LAG_SECONDS to the build's start.
+    Returns the number of documents written.
+    """
+    with _try_file_lock(NEIGHBOR_GRAPH_LOCK_PATH) as acquired:
+        if not acquired:
+            logger.info("Neighbor graph build already running, skipping")
+            return 0
+        return _run_neighbor_graph_build(client, incremental, k)
+
+
+def _run_neighbor_graph_build(client, incremental: bool, k: int) -> int:
+    """Build with the neighbor graph lock already held by the caller"""
+    try:
+        return _build_neighbor_graph(client, incremental, k)
+    except Exception as e:
+        logger.error(f"Neighbor graph build error: {e}", exc_info=True)
+        return 0
+
+
+def _build_neighbor_graph(client, incremental: bool, k: int) -> int:
+    _create_neighbor_graph_index(client)
+    started = datetime.datetime.utcnow()
+
+    watermark = ""
+    if incremental:
+        try:
+            state = client.get(index=NEIGHBOR_INDEX_NAME, id=NEIGHBOR_GRAPH_STATE_ID)
+            watermark = state["_source"].get("last_created_at", "")
+        except Exception:
+            logger.info("No neighbor graph state found, running a full build")
+
+    new_query = {"range": {"created_at": {"gt": watermark}}} if watermark else {"match_all": {}}
+    clip_ids, created_at, matrices = next(
+        _scan_clip_vector_batches(client, VISUAL_AUDIO_FIELDS, new_query, batch_size=None), ([], [], {})
+    )
+    if not clip_ids:
+        logger.info("No new clips since the last neighbor graph run")
+        return 0
+    logger.info(f"🔄 Building neighbor graph ({'incremental' if watermark else 'full'}): {len(clip_ids)} clips")
+
+    now = datetime.datetime.utcnow().isoformat()
+    new_ids = np.asarray(clip_ids, dtype=object)
+    fields = [field for field in VISUAL_AUDIO_FIELDS if matrices[field].shape[1]]
+    dims = {field: matrix.shape[1] for field, matrix in matrices.items()}
+
+    # New clips: neighbors among themselves ...
+    best = {}
+    for field in fields:
+        matrix = matrices[field]
+        indices, scores = compute_top_k_neighbors(matrix, matrix, k, self_rows=np.arange(len(clip_ids)))
+        best[field] = (_neighbor_ids(new_ids, indices), scores)
+
+    # ... and against one streamed pass over the older clips, whose stored lists absorb the new clips
+    written, failed = 0, set()
+    if watermark:
+        for old_clip_ids, _, old_matrices in _scan_clip_vector_batches(
+            client, VISUAL_AUDIO_FIELDS, {"bool": {"must_not": [new_query]}}, dims
+        ):
+            old_ids = np.asarray(old_clip_ids, dtype=object)
+            stored = {
+                doc["_id"]: doc["_source"]
+                for doc in client.mget(index=NEIGHBOR_INDEX_NAME, body={"ids": old_clip_ids})["docs"]
+                if doc.get("found")
+            }
+            docs = {}
+            for field in fields:
+                modality = field.replace("emb_", "")
+                indices, scores = compute_top_k_neighbors(matrices[field], old_matrices[field], k)
+                best[field] = _merge_top_k(*best[field], _neighbor_ids(old_ids, indices), scores, k)
+
+                indices, scores = compute_top_k_neighbors(old_matrices[field], matrices[field], k)
+                for clip_id, row_indices, row_scores in zip(old_clip_ids, indices, scores):
+                    candidate_ids, candidate_scores = _neighbor_list(_neighbor_ids(new_ids, row_indices), row_scores)
+                    if not candidate_ids:
+                        continue
+
+                    previous = stored.get(clip_id, {})
+                    merged = dict(zip(previous.get(f"neighbors_{modality}", []), previous.get(f"scores_{modality}", [])))
+                    kth_score = min(merged.values()) if len(merged) >= k else -np.inf
+                    if candidate_scores[0] <= kth_score:
+                        continue
+
+                    merged.update(zip(candidate_ids, candidate_scores))
+                    top = sorted(merged.items(), key=lambda item: item[1], reverse=True)[:k]
+
+                    doc = docs.setdefault(clip_id, dict(previous, clip_id=clip_id))
+                    doc["updated_at"] = now
+                    doc[f"neighbors_{modality}"] = [neighbor_id for neighbor_id, _ in top]
+                    doc[f"scores_{modality}"] = [score for _, score in top]
+
+            batch_written, batch_failed = _write_neighbor_docs(client, docs)
+            written += batch_written
+            failed |= batch_failed
+
+    docs = {}
+    for field in fields:
+        modality = field.replace("emb_", "")
+        for clip_id, row_ids, row_scores in zip(clip_ids, *best[field]):
+            doc = docs.setdefault(clip_id, {"clip_id": clip_id, "updated_at": now})
+            doc[f"neighbors_{modality}"], doc[f"scores_{modality}"] = _neighbor_list(row_ids, row_scores)
+    batch_written, batch_failed = _write_neighbor_docs(client, docs)
+    written += batch_written
+    failed |= batch_failed
+
+    # Failed writes: stop the watermark before the oldest affected new clip so the next run redoes it.
+    # A failed older clip's merge involved every new clip, so it holds the watermark where it was.
+    last_created_at = max(created_at)
+    if failed:
+        created_by_id = dict(zip(clip_ids, created_at))
+        oldest_failed = min(created_by_id.get(clip_id, min(created_at)) for clip_id in failed)
+        last_created_at = max((ts for ts in created_at if ts < oldest_failed), default=watermark)
+        logger.warning(f"⚠️ {len(failed)} neighbor documents failed to write, watermark held at {last_created_at!r}")
+    # Clips created inside the lag may still be missing from this run; the next run redoes them
+    lag_cutoff = (started - datetime.timedelta(seconds=NEIGHBOR_GRAPH_WATERMARK_LAG_SECONDS)).isoformat()
+    last_created_at = max(min(last_created_at, lag_cutoff), watermark)
+
+    client.index(
+        index=NEIGHBOR_INDEX_NAME,
+        id=NEIGHBOR_GRAPH_STATE_ID,
+        body={"last_created_at": last_created_at, "updated_at": now, "new_clips": len(clip_ids)},
+    )
+
+    logger.info(f"✓ Neighbor graph updated: {written} documents written")
+    return written
+
+
+async def _neighbor_graph_refresh_loop():
+    """
+    Periodically run an incremental neighbor graph update in a worker thread. The worker
+    process holding the refresh lock runs the updates; the others keep trying to take it over.
+    """
+    while True:
+        await asyncio.sleep(NEIGHBOR_GRAPH_REFRESH_SECONDS)
+        if not _try_worker_lock("neighbor-refresh"):
+            continue
+        await asyncio.to_thread(build_neighbor_graph, opensearch_client, True)
+
+
+def get_related_clips_from_graph(
+    client, clip_id: str, modality: str = "visual", top_k: int = 10, INDEX_NAME: str = "video_clips_3_lucene"
+) -> Optional[List[Dict]]:
+    """Read a clip's precomputed neighbors and hydrate them with clip metadata"""
+    try:
+        entry = client.get(index=NEIGHBOR_INDEX_NAME, id=clip_id)["_source"]
+    except Exception as e:
+        logger.info(f"No neighbor graph entry for {clip_id}: {e}")
+        return None
+
+    neighbor_ids = entry.get(f"neighbors_{modality}", [])[:top_k]
+    neighbor_scores = entry.get(f"scores_{modality}", [])[:top_k]
+    if not neighbor_ids:
+        return []
+
+    response = client.mget(index=INDEX_NAME, body={"ids": neighbor_ids}, _source_includes=CLIP_SOURCE_FIELDS)
+
+    results = []
+    for doc, score in zip(response.get("docs", []), neighbor_scores):
+        if not doc.get("found"):
+            continue
+        result = doc["_source"]
+        result["_id"] = doc["_id"]
+        result["score"] = score
+        results.append(result)
+
+    return results
+
+
 def _create_hybrid_search_pipeline(client):
     """Create search pipeline with score normalization for hybrid search"""
 
@@ -2457,4 +7462,7 @@ def parse_search_results_vector(response):
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
+    if SERVER_WORKERS > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=port, log_level="info", workers=SERVER_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
@@ -0,0 +1,141 @@
+import numpy as np
+
+import main
+
+
+def unit(*values):
+    return [float(v) for v in values]
+
+
+def test_shared_embedding_cache_evicts_least_recently_used_way(tmp_path):
+    cache = main.SharedEmbeddingCache(str(tmp_path / "embeddings"), max_size=8, dim=2)
+    assert cache.max_size == 8  # a single 8-way set
+
+    for i in range(8):
+        cache.put(f"k{i}", unit(i, i))
+    assert cache.get("k0") == unit(0, 0)  # k0 is now the most recently used
+
+    cache.put("k8", unit(8, 8))
+
+    assert cache.get("k1") is None
+    assert cache.get("k0") == unit(0, 0)
+    assert cache.get("k8") == unit(8, 8)
+    assert cache.stats()["size"] == 8
+
+
+def test_shared_embedding_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "embeddings")
+    main.SharedEmbeddingCache(path, max_size=16, dim=2).put("query", unit(1, 2))
+
+    other = main.SharedEmbeddingCache(path, max_size=16, dim=2)
+
+    assert other.get("query") == unit(1, 2)
+    assert other.stats()["hits"] == 1
+
+
+def test_shared_embedding_cache_ignores_wrong_dimension(tmp_path):
+    cache = main.SharedEmbeddingCache(str(tmp_path / "embeddings"), max_size=8, dim=2)
+
+    cache.put("query", unit(1, 2, 3))
+
+    assert cache.get("query") is None
+
+
+def semantic_cache(tmp_path, max_size=2, ttl_seconds=60):
+    return main.SharedSemanticResultCache(
+        str(tmp_path / "results"), max_size, threshold=0.95, ttl_seconds=ttl_seconds, dim=2, value_bytes=1024
+    )
+
+
+def test_shared_semantic_result_cache_matches_similar_queries_in_context(tmp_path):
+    cache = semantic_cache(tmp_path)
+    cache.put(unit(1, 0), "ctx", {"clips": [1]})
+
+    value, similarity = cache.lookup(unit(1, 0.05), "ctx")
+
+    assert value == {"clips": [1]}
+    assert similarity > 0.95
+    assert cache.lookup(unit(1, 0), "other") is None
+    assert cache.lookup(unit(0, 1), "ctx") is None
+
+
+def test_shared_semantic_result_cache_evicts_least_recently_used(tmp_path):
+    cache = semantic_cache(tmp_path, max_size=2)
+    cache.put(unit(1, 0), "ctx", "first")
+    cache.put(unit(0, 1), "ctx", "second")
+    assert cache.lookup(unit(1, 0), "ctx")[0] == "first"
+
+    cache.put(unit(-1, 0), "ctx", "third")
+
+    assert cache.lookup(unit(0, 1), "ctx") is None
+    assert cache.lookup(unit(1, 0), "ctx")[0] == "first"
+    assert cache.lookup(unit(-1, 0), "ctx")[0] == "third"
+
+
+def test_shared_semantic_result_cache_expires_entries(tmp_path, monkeypatch):
+    cache = semantic_cache(tmp_path, ttl_seconds=60)
+    now = 1_000_000.0
+    monkeypatch.setattr(main.time, "time", lambda: now)
+    cache.put(unit(1, 0), "ctx", "value")
+
+    now += 59
+    assert cache.lookup(unit(1, 0), "ctx")[0] == "value"
+
+    now += 2
+    assert cache.lookup(unit(1, 0), "ctx") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_shared_semantic_result_cache_skips_oversized_values(tmp_path):
+    cache = semantic_cache(tmp_path)
+
+    cache.put(unit(1, 0), "ctx", np.random.default_rng(0).random(1000).tolist())
+
+    assert cache.lookup(unit(1, 0), "ctx") is None
+    assert cache.stats()["oversized"] == 1
+
+
+def test_persistent_embedding_store_compaction_keeps_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.PersistentEmbeddingStore, "COMPACT_RATIO", 10)
+    store = main.PersistentEmbeddingStore(str(tmp_path), dim=2, max_records=3)
+    now = 1_000_000.0
+    monkeypatch.setattr(main.time, "time", lambda: now)
+    for i in range(5):
+        store.put("model", f"q{i}", unit(i, -i))
+        now += 60
+    now += 600
+    assert store.get("model", "q0") == unit(0, 0)
+
+    store.compact()
+
+    assert store.stats()["records"] == 3
+    assert store.get("model", "q1") is None
+    assert store.get("model", "q2") is None
+    assert store.get("model", "q0") == unit(0, 0)
+    assert store.get("model", "q4") == unit(4, -4)
+
+    reopened = main.PersistentEmbeddingStore(str(tmp_path), dim=2, max_records=3)
+    assert reopened.get("model", "q3") == unit(3, -3)
+    assert reopened.stats()["records"] == 3
+
+
+def test_persistent_embedding_store_picks_up_other_writers(tmp_path):
+    first = main.PersistentEmbeddingStore(str(tmp_path), dim=2, max_records=100)
+    second = main.PersistentEmbeddingStore(str(tmp_path), dim=2, max_records=100)
+
+    first.put("model", "query", unit(1, 2))
+    assert second.get("model", "query") == unit(1, 2)
+
+    second.compact()
+    first.put("model", "other", unit(3, 4))
+    assert second.get("model", "other") == unit(3, 4)
+    assert first.get("model", "query") == unit(1, 2)
+
+
+def test_persistent_embedding_store_resets_other_layouts(tmp_path):
+    main.PersistentEmbeddingStore(str(tmp_path), dim=2, max_records=10).put("model", "query", unit(1, 2))
+
+    store = main.PersistentEmbeddingStore(str(tmp_path), dim=3, max_records=10)
+
+    assert store.get("model", "query") is None
+    assert store.stats()["records"] == 0
@@ -0,0 +1,83 @@
+import main
+
+
+def test_count_modality_keywords_counts_distinct_whole_words():
+    # "look" twice counts once, "overlooked" is not "look", "said" is an audio and a text keyword
+    assert main.count_modality_keywords("Look, LOOK at the overlooked image while music said") == (2, 2, 1)
+    assert main.count_modality_keywords("") == (0, 0, 0)
+
+
+def test_count_modality_keywords_batch_matches_single_queries():
+    queries = [
+        "look at the bright image",
+        "",
+        "music and noise\nthey said hello",
+        "what was discussed, explained and quoted",
+        "nothing relevant here",
+    ]
+
+    counts = main.count_modality_keywords_batch(queries)
+
+    assert counts.shape == (len(queries), 3)
+    assert counts.tolist() == [list(main.count_modality_keywords(query)) for query in queries]
+
+
+def test_count_modality_keywords_batch_empty():
+    assert main.count_modality_keywords_batch([]).shape == (0, 3)
+
+
+def test_detect_modality_preference_batch():
+    preferences = main.detect_modality_preference_batch(
+        ["look at the picture", "listen to the music", "nothing"], "visual_audio"
+    )
+
+    assert preferences == ["VISUAL_FOCUS", "AUDIO_FOCUS", "BALANCED"]
+
+
+def test_suggestion_index_matches_word_starts_by_weight():
+    index = main.SuggestionIndex(memo_size=16)
+    index.rebuild(
+        [
+            ("Dog Park Highlights", 1.0, "video"),
+            ("hot dog eating contest", 5.0, "query"),
+            ("dogsled race", 2.0, "query"),
+            ("underdog story", 9.0, "query"),
+        ]
+    )
+
+    texts = [suggestion["text"] for suggestion in index.lookup("DOG", limit=10)]
+
+    # Word starts only: "underdog" does not match
+    assert texts == ["hot dog eating contest", "dogsled race", "Dog Park Highlights"]
+    assert [s["text"] for s in index.lookup("dog", limit=1)] == ["hot dog eating contest"]
+    assert index.lookup("  ", limit=5) == []
+
+
+def test_suggestion_index_duplicate_texts_add_up():
+    index = main.SuggestionIndex(memo_size=16)
+    index.rebuild([("Cat videos", 1.0, "query"), ("cat  VIDEOS", 2.0, "query")])
+
+    assert index.lookup("cat", limit=5) == [{"text": "Cat videos", "source": "query", "weight": 3.0}]
+
+
+def test_suggestion_index_add_holds_back_new_queries():
+    index = main.SuggestionIndex(memo_size=16, min_query_count=2)
+    index.rebuild([])
+
+    index.add("sunset timelapse")
+    assert index.lookup("sun", limit=5) == []
+
+    index.add("Sunset  Timelapse")  # counted with the first use, it matches after normalization
+    assert [s["text"] for s in index.lookup("time", limit=5)] == ["Sunset  Timelapse"]
+
+    index.add("sunset timelapse", weight=3.0)
+    assert index.lookup("sun", limit=5)[0]["weight"] == 5.0
+
+
+def test_suggestion_index_video_names_are_added_immediately():
+    index = main.SuggestionIndex(memo_size=16, min_query_count=3)
+    index.rebuild([])
+
+    index.add("Harbour Drone Flight", source="video")
+
+    assert [s["text"] for s in index.lookup("drone", limit=5)] == ["Harbour Drone Flight"]
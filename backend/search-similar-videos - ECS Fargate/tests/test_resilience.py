@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+from botocore.exceptions import ClientError
+
+import main
+
+
+def fail():
+    raise RuntimeError("boom")
+
+
+def client_error(status):
+    return ClientError({"Error": {"Code": "Test"}, "ResponseMetadata": {"HTTPStatusCode": status}}, "InvokeModel")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(main.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_circuit_breaker_opens_after_consecutive_failures(clock):
+    breaker = main.CircuitBreaker("test", failure_threshold=2, reset_seconds=30)
+
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.call(lambda: "ok") == "ok"  # a success resets the count
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+
+    assert breaker.state == "open"
+    with pytest.raises(main.CircuitOpenError):
+        breaker.call(lambda: "ok")
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_circuit_breaker_probe_closes_or_reopens(clock):
+    breaker = main.CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+
+    clock[0] += 31
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)  # the failed probe re-opens the circuit
+    assert breaker.state == "open"
+    with pytest.raises(main.CircuitOpenError):
+        breaker.call(lambda: "ok")
+
+    clock[0] += 31
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+    assert breaker.stats()["times_opened"] == 2
+
+
+def test_circuit_breaker_allows_one_probe_at_a_time(clock):
+    breaker = main.CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    clock[0] += 31
+
+    def probe():
+        with pytest.raises(main.CircuitOpenError):
+            breaker.call(lambda: "concurrent")
+        return "probe"
+
+    assert breaker.call(probe) == "probe"
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_ignores_client_errors(clock):
+    breaker = main.CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+
+    def bad_request():
+        raise client_error(400)
+
+    def throttled():
+        raise client_error(429)
+
+    with pytest.raises(ClientError):
+        breaker.call(bad_request)
+    assert breaker.state == "closed"
+    with pytest.raises(ClientError):
+        breaker.call(throttled)
+    assert breaker.state == "open"
+
+
+def test_aimd_limiter_increases_additively_and_backs_off(clock):
+    limiter = main.AdaptiveConcurrencyLimiter("test", 4, 8, latency_target_ms=100, min_limit=1)
+
+    for _ in range(4):
+        limiter.on_result(10)
+    assert limiter.limit == 4  # +1/limit per call: 4.25, 4.49, ...
+    limiter.on_result(10)
+    assert limiter.limit == 5
+
+    limiter.on_result(500)
+    assert limiter.limit == 3  # 5.1 * ADMISSION_BACKOFF
+    limiter.on_result(10, overloaded=True)
+    assert limiter.limit == 3  # at most one decrease per interval
+    assert limiter.decreases == 1
+
+    clock[0] += main.ADMISSION_DECREASE_INTERVAL_SECONDS
+    limiter.on_result(10, overloaded=True)
+    assert limiter.limit == 2
+    assert limiter.decreases == 2
+
+
+def test_aimd_limiter_stays_within_bounds(clock):
+    limiter = main.AdaptiveConcurrencyLimiter("test", 2, 3, latency_target_ms=100, min_limit=2)
+
+    for _ in range(50):
+        limiter.on_result(1)
+    assert limiter.limit == 3
+
+    for _ in range(10):
+        clock[0] += main.ADMISSION_DECREASE_INTERVAL_SECONDS
+        limiter.on_overload()
+    assert limiter.limit == 2
+
+
+def test_aimd_limiter_sheds_when_queue_is_full():
+    limiter = main.AdaptiveConcurrencyLimiter("test", 1, 1, latency_target_ms=100, min_limit=1, max_queue=0)
+
+    async def scenario():
+        await limiter.acquire()
+        assert limiter.saturated
+        with pytest.raises(main.OverloadedError):
+            await limiter.acquire()
+        limiter.release()
+        await limiter.acquire()
+        limiter.release()
+
+    asyncio.run(scenario())
+    assert limiter.stats()["shed"] == 1
+    assert limiter.stats()["admitted"] == 2
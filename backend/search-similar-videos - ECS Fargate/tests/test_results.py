@@ -0,0 +1,84 @@
+import numpy as np
+
+import main
+
+
+def clip(video_id, start, end, score, clip_id=None):
+    return {
+        "video_id": video_id,
+        "clip_id": clip_id or f"{video_id}-{start}",
+        "timestamp_start": start,
+        "timestamp_end": end,
+        "score": score,
+    }
+
+
+def test_merge_adjacent_clips_joins_close_clips_of_one_video():
+    results = [clip("a", 6.0, 12.0, 0.9), clip("b", 0.0, 6.0, 0.8), clip("a", 0.0, 6.0, 0.7), clip("a", 30.0, 36.0, 0.6)]
+
+    merged = main.merge_adjacent_clips(results, gap_sec=1.0)
+
+    assert [(r["video_id"], r["timestamp_start"], r["timestamp_end"]) for r in merged] == [
+        ("a", 0.0, 12.0),
+        ("b", 0.0, 6.0),
+        ("a", 30.0, 36.0),
+    ]
+    assert merged[0]["score"] == 0.9
+    assert merged[0]["merged_clips"] == 2
+    assert merged[0]["clip_ids"] == ["a-0.0", "a-6.0"]
+    assert "merged_clips" not in results[0]
+
+
+def test_merge_adjacent_clips_respects_gap():
+    results = [clip("a", 0.0, 6.0, 0.9), clip("a", 8.0, 12.0, 0.8)]
+
+    assert len(main.merge_adjacent_clips(results, gap_sec=1.0)) == 2
+    assert len(main.merge_adjacent_clips(results, gap_sec=2.0)) == 1
+
+
+def test_group_results_by_video_ranks_videos_by_best_clip():
+    results = [
+        clip("a", 0.0, 6.0, 0.9),
+        clip("b", 0.0, 6.0, 0.8),
+        clip("a", 6.0, 12.0, 0.7),
+        clip("a", 12.0, 18.0, 0.6),
+        clip("c", 0.0, 6.0, 0.5),
+    ]
+
+    videos = main.group_results_by_video(results, top_videos=2, clips_per_video=2)
+
+    assert [video["video_id"] for video in videos] == ["a", "b"]
+    assert videos[0]["score"] == 0.9
+    assert videos[0]["matched_clips"] == 3
+    assert [c["timestamp_start"] for c in videos[0]["clips"]] == [0.0, 6.0]
+
+
+def test_group_results_by_video_uses_collapsed_match_counts():
+    results = [dict(clip("a", 0.0, 6.0, 0.9), video_matched_clips=7)]
+
+    assert main.group_results_by_video(results, top_videos=5, clips_per_video=3)[0]["matched_clips"] == 7
+
+
+def test_mmr_rerank_without_diversity_keeps_relevance_order():
+    relevance = np.array([0.2, 0.9, 0.5], dtype=np.float32)
+    vectors = np.eye(3, dtype=np.float32)
+
+    assert main.mmr_rerank(relevance, vectors, diversity=0.0).tolist() == [1, 2, 0]
+
+
+def test_mmr_rerank_demotes_near_duplicates():
+    relevance = np.array([1.0, 0.95, 0.5], dtype=np.float32)
+    vectors = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+
+    order = main.mmr_rerank(relevance, vectors, diversity=0.7)
+
+    assert order.tolist() == [0, 2, 1]
+
+
+def test_mmr_rerank_only_reorders_first_k():
+    relevance = np.array([1.0, 0.9, 0.8, 0.7], dtype=np.float32)
+    vectors = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0], [1.0, 0.0]], dtype=np.float32)
+
+    order = main.mmr_rerank(relevance, vectors, diversity=0.7, k=2)
+
+    assert order.tolist() == [0, 2, 1, 3]
@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
-import { Search, X, Loader2, ChevronDown, ImagePlus as ImageIcon, ArrowRight } from 'lucide-react';
+import { Search, X, Loader2, ChevronDown, ImagePlus as ImageIcon, ArrowRight, TrendingUp, Video } from 'lucide-react';
+import { getSuggestions } from '../services/api';
 
 const SearchBarMarengo3 = ({ onSearch, isLoading, onSearchTypeChange, queryValue = '', onQueryChange }) => {
   const [query, setQuery] = useState(queryValue);
@@ -17,6 +18,34 @@ const SearchBarMarengo3 = ({ onSearch, isLoading, onSearchTypeChange, queryValue
     onQueryChange?.(value);
   };
 
+  // Typeahead: popular searches are likely already cached server-side
+  const [suggestions, setSuggestions] = useState([]);
+  const [showSuggestions, setShowSuggestions] = useState(false);
+  const [activeSuggestion, setActiveSuggestion] = useState(-1);
+
+  useEffect(() => {
+    const text = query.trim();
+    if (!text || !showSuggestions) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        setSuggestions(await getSuggestions(text, 8, controller.signal));
+        setActiveSuggestion(-1);
+      } catch (err) {
+        if (err.name !== 'AbortError') {
+          console.warn('Suggestions unavailable:', err.message);
+        }
+      }
+    }, 120);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [query, showSuggestions]);
+
   const [showDropdown, setShowDropdown] = useState(false);
   const [visual, setVisual] = useState(true);
   const [audio, setAudio] = useState(true);
@@ -50,6 +79,7 @@ const SearchBarMarengo3 = ({ onSearch, isLoading, onSearchTypeChange, queryValue
 
   const handle_submit = async (e) => {
     e.preventDefault();
+    setShowSuggestions(false);
     
     const searchType = getSearchType();
     
@@ -70,6 +100,28 @@ const SearchBarMarengo3 = ({ onSearch, isLoading, onSearchTypeChange, queryValue
     updateQuery('');
   };
 
+  const select_suggestion = (text) => {
+    updateQuery(text);
+    setShowSuggestions(false);
+    onSearch(text, getSearchType(), topK, null, selectedImage);
+  };
+
+  const handle_suggestion_keys = (e) => {
+    if (!showSuggestions || suggestions.length === 0) return;
+    if (e.key === 'ArrowDown') {
+      e.preventDefault();
+      setActiveSuggestion((index) => (index + 1) % suggestions.length);
+    } else if (e.key === 'ArrowUp') {
+      e.preventDefault();
+      setActiveSuggestion((index) => (index <= 0 ? suggestions.length - 1 : index - 1));
+    } else if (e.key === 'Enter' && activeSuggestion >= 0) {
+      e.preventDefault();
+      select_suggestion(suggestions[activeSuggestion].text);
+    } else if (e.key === 'Escape') {
+      setShowSuggestions(false);
+    }
+  };
+
   const handleImageSelect = (e) => {
     const file = e.target.files?.[0];
     if (!file) return;
@@ -172,7 +224,12 @@ const SearchBarMarengo3 = ({ onSearch, isLoading, onSearchTypeChange, queryValue
               <input
                 type="text"
                 value={query}
-                onChange={(e) => updateQuery(e.target.value)}
+                onChange={(e) => {
+                  updateQuery(e.target.value);
+                  setShowSuggestions(true);
+                }}
+                onKeyDown={handle_suggestion_keys}
+                onBlur={() => setShowSuggestions(false)}
                 placeholder={selectedImage ? "Add text to refine search..." : "Search videos, actions, or objects..."}
                 className="w-full h-full pl-16 pr-20 text-lg bg-transparent focus:outline-none"
                 disabled={isLoading}
@@ -211,6 +268,32 @@ const SearchBarMarengo3 = ({ onSearch, isLoading, onSearchTypeChange, queryValue
             </div>
           </div>
 
+          {/* Suggestions - below the search bar */}
+          {showSuggestions && suggestions.length > 0 && (
+            <ul className="absolute left-0 right-0 top-full mt-2 bg-white rounded-2xl border border-gray-100 shadow-2xl py-2 z-50">
+              {suggestions.map((suggestion, index) => (
+                <li
+                  key={suggestion.text}
+                  // mousedown fires before the input's blur hides the list
+                  onMouseDown={(e) => {
+                    e.preventDefault();
+                    select_suggestion(suggestion.text);
+                  }}
+                  className={`flex items-center gap-3 px-5 py-2 cursor-pointer text-gray-700 ${
+                    index === activeSuggestion ? 'bg-blue-50' : 'hover:bg-gray-50'
+                  }`}
+                >
+                  {suggestion.source === 'video' ? (
+                    <Video size={16} className="text-gray-400 flex-shrink-0" />
+                  ) : (
+                    <TrendingUp size={16} className="text-blue-500 flex-shrink-0" />
+                  )}
+                  <span className="truncate">{suggestion.text}</span>
+                </li>
+              ))}
+            </ul>
+          )}
+
           {/* Error message - Outside search bar */}
           {imageError && (
             <div className="mt-2 p-3 bg-red-50 border border-red-200 rounded-xl">
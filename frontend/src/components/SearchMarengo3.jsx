@@ -14,10 +14,12 @@ function SearchMarengo3() {
   const [error, setError] = useState(null);
   const [selectedClip, setSelectedClip] = useState(null);
   const [hasSearched, setHasSearched] = useState(false);
+  const [degraded, setDegraded] = useState(false);
 
   const handle_search = async (searchQuery, searchType, topK = 20, imageResponse = null, imageFile = null) => {
     setIsLoading(true);
     setError(null);
+    setDegraded(false);
     setQuery(searchQuery || '');
     setHasSearched(true);
 
@@ -39,6 +41,7 @@ function SearchMarengo3() {
         const response = await searchClipsMarengo3(searchQuery, topK, searchType, imageFile);
         setClips(response.clips);
         setTotal(response.total);
+        setDegraded(!!response.degraded);
       }
     } catch (err) {
       setError('Failed to search videos (Marengo 3). Please try again.');
@@ -158,6 +161,14 @@ function SearchMarengo3() {
             </div>
           )}
 
+          {/* Degraded Mode Notice */}
+          {!isLoading && degraded && (
+            <div className="mb-6 p-4 bg-amber-50 border border-amber-200 rounded-xl flex items-center gap-3 text-amber-800 max-w-2xl mx-auto">
+              <AlertCircle size={20} />
+              <span>Semantic search is temporarily unavailable. Showing videos whose titles match your query.</span>
+            </div>
+          )}
+
           {/* Loading State */}
           {isLoading && (
             <div className="text-center py-16">
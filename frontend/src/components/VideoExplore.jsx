@@ -1,58 +1,22 @@
-import React, { useState, useEffect, useRef } from 'react';
+import React, { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
-import { Video, Loader2, AlertCircle, Play, X } from 'lucide-react';
+import { Video, Loader2, AlertCircle, Play, X, Search } from 'lucide-react';
 import { listAllVideos } from '../services/api';
 
-const VideoThumbnail = ({ videoUrl, videoId }) => {
-  const [thumbnail, setThumbnail] = useState(null);
+const VideoThumbnail = ({ thumbnailUrl, spriteUrl, spriteFrames }) => {
   const [isLoading, setIsLoading] = useState(true);
-  const videoRef = useRef(null);
+  const [hasError, setHasError] = useState(false);
+  const [spriteFrame, setSpriteFrame] = useState(null);
 
-  useEffect(() => {
-    const generateThumbnail = async () => {
-      try {
-        const video = document.createElement('video');
-        video.crossOrigin = 'anonymous';
-        video.src = videoUrl;
-        video.currentTime = 1; // Capture frame at 1 second
-
-        video.addEventListener('loadeddata', () => {
-          const canvas = document.createElement('canvas');
-          canvas.width = video.videoWidth;
-          canvas.height = video.videoHeight;
-          const ctx = canvas.getContext('2d');
-          ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
-          
-          const thumbnailUrl = canvas.toDataURL('image/jpeg', 0.8);
-          setThumbnail(thumbnailUrl);
-          setIsLoading(false);
-        });
-
-        video.addEventListener('error', () => {
-          setIsLoading(false);
-        });
-
-        video.load();
-      } catch (err) {
-        console.error('Error generating thumbnail:', err);
-        setIsLoading(false);
-      }
-    };
-
-    if (videoUrl) {
-      generateThumbnail();
-    }
-  }, [videoUrl]);
-
-  if (isLoading) {
-    return (
-      <div className="absolute inset-0 flex items-center justify-center bg-gray-200">
-        <Loader2 size={40} className="text-blue-400 animate-spin" />
-      </div>
-    );
-  }
+  // Hovering scrubs through the sprite strip (one row of spriteFrames frames) generated at ingest
+  const handle_mouse_move = (e) => {
+    if (!spriteUrl || !spriteFrames) return;
+    const rect = e.currentTarget.getBoundingClientRect();
+    const position = (e.clientX - rect.left) / rect.width;
+    setSpriteFrame(Math.min(spriteFrames - 1, Math.max(0, Math.floor(position * spriteFrames))));
+  };
 
-  if (!thumbnail) {
+  if (!thumbnailUrl || hasError) {
     return (
       <div className="absolute inset-0 flex items-center justify-center bg-gradient-to-br from-blue-100 to-blue-200">
         <Video size={48} className="text-blue-600" />
@@ -61,12 +25,36 @@ const VideoThumbnail = ({ videoUrl, videoId }) => {
   }
 
   return (
-    <img 
-      src={thumbnail} 
-      alt="Video thumbnail"
-      className="absolute inset-0 w-full h-full object-cover"
-      loading="lazy"
-    />
+    <div
+      className="absolute inset-0"
+      onMouseMove={handle_mouse_move}
+      onMouseLeave={() => setSpriteFrame(null)}
+    >
+      {isLoading && (
+        <div className="absolute inset-0 flex items-center justify-center bg-gray-200">
+          <Loader2 size={40} className="text-blue-400 animate-spin" />
+        </div>
+      )}
+      <img 
+        src={thumbnailUrl} 
+        alt="Video thumbnail"
+        className="absolute inset-0 w-full h-full object-cover"
+        loading="lazy"
+        decoding="async"
+        onLoad={() => setIsLoading(false)}
+        onError={() => setHasError(true)}
+      />
+      {spriteFrame !== null && (
+        <div
+          className="absolute inset-0"
+          style={{
+            backgroundImage: `url(${spriteUrl})`,
+            backgroundSize: `${spriteFrames * 100}% 100%`,
+            backgroundPosition: `${(spriteFrame / (spriteFrames - 1)) * 100}% 0`,
+          }}
+        />
+      )}
+    </div>
   );
 };
 
@@ -75,13 +63,28 @@ const VideoExplore = () => {
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
   const [selectedVideo, setSelectedVideo] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalVideos, setTotalVideos] = useState(0);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const [searchText, setSearchText] = useState('');
+  const [sortBy, setSortBy] = useState('created_at');
 
-  const fetch_videos = async () => {
-    setIsLoading(true);
+  const fetch_videos = async (cursor = null) => {
+    if (cursor) {
+      setIsLoadingMore(true);
+    } else {
+      setIsLoading(true);
+    }
     setError(null);
     
     try {
-      const data = await listAllVideos();
+      const query = searchText.trim();
+      const data = await listAllVideos({
+        cursor,
+        q: query || null,
+        // Name matches rank by relevance unless an explicit order was picked
+        sort: query && sortBy === 'created_at' ? null : sortBy,
+      });
       
       // Transform API response to component format
       const transformedVideos = data.videos.map(video => ({
@@ -91,15 +94,23 @@ const VideoExplore = () => {
         duration: formatDuration(video.duration),
         uploadDate: video.upload_date || 'Unknown',
         videoPath: video.video_path,  // Presigned URL from backend
-        clipsCount: video.clips_count
+        thumbnailUrl: video.thumbnail_url,  // Poster generated at ingest time
+        spriteUrl: video.sprite_url,
+        spriteFrames: video.sprite_frames,
+        clipsCount: video.clips_count,
+        part: video.part,
+        partCount: video.part_count
       }));
       
-      setVideos(transformedVideos);
+      setVideos(previous => (cursor ? [...previous, ...transformedVideos] : transformedVideos));
+      setNextCursor(data.next_cursor || null);
+      setTotalVideos(data.total);
     } catch (err) {
       console.error('Error fetching videos:', err);
       setError('Failed to load videos. Please try again.');
     } finally {
       setIsLoading(false);
+      setIsLoadingMore(false);
     }
   };
 
@@ -111,8 +122,10 @@ const VideoExplore = () => {
   };
 
   useEffect(() => {
-    fetch_videos();
-  }, []);
+    // Debounce typing; a new search or sort starts again from the first page
+    const timer = setTimeout(() => fetch_videos(), 300);
+    return () => clearTimeout(timer);
+  }, [searchText, sortBy]);
 
   return (
     <motion.section
@@ -131,6 +144,30 @@ const VideoExplore = () => {
         </p>
       </div>
 
+      {/* Search and Sort */}
+      <div className="w-full max-w-7xl mx-auto mb-8 flex flex-col sm:flex-row gap-3">
+        <div className="relative flex-1">
+          <Search size={18} className="absolute left-3 top-1/2 -translate-y-1/2 text-gray-400" />
+          <input
+            type="text"
+            value={searchText}
+            onChange={(e) => setSearchText(e.target.value)}
+            placeholder="Search videos by name"
+            className="w-full pl-10 pr-4 py-2 bg-white border border-blue-200 rounded-xl focus:outline-none focus:border-blue-600 text-sm text-gray-700"
+          />
+        </div>
+        <select
+          value={sortBy}
+          onChange={(e) => setSortBy(e.target.value)}
+          className="px-4 py-2 bg-white border border-blue-200 rounded-xl focus:outline-none focus:border-blue-600 text-sm text-gray-700"
+        >
+          <option value="created_at">Newest first</option>
+          <option value="name">Name</option>
+          <option value="duration">Longest first</option>
+          <option value="clips">Most clips</option>
+        </select>
+      </div>
+
       {/* Loading State */}
       {isLoading && (
         <div className="text-center py-16">
@@ -156,13 +193,17 @@ const VideoExplore = () => {
                 key={video.id}
                 initial={{ opacity: 0, y: 20 }}
                 animate={{ opacity: 1, y: 0 }}
-                transition={{ delay: index * 0.1 }}
+                transition={{ delay: (index % 24) * 0.05 }}
                 onClick={() => setSelectedVideo(video)}
                 className="bg-white rounded-3xl shadow-md hover:shadow-xl transition-all duration-300 overflow-hidden cursor-pointer group"
               >
                 {/* Video Thumbnail */}
                 <div className="relative h-52 bg-gray-200 flex items-center justify-center overflow-hidden">
-                  <VideoThumbnail videoUrl={video.videoUrl} videoId={video.id} />
+                  <VideoThumbnail
+                    thumbnailUrl={video.thumbnailUrl}
+                    spriteUrl={video.spriteUrl}
+                    spriteFrames={video.spriteFrames}
+                  />
                   
                   {/* Duration overlay */}
                   {video.duration !== 'N/A' && (
@@ -178,11 +219,30 @@ const VideoExplore = () => {
                     {video.title}
                   </p>
                   <div className="flex items-center justify-between mt-2">
+                    {video.partCount > 1 && (
+                      <span className="text-xs text-gray-500">
+                        Part {video.part}
+                      </span>
+                    )}
                   </div>
                 </div>
               </motion.div>
             ))}
           </div>
+
+          {/* Load More */}
+          {nextCursor && (
+            <div className="text-center mt-10">
+              <button
+                onClick={() => fetch_videos(nextCursor)}
+                disabled={isLoadingMore}
+                className="px-6 py-2 bg-white border border-blue-200 rounded-full hover:border-blue-600 hover:bg-blue-50 transition-all text-sm text-gray-700 disabled:opacity-50 inline-flex items-center gap-2"
+              >
+                {isLoadingMore && <Loader2 size={16} className="animate-spin" />}
+                Load more videos
+              </button>
+            </div>
+          )}
         </div>
       )}
 
@@ -194,10 +254,10 @@ const VideoExplore = () => {
               <Video size={48} className="text-blue-600" />
             </div>
             <h3 className="text-2xl font-bold text-gray-900 mb-3">
-              No Videos Yet
+              {searchText.trim() ? 'No Matching Videos' : 'No Videos Yet'}
             </h3>
             <p className="text-gray-600 mb-6">
-              Upload your first video to get started
+              {searchText.trim() ? 'Try a different name' : 'Upload your first video to get started'}
             </p>
           </div>
         </div>
@@ -214,7 +274,7 @@ const VideoExplore = () => {
             Showing all videos from your OpenSearch index. Each video has been processed and indexed for semantic search.
           </p>
           <div className="mt-3 flex items-center gap-4 text-sm text-blue-700">
-            <span className="font-medium">Total Videos: {videos.length}</span>
+            <span className="font-medium">Total Videos: {totalVideos}</span>
             {/* <span className="font-medium">Total Clips: {videos.reduce((sum, v) => sum + v.clipsCount, 0)}</span> */}
           </div>
         </div>
@@ -312,12 +312,19 @@ export const searchClipsTranscriptionMarengo3 = async (query, topK = 10, imageFi
 // };
 
 
-export const listAllVideos = async () => {
+export const listAllVideos = async ({ cursor = null, limit = 24, sort = null, order = null, q = null } = {}) => {
   try {
     // Load config first
     const backendUrl = await getBackendUrl();
 
-    const response = await fetch(`${backendUrl}/list`, {
+    // One page of the catalog; pass the previous page's next_cursor to continue
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) params.set('cursor', cursor);
+    if (sort) params.set('sort', sort);
+    if (order) params.set('order', order);
+    if (q) params.set('q', q);
+
+    const response = await fetch(`${backendUrl}/list?${params.toString()}`, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
@@ -332,6 +339,18 @@ export const listAllVideos = async () => {
   }
 };
 
+// Typeahead suggestions (video names and popular searches) for the search bar
+export const getSuggestions = async (query, limit = 8, signal = undefined) => {
+  const backendUrl = await getBackendUrl();
+  const params = new URLSearchParams({ q: query, limit: String(limit) });
+  const response = await fetch(`${backendUrl}/suggest?${params.toString()}`, { signal });
+  if (!response.ok) {
+    throw new Error(`Suggest failed: ${response.status}`);
+  }
+  const data = await response.json();
+  return data.suggestions || [];
+};
+
 export const getPresignedUploadUrl = async (filename) => {
   try {
     // Load config first